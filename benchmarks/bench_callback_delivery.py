@@ -0,0 +1,85 @@
+"""Benchmark callbacks per second with a new connection per callback and with pooled, parallel delivery.
+
+A local HTTP stub server accepts callbacks. To emulate a slow (e.g. cellular) link, the server waits
+``--connect-delay`` seconds for every new connection (as a TCP/TLS handshake would cost) and ``--response-delay``
+seconds for every request. Callbacks are sent as before, with a new connection per callback, and with
+``CallbackDelivery``, one after the other and with several at the same time.
+
+Usage::
+
+    python benchmarks/bench_callback_delivery.py [--callbacks 50] [--connect-delay 0.2] [--response-delay 0.05]
+
+"""
+import argparse
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from nodeorc import models
+from nodeorc.delivery import CallbackDelivery
+
+
+def make_handler(connect_delay, response_delay):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            # called once per connection
+            time.sleep(connect_delay)
+            super().setup()
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            time.sleep(response_delay)
+            self.send_response(201)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class StubCallback(models.Callback):
+    def get_body(self):
+        return {"timestamp": "2000-01-01T00:00:00Z", "h": 1.0, "q_50": 2.0}, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--callbacks", type=int, default=50, help="number of callbacks per method")
+    parser.add_argument("--connect-delay", type=float, default=0.2, help="delay [s] per new connection")
+    parser.add_argument("--response-delay", type=float, default=0.05, help="delay [s] per request")
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(args.connect_delay, args.response_delay))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    callback_url = models.CallbackUrl(url=f"http://127.0.0.1:{server.server_address[1]}")
+    callbacks = [StubCallback(kwargs={}) for _ in range(args.callbacks)]
+
+    def new_connections():
+        return [callback_url.send_callback(cb) for cb in callbacks]
+
+    def pooled(max_workers):
+        def send():
+            with CallbackDelivery(callback_url, max_workers=max_workers) as delivery:
+                return delivery.send_many(callbacks)
+        return send
+
+    print(f"{args.callbacks} callbacks, {args.connect_delay} s per connection, {args.response_delay} s per request")
+    print(f"{'method':>26s} | {'callbacks/s':>11s}")
+    for name, fn in [
+        ("new connection each", new_connections),
+        ("pooled, sequential", pooled(1)),
+        ("pooled, 4 in parallel", pooled(4)),
+    ]:
+        tic = time.perf_counter()
+        responses = fn()
+        assert all(r is not None and r.status_code == 201 for r in responses)
+        print(f"{name:>26s} | {args.callbacks / (time.perf_counter() - tic):11.1f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
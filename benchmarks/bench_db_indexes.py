@@ -0,0 +1,112 @@
+"""Benchmark the hot time_series and video queries before and after adding the database indexes.
+
+A temporary database without indexes (as created by older versions of NodeORC) is filled with several million
+water levels (one per minute) and a video table in which most videos are done and a few are queued. The queries
+used by ``db_ops`` are timed, the database is then upgraded with ``db.migrations.upgrade`` (which creates the
+missing indexes) and the queries are timed again.
+
+Usage::
+
+    python benchmarks/bench_db_indexes.py [--records 3000000] [--videos 200000] [--lookups 20]
+
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from nodeorc import db, db_ops
+from nodeorc.db import TimeSeries, Video, VideoStatus
+from nodeorc.db.migrations import upgrade
+
+
+def fill(fn, records, videos, t0):
+    # timestamps are stored in the format of SQLAlchemy
+    fmt = "%Y-%m-%d %H:%M:%S.%f"
+    conn = sqlite3.connect(fn)
+    chunk = 500000
+    for start in range(0, records, chunk):
+        conn.executemany(
+            "INSERT INTO time_series (timestamp, h) VALUES (?, ?)",
+            (
+                ((t0 + timedelta(minutes=i)).strftime(fmt), (i % 100) / 100)
+                for i in range(start, min(start + chunk, records))
+            )
+        )
+    conn.executemany(
+        "INSERT INTO video (timestamp, status) VALUES (?, ?)",
+        (
+            ((t0 + timedelta(minutes=10 * i)).strftime(fmt), "QUEUE" if i % 1000 == 0 else "DONE")
+            for i in range(videos)
+        )
+    )
+    conn.commit()
+    conn.close()
+
+
+def queries(session, timestamps):
+    """Queries of db_ops that depend on the indexes."""
+    return {
+        "time_series exact": lambda i: session.query(TimeSeries).filter_by(timestamp=timestamps[i]).one(),
+        "time_series before/after": lambda i: (
+            session.query(TimeSeries).filter(TimeSeries.timestamp <= timestamps[i]).order_by(
+                TimeSeries.timestamp.desc()).first(),
+            session.query(TimeSeries).filter(TimeSeries.timestamp > timestamps[i]).order_by(
+                TimeSeries.timestamp).first()
+        ),
+        "video oldest queued": lambda i: session.query(Video.id).filter(Video.status == VideoStatus.QUEUE).order_by(
+            Video.timestamp).first(),
+        "video claimable": lambda i: db_ops.get_claimable_videos(session),
+    }
+
+
+def timeit(fn, n):
+    t0 = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return (time.perf_counter() - t0) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=3000000, help="number of water level records")
+    parser.add_argument("--videos", type=int, default=200000, help="number of video records")
+    parser.add_argument("--lookups", type=int, default=20, help="number of lookups per query")
+    args = parser.parse_args()
+    t0 = datetime(2000, 1, 1)
+    rng = np.random.default_rng(0)
+    timestamps = [t0 + timedelta(minutes=int(m)) for m in rng.integers(0, args.records, args.lookups)]
+    with tempfile.TemporaryDirectory() as tmp:
+        fn = os.path.join(tmp, "bench.db")
+        engine = create_engine(f"sqlite:///{fn}")
+        db.Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            for table in db.Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    conn.execute(text(f"DROP INDEX {index.name}"))
+        tic = time.perf_counter()
+        fill(fn, args.records, args.videos, t0)
+        print(f"{args.records} water levels and {args.videos} videos written in {time.perf_counter() - tic:.1f} s")
+        session = sessionmaker(bind=engine)()
+        before = {name: timeit(q, args.lookups) for name, q in queries(session, timestamps).items()}
+        session.close()
+        tic = time.perf_counter()
+        upgrade(engine)
+        print(f"indexes created in {time.perf_counter() - tic:.1f} s")
+        session = sessionmaker(bind=engine)()
+        after = {name: timeit(q, args.lookups) for name, q in queries(session, timestamps).items()}
+        session.close()
+        print(f"{'query':>24s} | {'no index [ms]':>13s} | {'index [ms]':>10s}")
+        for name in before:
+            print(f"{name:>24s} | {before[name] * 1000:13.3f} | {after[name] * 1000:10.3f}")
+
+
+if __name__ == "__main__":
+    main()
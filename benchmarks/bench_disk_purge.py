@@ -0,0 +1,70 @@
+"""Benchmark finding the oldest files to purge, by scanning folders and from the file catalogue.
+
+A folder tree with one folder per day is filled with small files. The time to find the oldest files that together
+free up a given number of bytes is measured as ``disk_mng.purge`` did it before (``scan_folder`` and
+``os.path.getmtime`` on every file, then sorting), and with a query on the file catalogue
+(``db_ops.get_oldest_files``). No files are removed. On an SD card with a cold cache, the scan is much slower than
+shown here.
+
+Usage::
+
+    python benchmarks/bench_disk_purge.py [--days 365] [--files-per-day 100] [--purge 0.1]
+
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy.orm import sessionmaker
+
+from nodeorc import db, db_ops, disk_mng
+from nodeorc.db.engine import create_sqlite_engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=365, help="number of day folders")
+    parser.add_argument("--files-per-day", type=int, default=100, help="number of files per day folder")
+    parser.add_argument("--purge", type=float, default=0.1, help="fraction of all bytes to free up")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = os.path.join(tmp, "failed")
+        for day in range(args.days):
+            path = os.path.join(folder, f"{day:05d}")
+            os.makedirs(path)
+            for i in range(args.files_per_day):
+                fn = os.path.join(path, f"video_{i:04d}.mp4")
+                with open(fn, "wb") as f:
+                    f.write(b"0" * 1000)
+                os.utime(fn, (1e9 + day * 86400 + i, 1e9 + day * 86400 + i))
+        n = args.days * args.files_per_day
+        needed = int(args.purge * n * 1000)
+
+        tic = time.perf_counter()
+        fns = disk_mng.scan_folder(folder, clean_empty_dirs=False)
+        timestamps = [os.path.getmtime(fn) for fn in fns]
+        idx = np.argsort(timestamps)
+        sizes = np.cumsum([os.path.getsize(fns[i]) for i in idx])
+        n_scan = int(np.searchsorted(sizes, needed) + 1)
+        scan = time.perf_counter() - tic
+
+        engine = create_sqlite_engine(os.path.join(tmp, "catalogue.db"))
+        db.Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        tic = time.perf_counter()
+        disk_mng.catalogue_folder(session, folder, "failed")
+        seed = time.perf_counter() - tic
+        tic = time.perf_counter()
+        n_catalogue = len(db_ops.get_oldest_files(session, "failed", needed))
+        catalogue = time.perf_counter() - tic
+        session.close()
+    print(f"{'method':>26s} | {'files':>7s} | {'to purge':>8s} | {'time [s]':>8s}")
+    print(f"{'scan and sort':>26s} | {n:7d} | {n_scan:8d} | {scan:8.3f}")
+    print(f"{'catalogue query':>26s} | {n:7d} | {n_catalogue:8d} | {catalogue:8.3f}")
+    print(f"{'catalogue (once) from scan':>26s} | {n:7d} | {'':>8s} | {seed:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Benchmark throughput (videos/hour) of the task execution backends at 1, 2 and 4 workers.
+
+Processing a video with pyorc is dominated by CPU-bound numerical work. This benchmark replaces a video by a
+CPU-bound pure-Python workload of fixed size (by default roughly one second on a single core), and feeds a backlog of
+such "videos" through ``TaskExecutor`` from as many dispatcher threads as there are workers, exactly like
+``LocalTaskProcessor.await_task`` does. The thread backend shows the effect of the GIL, the process backend the
+scaling over cores.
+
+Usage::
+
+    python benchmarks/bench_executor.py [--videos 16] [--work 3000000] [--workers 1 2 4]
+
+"""
+import argparse
+import concurrent.futures
+import multiprocessing
+import time
+
+from nodeorc.executor import TaskExecutor
+
+
+def process_video(work):
+    """Stand-in for a video: a fixed amount of CPU-bound work."""
+    x = 0
+    for i in range(work):
+        x += i * i % 7
+    return x
+
+
+def run(backend, workers, videos, work):
+    task_executor = TaskExecutor(max_workers=workers, process_pool=backend == "process")
+    if backend == "process":
+        # start the worker processes before timing, as the daemon keeps them alive
+        list(concurrent.futures.wait([task_executor.submit(process_video, 1) for _ in range(workers)]))
+
+    def dispatch(_):
+        if backend == "process":
+            return task_executor.submit(process_video, work).result()
+        return process_video(work)
+
+    t0 = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as dispatcher:
+        list(dispatcher.map(dispatch, range(videos)))
+    duration = time.time() - t0
+    task_executor.shutdown()
+    return videos / duration * 3600
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", type=int, default=16, help="number of videos in the backlog")
+    parser.add_argument("--work", type=int, default=3000000, help="loop iterations per video")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="worker counts to test")
+    args = parser.parse_args()
+    print(f"{multiprocessing.cpu_count()} CPU cores, {args.videos} videos per run")
+    print(f"{'workers':>8s} | {'thread [videos/h]':>18s} | {'process [videos/h]':>18s}")
+    for workers in args.workers:
+        thread = run("thread", workers, args.videos, args.work)
+        process = run("process", workers, args.videos, args.work)
+        print(f"{workers:8d} | {thread:18.0f} | {process:18.0f}")
+
+
+if __name__ == "__main__":
+    main()
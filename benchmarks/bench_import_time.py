@@ -0,0 +1,74 @@
+"""Benchmark the time to start the command line interface and to import the modules of NodeORC.
+
+Every module is imported ``--repeat`` times in a new interpreter with ``python -X importtime``, with a fresh
+``NODEORC_HOME``, so that no database exists yet. The median of the cumulative import time is reported, with the
+largest imports below it, and whether the configuration database was created by the import. ``nodeorc --version``
+is timed from start to exit of the interpreter.
+
+Usage::
+
+    python benchmarks/bench_import_time.py [--repeat 5] [--top 5] [--modules nodeorc.main nodeorc.db]
+
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def import_times(statement, home):
+    """Return the cumulative import times [us] of all modules imported by a statement in a new interpreter."""
+    env = {**os.environ, "NODEORC_HOME": home}
+    p = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement], env=env, capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in p.stderr.splitlines():
+        if line.startswith("import time:"):
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="number of imports per module")
+    parser.add_argument("--top", type=int, default=5, help="number of largest imports to show per module")
+    parser.add_argument(
+        "--modules", nargs="+", default=["nodeorc.main", "nodeorc.db", "nodeorc.tasks"], help="modules to import"
+    )
+    args = parser.parse_args()
+    print(f"{'module':>24s} | {'import [ms]':>11s} | {'database':>8s}")
+    for module in args.modules:
+        durations = []
+        for _ in range(args.repeat):
+            with tempfile.TemporaryDirectory() as home:
+                times = import_times(f"import {module}", home)
+                created = os.path.isfile(os.path.join(home, "nodeorc_config.db"))
+            durations.append(times[module])
+        print(f"{module:>24s} | {statistics.median(durations) / 1000:11.0f} | {'created' if created else '-':>8s}")
+        top = sorted(
+            ((t, name) for name, t in times.items() if not name.startswith(("nodeorc", "encodings"))), reverse=True
+        )
+        for t, name in top[:args.top]:
+            print(f"{'  ' + name:>24s} | {t / 1000:11.0f} |")
+    durations = []
+    for _ in range(args.repeat):
+        with tempfile.TemporaryDirectory() as home:
+            tic = time.perf_counter()
+            subprocess.run(
+                [sys.executable, "-c", "from nodeorc.main import cli; cli(['--version'])"],
+                env={**os.environ, "NODEORC_HOME": home},
+                capture_output=True,
+                check=True,
+            )
+            durations.append(time.perf_counter() - tic)
+    print(f"{'nodeorc --version':>24s} | {statistics.median(durations) * 1000:11.0f} |")
+
+
+if __name__ == "__main__":
+    main()
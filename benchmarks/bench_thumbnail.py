@@ -0,0 +1,80 @@
+"""Benchmark creating thumbnails from a video and from its results image, and the commit time of a video record.
+
+A video and an image of the same frame size are written to a temporary folder. Thumbnails are created from the
+first frame of the video (as was done during the flush of every video record) and from the image (as is done now in
+a background thread). Then the time of committing a processed video record is measured, which no longer includes
+the creation of the thumbnail.
+
+Usage::
+
+    python benchmarks/bench_thumbnail.py [--width 1920] [--height 1080] [--repeat 20]
+
+"""
+import argparse
+import os
+import shutil
+import time
+
+import cv2
+import numpy as np
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from nodeorc import db
+from nodeorc.db.video import UPLOAD_DIRECTORY, create_thumbnail, thumbnail_queue
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=1920, help="frame width [px]")
+    parser.add_argument("--height", type=int, default=1080, help="frame height [px]")
+    parser.add_argument("--repeat", type=int, default=20, help="number of thumbnails per method")
+    args = parser.parse_args()
+    folder = os.path.join(UPLOAD_DIRECTORY, "videos", "bench_thumbnail")
+    os.makedirs(folder, exist_ok=True)
+    try:
+        # a smooth frame with some noise, which compresses like a natural scene
+        x = np.linspace(0, 255, args.width)[None, :, None]
+        y = np.linspace(0, 255, args.height)[:, None, None]
+        noise = np.random.default_rng(0).normal(0, 8, (args.height, args.width, 3))
+        frame = np.clip((x + y) / 2 + noise, 0, 255).astype(np.uint8)
+        video_fn = os.path.join(folder, "video.mp4")
+        writer = cv2.VideoWriter(video_fn, cv2.VideoWriter_fourcc(*"mp4v"), 25, (args.width, args.height))
+        for _ in range(25):
+            writer.write(frame)
+        writer.release()
+        image_fn = os.path.join(folder, "video.jpg")
+        cv2.imwrite(image_fn, frame)
+        results = {}
+        for name, fn in [("from video", video_fn), ("from image", image_fn)]:
+            tic = time.perf_counter()
+            for _ in range(args.repeat):
+                create_thumbnail(fn)
+            results[name] = (time.perf_counter() - tic) / args.repeat
+
+        engine = create_engine(f"sqlite:///{os.path.join(folder, 'bench.db')}")
+        db.Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine, info={"make_thumbnails": True})()
+        tic = time.perf_counter()
+        for i in range(args.repeat):
+            session.add(db.Video(
+                timestamp=datetime(2000, 1, 1) + timedelta(minutes=i),
+                status=db.VideoStatus.DONE,
+                file="videos/bench_thumbnail/video.mp4",
+                image="videos/bench_thumbnail/video.jpg",
+            ))
+            session.commit()
+        results["commit of video record"] = (time.perf_counter() - tic) / args.repeat
+        thumbnail_queue.join()
+        session.close()
+        engine.dispose()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    print(f"{'thumbnail':>24s} | {'time [ms]':>9s}")
+    for name, duration in results.items():
+        print(f"{name:>24s} | {duration * 1000:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Benchmark memory use and duration of uploading task outputs to the storage bucket.
+
+Compares the former upload path of ``Subtask.upload_outputs`` (read the output file into a ``BytesIO`` and write it
+with ``Storage.upload_io``) with ``Storage.upload_file``, both with a hard link (source and bucket on the same file
+system) and with a kernel copy (different file systems, emulated by disabling ``os.link``). Peak memory is measured
+with ``tracemalloc``, i.e. memory allocated by Python, which is where the output data used to be held.
+
+Usage::
+
+    python benchmarks/bench_upload.py [--size 200] [--path /tmp]
+
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from io import BytesIO
+from unittest.mock import patch
+
+from nodeorc import models
+
+
+def upload_bytesio(storage, fn):
+    with open(fn, "rb") as f:
+        obj = BytesIO(f.read())
+    obj.seek(0)
+    storage.upload_io(obj, dest="output.nc")
+
+
+def upload_link(storage, fn):
+    storage.upload_file(fn, dest="output.nc")
+
+
+def upload_copy(storage, fn):
+    with patch("os.link", side_effect=OSError):
+        storage.upload_file(fn, dest="output.nc")
+
+
+def measure(method, storage, fn):
+    dest = os.path.join(storage.bucket, "output.nc")
+    if os.path.exists(dest):
+        os.remove(dest)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    method(storage, fn)
+    duration = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duration, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=200, help="size of the output file [MB]")
+    parser.add_argument("--path", default=None, help="folder for the test files, by default a temporary folder")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(dir=args.path) as tmp:
+        fn = os.path.join(tmp, "output.nc")
+        with open(fn, "wb") as f:
+            for _ in range(args.size):
+                f.write(os.urandom(1024 * 1024))
+        storage = models.Storage(url=os.path.join(tmp, "uploads"), bucket_name="video")
+        print(f"output file of {args.size} MB")
+        print(f"{'method':>16s} | {'duration [s]':>12s} | {'peak memory [MB]':>16s}")
+        for name, method in [("BytesIO", upload_bytesio), ("upload_file link", upload_link),
+                             ("upload_file copy", upload_copy)]:
+            duration, peak = measure(method, storage, fn)
+            print(f"{name:>16s} | {duration:12.3f} | {peak / 1024 ** 2:16.2f}")
+
+
+if __name__ == "__main__":
+    main()
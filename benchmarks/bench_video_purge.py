@@ -0,0 +1,79 @@
+"""Benchmark removing old videos one by one and in bulk.
+
+Processed videos with a small raw video, image and thumbnail in their bucket (under ``<nodeorc home>/uploads``) and
+a water level are written to a temporary database. They are then removed by deleting the ``Video`` records one by
+one through the ORM (which removes the bucket in an event per record), and with ``disk_mng.purge_videos`` (files
+first, then records in bulk statements). Water levels are kept in both cases.
+
+Usage::
+
+    python benchmarks/bench_video_purge.py [--videos 2000]
+
+"""
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from datetime import datetime, timedelta
+from sqlalchemy.orm import sessionmaker
+
+from nodeorc import db, disk_mng, __home__
+from nodeorc.db.engine import create_sqlite_engine
+
+
+def add_videos(session, n, name):
+    for i in range(n):
+        video = db.Video(
+            timestamp=datetime(2000, 1, 1) + timedelta(minutes=15 * i),
+            status=db.VideoStatus.DONE,
+            file=f"videos/{name}/{i}/video.mp4",
+        )
+        session.add(video)
+        session.flush()
+        session.add(db.TimeSeries(timestamp=video.timestamp, h=1., video_id=video.id))
+        bucket = os.path.join(__home__, "uploads", "videos", name, str(i))
+        os.makedirs(bucket)
+        for fn in ["video.mp4", "video.jpg", "video_thumb.jpg"]:
+            with open(os.path.join(bucket, fn), "wb") as f:
+                f.write(b"0" * 1000)
+    session.commit()
+    for i, video in enumerate(session.query(db.Video).order_by(db.Video.id)):
+        bucket = os.path.join(__home__, "uploads", "videos", name, str(i))
+        disk_mng.catalogue_video(session, video.id, bucket, "video.mp4")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", type=int, default=2000, help="number of videos")
+    args = parser.parse_args()
+    logger = logging.getLogger("bench")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for method in ["one by one", "bulk"]:
+            name = f"bench_purge_{method.replace(' ', '_')}"
+            engine = create_sqlite_engine(os.path.join(tmp, f"{name}.db"))
+            db.Base.metadata.create_all(engine)
+            session = sessionmaker(bind=engine)()
+            add_videos(session, args.videos, name)
+            tic = time.perf_counter()
+            if method == "bulk":
+                disk_mng.purge_videos(session, logger, before=datetime(2100, 1, 1))
+            else:
+                for video in session.query(db.Video).all():
+                    session.delete(video)
+                    session.commit()
+            results[method] = time.perf_counter() - tic
+            assert session.query(db.Video).count() == 0
+            assert session.query(db.TimeSeries).count() == args.videos
+            session.close()
+            shutil.rmtree(os.path.join(__home__, "uploads", "videos", name), ignore_errors=True)
+    print(f"{'method':>12s} | {'videos':>7s} | {'total [s]':>9s} | {'videos/s':>9s}")
+    for method, duration in results.items():
+        print(f"{method:>12s} | {args.videos:7d} | {duration:9.2f} | {args.videos / duration:9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark detection latency and CPU use of the incoming-folder watcher modes.
+
+An incoming tree with (by default) 10000 files is created, after which new files are dropped into the tree one by
+one. For each watch mode, the time between the moment a new file is renamed into the tree and the moment it is
+reported by the watcher is recorded, together with the CPU time used by this process while watching.
+
+Usage::
+
+    python benchmarks/bench_watcher.py [--files 10000] [--samples 20] [--interval 5]
+
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from nodeorc import watcher
+
+
+def make_tree(path, n_files, files_per_folder=100):
+    for i in range(n_files):
+        folder = os.path.join(path, f"{i // files_per_folder:04d}")
+        os.makedirs(folder, exist_ok=True)
+        open(os.path.join(folder, f"video_{i:06d}.mp4"), "w").close()
+
+
+def run(mode, incoming, staging, samples, interval):
+    folder_watcher = watcher.FolderWatcher(incoming, suffix="mp4", mode=mode, interval=interval)
+    cpu0 = time.process_time()
+    wall0 = time.time()
+    folder_watcher.start()
+    # drain the initial scan
+    while folder_watcher.get(timeout=0.5) is not None:
+        pass
+    t_start = time.process_time() - cpu0
+    latencies = []
+    cpu1 = time.process_time()
+    wall1 = time.time()
+    for i in range(samples):
+        # drop new files at random moments with respect to the poll cycle
+        time.sleep(random.uniform(0, interval))
+        src = os.path.join(staging, f"new_{mode}_{i:03d}.mp4")
+        with open(src, "wb") as f:
+            f.write(b"\0" * 1024)
+        t0 = time.time()
+        os.rename(src, os.path.join(incoming, os.path.basename(src)))
+        while folder_watcher.get(timeout=2 * interval + 5) is None:
+            pass
+        latencies.append(time.time() - t0)
+    cpu_watch = time.process_time() - cpu1
+    wall_watch = time.time() - wall1
+    folder_watcher.stop()
+    print(
+        f"{mode:>8s} | startup {time.time() - wall0 - wall_watch:6.2f} s wall, {t_start:6.2f} s CPU | "
+        f"latency mean {statistics.mean(latencies) * 1000:8.1f} ms, max {max(latencies) * 1000:8.1f} ms | "
+        f"CPU while watching {cpu_watch / wall_watch * 100:5.2f} %"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=10000, help="number of files in the incoming tree")
+    parser.add_argument("--samples", type=int, default=20, help="number of new files to detect per mode")
+    parser.add_argument("--interval", type=float, default=5., help="poll interval [s]")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        incoming = os.path.join(tmp, "incoming")
+        staging = os.path.join(tmp, "staging")
+        os.makedirs(staging)
+        make_tree(incoming, args.files)
+        print(f"Incoming tree with {args.files} files, {args.samples} new files per mode")
+        modes = ["poll"]
+        if watcher.inotify_available():
+            modes.append("inotify")
+        for mode in modes:
+            run(mode, incoming, staging, args.samples, args.interval)
+
+
+if __name__ == "__main__":
+    main()
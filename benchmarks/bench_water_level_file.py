@@ -0,0 +1,76 @@
+"""Benchmark water level lookups from a daily water level file, with and without the parsed-file cache.
+
+A water level file with one water level per second for a day is written, and the water level of a number of video
+timestamps is looked up in it. Without the cache, the file is parsed for every lookup, either with a Python
+``strptime`` per line (as older versions of NodeORC did) or with vectorized datetime parsing. With the cache, the
+file is parsed once. Finally, the time to pick up one appended line (as the current day's file grows) is measured.
+
+Usage::
+
+    python benchmarks/bench_water_level_file.py [--lines 86400] [--lookups 50]
+
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from nodeorc import water_level
+
+FMT = "%Y%m%d_%H%M%S"
+
+
+def strptime_lookup(fn, timestamp):
+    df = pd.read_csv(fn, index_col=[0], sep=" ", header=None, names=["water_level"], dtype={0: str})
+    df.index = pd.DatetimeIndex([datetime.strptime(t, FMT) for t in df.index])
+    i = min(df.index.searchsorted(timestamp), len(df) - 1)
+    return df.iloc[i].values[0]
+
+
+def vectorized_lookup(fn, timestamp):
+    df = water_level.read_water_level_file(fn, FMT)
+    i = min(df.index.searchsorted(timestamp), len(df) - 1)
+    return df.iloc[i].values[0]
+
+
+def cached_lookup(fn, timestamp):
+    return water_level.get_water_level_file(timestamp, fn, FMT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=86400, help="number of lines in the water level file")
+    parser.add_argument("--lookups", type=int, default=50, help="number of lookups per method")
+    args = parser.parse_args()
+    t0 = datetime(2023, 1, 1)
+    rng = np.random.default_rng(0)
+    timestamps = [t0 + timedelta(seconds=int(s)) for s in rng.integers(0, args.lines, args.lookups)]
+    with tempfile.TemporaryDirectory() as tmp:
+        fn = os.path.join(tmp, "wl_20230101.txt")
+        with open(fn, "w") as f:
+            f.writelines(f"{(t0 + timedelta(seconds=i)).strftime(FMT)} {i / 1000:.3f}\n" for i in range(args.lines))
+        print(f"water level file with {args.lines} lines, {args.lookups} lookups")
+        print(f"{'method':>22s} | {'lookup [ms]':>11s}")
+        for name, fn_lookup in [
+            ("parse, strptime", strptime_lookup),
+            ("parse, vectorized", vectorized_lookup),
+            ("cached", cached_lookup),
+        ]:
+            tic = time.perf_counter()
+            for t in timestamps:
+                fn_lookup(fn, t)
+            print(f"{name:>22s} | {(time.perf_counter() - tic) / args.lookups * 1000:11.3f}")
+        with open(fn, "a") as f:
+            f.write(f"{(t0 + timedelta(seconds=args.lines)).strftime(FMT)} 0.0\n")
+        tic = time.perf_counter()
+        cached_lookup(fn, t0 + timedelta(seconds=args.lines))
+        print(f"{'cached, appended line':>22s} | {(time.perf_counter() - tic) * 1000:11.3f}")
+
+
+if __name__ == "__main__":
+    main()
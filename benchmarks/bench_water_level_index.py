@@ -0,0 +1,91 @@
+"""Benchmark closest water level lookups in a time series of 1 million records.
+
+A temporary database is filled with a water level every 10 minutes (1 million records cover 19 years). Lookups for
+random timestamps are then done with the two ordered SQL queries (before and after the timestamp) that
+``db_ops.get_water_level`` used before, and with the in-memory ``WaterLevelIndex``, both directly and through
+``db_ops.get_water_level`` (index lookup plus fetching the record by primary key). Interpolated lookups are timed
+in the same way.
+
+Usage::
+
+    python benchmarks/bench_water_level_index.py [--records 1000000] [--lookups 100]
+
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from nodeorc import db, db_ops
+from nodeorc.db import TimeSeries
+
+
+def fill(session, n, t0):
+    chunk = 100000
+    for start in range(0, n, chunk):
+        session.execute(
+            insert(TimeSeries),
+            [{"timestamp": t0 + timedelta(minutes=10 * i), "h": float(i % 100) / 100} for i in
+             range(start, min(start + chunk, n))]
+        )
+    session.commit()
+
+
+def lookup_sql(session, timestamp):
+    before = session.query(TimeSeries).filter(TimeSeries.timestamp <= timestamp).order_by(
+        TimeSeries.timestamp.desc()).first()
+    after = session.query(TimeSeries).filter(TimeSeries.timestamp > timestamp).order_by(TimeSeries.timestamp).first()
+    return before, after
+
+
+def timeit(fn, timestamps):
+    t0 = time.perf_counter()
+    for t in timestamps:
+        fn(t)
+    return (time.perf_counter() - t0) / len(timestamps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=1000000, help="number of water level records")
+    parser.add_argument("--lookups", type=int, default=100, help="number of lookups per method")
+    args = parser.parse_args()
+    t0 = datetime(2000, 1, 1)
+    rng = np.random.default_rng(0)
+    timestamps = [t0 + timedelta(seconds=float(s)) for s in rng.uniform(0, args.records * 600, args.lookups)]
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        # only create the tables needed
+        db.Base.metadata.create_all(engine, tables=[db.Video.__table__, TimeSeries.__table__])
+        session = sessionmaker(bind=engine)()
+        tic = time.perf_counter()
+        fill(session, args.records, t0)
+        print(f"{args.records} records written in {time.perf_counter() - tic:.1f} s")
+
+        tic = time.perf_counter()
+        index = db_ops.get_water_level_index(session)
+        print(f"index of {len(index)} records loaded in {time.perf_counter() - tic:.2f} s, "
+              f"{(index._t.nbytes + index._h.nbytes + index._id.nbytes) / 1024 ** 2:.0f} MB")
+        print(f"{'method':>28s} | {'per lookup [ms]':>15s}")
+        results = [
+            ("SQL before/after", timeit(lambda t: lookup_sql(session, t), timestamps[:10])),
+            ("WaterLevelIndex.nearest", timeit(index.nearest, timestamps)),
+            ("db_ops.get_water_level", timeit(lambda t: db_ops.get_water_level(session, t), timestamps)),
+            ("WaterLevelIndex.interpolate", timeit(index.interpolate, timestamps)),
+            ("get_water_level interpolate", timeit(
+                lambda t: db_ops.get_water_level(session, t, interpolate=True), timestamps
+            )),
+        ]
+        for name, duration in results:
+            print(f"{name:>28s} | {duration * 1000:15.4f}")
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
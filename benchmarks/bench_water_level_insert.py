@@ -0,0 +1,62 @@
+"""Benchmark inserting water levels one by one and in bulk.
+
+Water levels, e.g. from a historical water level file, are written to a temporary database with
+``db_ops.add_water_level`` (one transaction per record, timed on a subset and extrapolated) and with
+``db_ops.add_water_levels`` (one transaction for all records, existing timestamps skipped by the database). The
+bulk insert is then repeated to time the import of a file that is already in the database.
+
+Usage::
+
+    python benchmarks/bench_water_level_insert.py [--records 1000000] [--single 2000]
+
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import sessionmaker
+
+from nodeorc import db, db_ops
+from nodeorc.db.engine import create_sqlite_engine
+
+
+def new_session(tmp, name):
+    engine = create_sqlite_engine(os.path.join(tmp, name))
+    db.Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine, expire_on_commit=False)()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=1000000, help="number of water level records")
+    parser.add_argument("--single", type=int, default=2000, help="number of records inserted one by one")
+    args = parser.parse_args()
+    timestamps = pd.date_range("2000-01-01", periods=args.records, freq="1min")
+    levels = np.random.default_rng(0).random(args.records)
+    with tempfile.TemporaryDirectory() as tmp:
+        session = new_session(tmp, "single.db")
+        tic = time.perf_counter()
+        for t, h in zip(timestamps[:args.single].to_pydatetime(), levels[:args.single]):
+            db_ops.add_water_level(session, t, float(h))
+        single = (time.perf_counter() - tic) / args.single
+        session.close()
+
+        session = new_session(tmp, "bulk.db")
+        tic = time.perf_counter()
+        n = db_ops.add_water_levels(session, timestamps, levels)
+        bulk = time.perf_counter() - tic
+        tic = time.perf_counter()
+        n_again = db_ops.add_water_levels(session, timestamps, levels)
+        again = time.perf_counter() - tic
+        session.close()
+    print(f"{'method':>28s} | {'records':>9s} | {'total [s]':>9s} | {'records/s':>10s}")
+    print(f"{'one by one (extrapolated)':>28s} | {args.records:9d} | {single * args.records:9.1f} | {1 / single:10.0f}")
+    print(f"{'bulk':>28s} | {n:9d} | {bulk:9.1f} | {args.records / bulk:10.0f}")
+    print(f"{'bulk, all existing':>28s} | {n_again:9d} | {again:9.1f} | {args.records / again:10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Benchmark CPU-seconds per water level reading with a new interpreter per reading and with a persistent worker.
+
+A typical PYTHON water level script imports a client library and prints one reading. The script is run a number of
+times with ``execute_water_level_script`` (a new interpreter per reading) and with ``WaterLevelScriptWorker`` (one
+worker process for all readings). CPU time is the user and system time of this process and all its child
+processes, so that it includes interpreter start up and imports.
+
+Usage::
+
+    python benchmarks/bench_water_level_script.py [--readings 20] [--imports requests]
+
+"""
+import argparse
+import resource
+import time
+
+from nodeorc.water_level import execute_water_level_script, WaterLevelScriptWorker
+
+
+def cpu_time():
+    """User and system time of this process and its terminated child processes."""
+    self, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    return self.ru_utime + self.ru_stime + children.ru_utime + children.ru_stime
+
+
+def measure(fn, readings):
+    cpu0, t0 = cpu_time(), time.perf_counter()
+    fn(readings)
+    return (cpu_time() - cpu0) / readings, (time.perf_counter() - t0) / readings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readings", type=int, default=20, help="number of readings per method")
+    parser.add_argument("--imports", nargs="*", default=["requests"], help="modules imported by the script")
+    args = parser.parse_args()
+    script = "\n".join([f"import {module}" for module in args.imports] + ['print("2023-11-01T12:34:56Z,1.23")'])
+
+    def subprocess_readings(n):
+        for _ in range(n):
+            execute_water_level_script(script, "PYTHON")
+
+    def worker_readings(n):
+        # the worker is stopped (and waited for) before measuring, so that its CPU time is counted
+        with WaterLevelScriptWorker(script) as worker:
+            for _ in range(n):
+                worker.read()
+
+    print(f"script importing {', '.join(args.imports) or 'nothing'}, {args.readings} readings")
+    print(f"{'method':>18s} | {'CPU [s/reading]':>15s} | {'wall [s/reading]':>16s}")
+    for name, fn in [("new interpreter", subprocess_readings), ("persistent worker", worker_readings)]:
+        cpu, wall = measure(fn, args.readings)
+        print(f"{name:>18s} | {cpu:15.4f} | {wall:16.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,6 @@
 import numpy as np
 import os
 import requests
-import xarray as xr
 
 # all functions in this files are meant to create callbacks for end points
 # # Inputs must be as follows: task, subtask, tmp
@@ -11,38 +10,128 @@ import xarray as xr
 
 # if no files are returned, then simply make files=None
 
+# fields of the summary of a transect result, stored with the water level in the time series table
+SUMMARY_FIELDS = [
+    "h", "q_05", "q_25", "q_50", "q_75", "q_95", "fraction_velocimetry", "wetted_surface", "wetted_perimeter"
+]
+
+
+def _finite(x):
+    x = float(x)
+    return x if np.isfinite(x) else None
+
+
+def read_summary(fn):
+    """
+    Read a compact summary of the results from a transect file.
+
+    Parameters
+    ----------
+    fn : str
+        path to transect NetCDF file
+
+    Returns
+    -------
+    dict
+        water level h [m], quantiles of river flow q_05 to q_95 [m3/s], fraction of flow that is measured with
+        velocimetry (percentage, of the median), wetted surface [m2] and wetted perimeter [m]. Missing or
+        non-finite values are None.
+
+    """
+    # import lazily, pyorc registers the transect accessor of xarray
+    import pyorc  # noqa: F401
+    import xarray as xr
+    with xr.open_dataset(fn) as ds:
+        h = float(ds.h_a)
+        Q = np.abs(ds.river_flow.values)
+        if "q_nofill" in ds:
+            ds.transect.get_river_flow(q_name="q_nofill")
+            Q_nofill = np.abs(ds.river_flow.values)
+            perc_measured = Q_nofill / Q * 100  # fraction that is truly measured compared to total
+        else:
+            perc_measured = np.nan * Q
+        try:
+            wetted_surface, wetted_perimeter = ds.transect.wetted_surface, ds.transect.wetted_perimeter
+        except Exception:
+            # e.g. no valid water level for the cross section
+            wetted_surface, wetted_perimeter = np.nan, np.nan
+    summary = {"h": h}
+    summary.update({f"q_{int(q * 100):02d}": Q[i] for i, q in enumerate([0.05, 0.25, 0.5, 0.75, 0.95])})
+    summary["fraction_velocimetry"] = perc_measured[2]  # only pass the 50th percentile
+    summary["wetted_surface"] = wetted_surface
+    summary["wetted_perimeter"] = wetted_perimeter
+    return {k: _finite(v) for k, v in summary.items()}
+
+
 def discharge(callback):
-    # open the last file, which contains the transect
-    fn = os.path.join(
-        callback.storage.url,
-        callback.storage.bucket_name,
-        callback.file.remote_name
-    )
-    ds = xr.open_dataset(fn)
-    h = float(ds.h_a)
-    Q = np.abs(ds.river_flow.values)
-    if "q_nofill" in ds:
-        ds.transect.get_river_flow(q_name="q_nofill")
-        Q_nofill = np.abs(ds.river_flow.values)
-        perc_measured = Q_nofill / Q * 100  # fraction that is truly measured compared to total
+    # use the summary made after processing, only read the transect file if there is none
+    if callback.summary is not None:
+        summary = callback.summary
     else:
-        perc_measured = np.nan * Q
+        fn = os.path.join(
+            callback.storage.url,
+            callback.storage.bucket_name,
+            callback.file.remote_name
+        )
+        summary = read_summary(fn)
     # make a json message
     msg = {
         "timestamp": callback.timestamp.strftime("%Y-%m-%dT%H:%M:%SZ"),
-        "h": h if np.isfinite(h) else None,
-        "q_05": Q[0] if np.isfinite(Q[0]) else None,
-        "q_25": Q[1] if np.isfinite(Q[1]) else None,
-        "q_50": Q[2] if np.isfinite(Q[2]) else None,
-        "q_75": Q[3] if np.isfinite(Q[3]) else None,
-        "q_95": Q[4] if np.isfinite(Q[4]) else None,
-        "fraction_velocimetry": perc_measured[2] if np.isfinite(perc_measured[2]) else None  # only pass the 50th percentile
+        **{k: summary.get(k) for k in ["h", "q_05", "q_25", "q_50", "q_75", "q_95", "fraction_velocimetry"]}
     }
     # add the static kwargs
     msg = {**msg, **callback.kwargs}
     files = None
     return msg, files
 
+def downscale_video(fn, max_height):
+    """
+    Downscale a video to a maximum height, to reduce the number of bytes to send.
+
+    The downscaled video is written next to the original as ``<name>_<max_height>p.mp4`` and reused when it already
+    exists.
+
+    Parameters
+    ----------
+    fn : str
+        path to video file
+    max_height : int
+        maximum height [pixels] of the video
+
+    Returns
+    -------
+    str
+        path to the downscaled video, or to the original if it is not higher than ``max_height``
+    """
+    import cv2  # import lazily, only needed for downscaling
+    dst = f"{os.path.splitext(fn)[0]}_{max_height}p.mp4"
+    if os.path.isfile(dst):
+        return dst
+    cap = cv2.VideoCapture(fn)
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if height <= max_height:
+        cap.release()
+        return fn
+    width = int(round(cap.get(cv2.CAP_PROP_FRAME_WIDTH) * max_height / height / 2)) * 2
+    # the extension tells OpenCV the container format
+    tmp = f"{os.path.splitext(dst)[0]}.part.mp4"
+    writer = cv2.VideoWriter(
+        tmp, cv2.VideoWriter_fourcc(*"mp4v"), cap.get(cv2.CAP_PROP_FPS) or 25., (width, max_height)
+    )
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            writer.write(cv2.resize(frame, (width, max_height), interpolation=cv2.INTER_AREA))
+    finally:
+        cap.release()
+        writer.release()
+    # only a complete video gets its final name
+    os.replace(tmp, dst)
+    return dst
+
+
 def video(callback):
     """
     Creates a video callback of an already processed video. Assumes that the processing status is DONE
@@ -64,6 +153,8 @@ def video(callback):
         callback.files_to_send["videofile"].remote_name
     )
     video_name = callback.files_to_send["videofile"].remote_name
+    if callback.video_max_height:
+        video_fn = downscale_video(video_fn, callback.video_max_height)
     img_fn = os.path.join(
         callback.storage.url,
         callback.storage.bucket_name,
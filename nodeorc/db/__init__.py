@@ -1,37 +1,67 @@
 import os
+import threading
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 from .base import Base, RemoteBase, AlchemyEncoder, sqlalchemy_to_dict
-from .callback import Callback
+from .callback import Callback, OutboxError
 from .callback_url import CallbackUrl
 from .device import Device, DeviceStatus, DeviceFormStatus
 from .disk_management import DiskManagement
+from .file_catalogue import CataloguedFile, FILE_CATEGORIES
 from .profile import Profile
 from .video import Video, VideoStatus
 from .settings import Settings
 from .task_form import TaskForm, TaskFormStatus
 from .water_level_settings import WaterLevelSettings, ScriptType
-from .time_series import TimeSeries
+from .time_series import TimeSeries, TimeSeriesSource
 from .camera_config import CameraConfig
+from .migrations import upgrade
+from .engine import create_sqlite_engine
 
 from nodeorc import __home__
 
 db_path_config = os.path.join(
     __home__, "nodeorc_config.db"
 )
-engine_config = create_engine(f"sqlite:///{db_path_config}", connect_args={"check_same_thread": False})
 
-# make the models
-Base.metadata.create_all(engine_config)
+# the engine, the session factory and the session proxy are made on first access (see ``__getattr__``), so that
+# importing nodeorc (e.g. for ``nodeorc --version``) does not open, create or upgrade the database
+_lazy = {}
+_lazy_lock = threading.Lock()
 
-Session = sessionmaker(autocommit=False, autoflush=False, bind=engine_config)
-# Session.configure(bind=engine_config)
-session = Session()
 
-# if no device id is present, then create one
-device_query = session.query(Device)
-if len(device_query.all()) == 0:
-    device = Device()
-    session.add(device)
-    session.commit()
+def _init():
+    """Create the engine and sessions of the configuration database, and create or upgrade its tables."""
+    with _lazy_lock:
+        if _lazy:
+            return _lazy
+        engine = create_sqlite_engine(db_path_config)
+        # make the models
+        Base.metadata.create_all(engine)
+        # add anything that is new since the database was created
+        upgrade(engine)
+        # every thread gets its own session. Records remain readable after commit, so that records loaded in one
+        # thread (e.g. settings) can be read in other threads without a database round trip through the session of
+        # another thread. Thumbnails of videos are made in a background thread for sessions of this database only
+        Session = scoped_session(
+            sessionmaker(
+                autocommit=False,
+                autoflush=False,
+                expire_on_commit=False,
+                bind=engine,
+                info={"make_thumbnails": True}
+            )
+        )
+        # if no device id is present, then create one
+        if Session.query(Device).first() is None:
+            Session.add(Device())
+            Session.commit()
+        # proxy to the session of the calling thread
+        _lazy.update(engine_config=engine, Session=Session, session=Session)
+    return _lazy
+
+
+def __getattr__(name):
+    if name in ("engine_config", "Session", "session"):
+        return _init()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,18 +1,55 @@
 """Model for callback."""
+import hashlib
 import json
+import os
+import shutil
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, DateTime, JSON
+from sqlalchemy import Column, Integer, DateTime, JSON, String, event
 
-from nodeorc import models
+from nodeorc import models, __home__
+from nodeorc.models.callback import close_files
 from nodeorc.db import Base
 
+# files of callbacks that wait for a retry are kept here, one folder per callback
+OUTBOX_DIRECTORY = os.path.join(__home__, "outbox")
+
+
+def file_checksum(fn, chunk_size=1024 ** 2):
+    """SHA-256 checksum of a file, read in chunks."""
+    sha256 = hashlib.sha256()
+    with open(fn, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class OutboxError(ValueError):
+    """Raised when the files of a stored callback are missing or have changed, so that it can never be sent."""
+
 
 class Callback(Base):
     __tablename__ = "callback"
     id = Column(Integer, primary_key=True)
     created_at = Column(DateTime, default=lambda: datetime.now())
     body = Column(JSON)
+    func_name = Column(String, comment="Name of the function that rendered the callback")
+    endpoint = Column(String, comment="End point of the callback, relative to the callback url")
+    request_type = Column(String, comment="HTTP method of the callback, e.g. POST or PATCH")
+    data = Column(JSON, comment="Rendered message body of the callback")
+    files = Column(
+        JSON,
+        comment="Files sent with the callback, as list of dicts with field, name, path (in the outbox), size and "
+                "sha256 checksum"
+    )
+    attempts = Column(Integer, default=0, comment="Number of failed attempts to send the stored callback")
+    next_attempt = Column(
+        DateTime,
+        nullable=True,
+        index=True,
+        comment="Moment after which the callback is sent again, empty to send it at the next occasion"
+    )
+    last_error = Column(String, nullable=True, comment="Reason of the last failed attempt")
 
     def __str__(self):
         return "{}".format(self.body)
@@ -25,4 +62,99 @@ class Callback(Base):
         body = json.loads(self.body)
         return models.Callback(**body)
 
+    @property
+    def chunk_size(self):
+        """Size of chunks in which files are uploaded, None to send files with the callback."""
+        return self.callback.chunk_size if self.body else None
+
+    @property
+    def upload_endpoint(self):
+        return self.callback.upload_endpoint
+
+    @property
+    def upload_id(self):
+        return self.callback.upload_id
+
+    def set_progress(self, field, offset):
+        """Keep track of the number of bytes of a file that the server received in a chunked upload."""
+        self.files = [
+            {**ref, "offset": offset} if ref["field"] == field else ref for ref in self.files or []
+        ]
+
+    @property
+    def outbox(self):
+        """Storage in which the files of the callback are kept."""
+        return models.Storage(url=OUTBOX_DIRECTORY, bucket_name=str(self.id))
+
+    @property
+    def rendered(self):
+        """True if the callback was stored with its rendered message body, False for older records."""
+        return self.data is not None
+
+    def store_files(self, files):
+        """
+        Keep the files of a rendered callback in the outbox, so that they can be sent even if the originals are moved
+        or removed.
+
+        Files are hard-linked into the outbox where possible, so that no data is copied. The callback must have an
+        id (i.e. be flushed) first.
+
+        Parameters
+        ----------
+        files : dict or None
+            files as returned by the callback function, in the form {field: (name, file object)}
+
+        """
+        refs = []
+        for field, (name, f) in (files or {}).items():
+            dest = f"{field}_{name}"
+            self.outbox.upload_file(f.name, dest)
+            path = os.path.join(self.outbox.bucket, dest)
+            refs.append({
+                "field": field,
+                "name": name,
+                "path": path,
+                "size": os.path.getsize(path),
+                "sha256": file_checksum(path),
+            })
+        self.files = refs
+
+    def get_body(self):
+        """
+        Get the message body and files of the callback as stored, without rendering it again.
+
+        Older records without rendered body are rendered from the callback model.
+
+        Returns
+        -------
+        data : dict
+            message body
+        files : dict or None
+            files in the form {field: (name, file object)}
+
+        Raises
+        ------
+        OutboxError
+            If a file of the callback is missing or has changed (in size or checksum) since the callback was stored.
+
+        """
+        if not self.rendered:
+            return self.callback.get_body()
+        files = {}
+        for ref in self.files or []:
+            if (
+                    not os.path.isfile(ref["path"])
+                    or os.path.getsize(ref["path"]) != ref["size"]
+                    or ("sha256" in ref and file_checksum(ref["path"]) != ref["sha256"])
+            ):
+                close_files(files)
+                raise OutboxError(f"File {ref['path']} of callback {self.id} is missing or has changed")
+            files[ref["field"]] = (ref["name"], open(ref["path"], "rb"))
+        return self.data, files or None
+
 
+@event.listens_for(Callback, "after_delete")
+def delete_outbox_listener(mapper, connection, target):
+    """Delete the files of a callback from the outbox."""
+    if target.id is not None and os.path.isdir(target.outbox.bucket):
+        shutil.rmtree(target.outbox.bucket)
@@ -4,7 +4,6 @@ from sqlalchemy import Column, String, DateTime, JSON, Integer, ForeignKey
 from sqlalchemy.orm import mapped_column, validates, relationship
 
 from nodeorc.db import Base
-import pyorc
 
 class CameraConfig(Base):
     __tablename__ = "camera_config"
@@ -42,7 +41,8 @@ class CameraConfig(Base):
     @validates('camera_config')
     def validate_camera_config(self, key, value):
         """Validate that the provided JSON is a valid camera configuration."""
-        # try to read the config with pyorc
+        # try to read the config with pyorc, imported lazily as it takes seconds to import
+        import pyorc
         try:
             _ = pyorc.CameraConfig(**value)
             return value
@@ -3,8 +3,9 @@
 import os
 
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, Float, Integer
+from sqlalchemy import Column, String, DateTime, Float, Integer, JSON
 from nodeorc.db import Base
+from nodeorc.db.file_catalogue import FILE_CATEGORIES
 from sqlalchemy.orm import validates
 
 class DiskManagement(Base):
@@ -33,6 +34,23 @@ class DiskManagement(Base):
         default=3600,
         comment="Frequency [s] in which the device will be checked for available space and cleanup will occur"
     )
+    quotas = Column(
+        JSON,
+        nullable=True,
+        comment="GB of disk space that each category of files may use, e.g. {\"videos\": 50, \"failed\": 5}. "
+                "The oldest files of a category are removed when it uses more."
+    )
+    retention = Column(
+        JSON,
+        nullable=True,
+        comment="Days that files of each category are kept, e.g. {\"failed\": 30}. Older files are removed."
+    )
+    lead_time = Column(
+        Float,
+        default=86400,
+        comment="Seconds ahead for which space is freed up. When free space is projected to drop under "
+                "min_free_space within this time at the recent rate of writing files, the oldest files are removed."
+    )
 
     @validates("home_folder")
     def validate_home_folder(self, key, value):
@@ -41,6 +59,22 @@ class DiskManagement(Base):
             raise IOError(f"home_folder {value} is not available, disk may be disconnected or wrong path supplied.")
         return value
 
+    @validates("quotas", "retention")
+    def validate_category_limits(self, key, value):
+        """Validate that limits are given per known category of files, and are not negative."""
+        for category, limit in (value or {}).items():
+            if category not in FILE_CATEGORIES:
+                raise ValueError(f"{key} given for category {category}, must be one of {FILE_CATEGORIES}")
+            if limit is None or limit < 0:
+                raise ValueError(f"{key} of category {category} must be 0 or larger, not {limit}")
+        return value
+
+    @validates("lead_time")
+    def validate_lead_time(self, key, value):
+        if value is not None and value < 0:
+            raise ValueError("lead_time must be 0 or larger")
+        return value
+
     @property
     def incoming_path(self):
         return create_join_path(self.home_folder, "incoming")
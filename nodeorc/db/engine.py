@@ -0,0 +1,52 @@
+"""Database engine set up for concurrent use by the NodeORC threads."""
+from sqlalchemy import create_engine, event
+
+# seconds a connection waits for a lock held by another connection, before raising "database is locked"
+BUSY_TIMEOUT = 30.
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record, busy_timeout=BUSY_TIMEOUT):
+    """
+    Configure a new SQLite connection for concurrent access.
+
+    In write-ahead-log (WAL) mode, readers do not block the writer and the writer does not block readers, so that
+    e.g. water levels can be written while videos are being looked up. Writers wait up to ``busy_timeout`` seconds
+    for each other instead of failing immediately.
+
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # in WAL mode, syncing at checkpoints only is safe against corruption
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout * 1000)}")
+    cursor.close()
+
+
+def create_sqlite_engine(db_path: str, busy_timeout: float = BUSY_TIMEOUT):
+    """
+    Create an engine for a SQLite database that can be used from several threads.
+
+    Parameters
+    ----------
+    db_path : str
+        path to SQLite database file
+    busy_timeout : float, optional
+        seconds to wait for a lock held by another connection, by default 30
+
+    Returns
+    -------
+    sqlalchemy.engine.Engine
+
+    """
+    engine = create_engine(
+        f"sqlite:///{db_path}",
+        connect_args={"check_same_thread": False, "timeout": busy_timeout}
+    )
+    event.listen(
+        engine,
+        "connect",
+        lambda dbapi_connection, connection_record: set_sqlite_pragmas(
+            dbapi_connection, connection_record, busy_timeout=busy_timeout
+        )
+    )
+    return engine
@@ -0,0 +1,50 @@
+"""Model for the catalogue of files kept on disk."""
+
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from nodeorc.db import Base
+
+# kinds of files kept on disk, in the order in which they are removed when space runs low
+FILE_CATEGORIES = ["failed", "videos", "images", "thumbnails", "logs", "results"]
+
+
+class CataloguedFile(Base):
+    """
+    A file written by NodeORC, with its size and modification time.
+
+    The catalogue is kept up to date when files are written or removed, so that the oldest files that must be removed
+    to free up a given amount of disk space can be found with a query, instead of scanning folders on disk.
+
+    Attributes
+    ----------
+    id : int
+        Primary key of the record.
+    path : str
+        Absolute path of the file.
+    size : int
+        Size of the file [bytes].
+    mtime : datetime
+        Last modification time of the file.
+    category : str
+        Kind of file, one of ``FILE_CATEGORIES``: "failed" for videos that could not be processed, "videos" for
+        processed raw videos, "images" and "thumbnails", "logs" and "results" (e.g. NetCDF files).
+    video_id : int or None
+        Video of which the file was written, None for other files.
+    """
+    __tablename__ = "file_catalogue"
+    __table_args__ = (
+        # files are purged per category, oldest first
+        Index("ix_file_catalogue_category_mtime", "category", "mtime"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    path = Column(String, nullable=False, unique=True, comment="Absolute path of the file")
+    size = Column(Integer, nullable=False, comment="Size of the file [bytes]")
+    mtime = Column(DateTime, nullable=False, comment="Last modification time of the file")
+    category = Column(String, nullable=False, comment="Kind of file, e.g. failed or results")
+    video_id = Column(Integer, nullable=True, index=True, comment="Video of which the file was written")
+
+    def __str__(self):
+        return "{}: {} ({} bytes)".format(self.category, self.path, self.size)
+
+    def __repr__(self):
+        return "{}".format(self.__str__())
@@ -0,0 +1,133 @@
+"""Upgrade existing NodeORC databases to the current models."""
+import logging
+
+import sqlalchemy
+from sqlalchemy import literal
+
+from nodeorc.db.base import Base
+
+
+def get_column_ddl(column, dialect):
+    """Return the DDL snippet to add ``column`` to an existing table, with its scalar default if it has one."""
+    ddl = f'"{column.name}" {column.type.compile(dialect=dialect)}'
+    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+    if default is not None:
+        default_str = literal(default, column.type).compile(
+            dialect=dialect,
+            compile_kwargs={"literal_binds": True}
+        )
+        ddl += f" DEFAULT {default_str}"
+    return ddl
+
+
+def add_missing_columns(engine, logger=logging):
+    """
+    Add columns that are defined on the models, but missing in existing tables.
+
+    ``Base.metadata.create_all`` only creates missing tables, so that databases created with an older version of
+    NodeORC lack any columns added since. New columns are added with their scalar default, so that existing
+    records get a valid value.
+
+    Parameters
+    ----------
+    engine : sqlalchemy.engine.Engine
+    logger : Logger, optional
+
+    """
+    inspector = sqlalchemy.inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                logger.info(f"Upgrading database: adding column {column.name} to table {table.name}")
+                conn.execute(
+                    sqlalchemy.text(f'ALTER TABLE "{table.name}" ADD COLUMN {get_column_ddl(column, engine.dialect)}')
+                )
+
+
+def remove_duplicates(conn, table, columns, logger=logging):
+    """
+    Remove records with the same values in ``columns`` as another record, so that a unique index can be made.
+
+    Of each group of duplicates, the record with most values is kept (e.g. the water level with results of a video),
+    or the first record if they have as many values. Empty columns of the kept record are filled with the values of
+    the removed records, earliest record first, so that no results or links to other records are lost.
+
+    Parameters
+    ----------
+    conn : sqlalchemy.engine.Connection
+    table : sqlalchemy.Table
+    columns : list[str]
+        names of the columns that must be unique together
+    logger : Logger, optional
+
+    """
+    column_str = ", ".join(f'"{c}"' for c in columns)
+    others = [c.name for c in table.columns if c.name not in columns and not c.primary_key]
+    n_values = " + ".join(f'("{c}" IS NOT NULL)' for c in others) or "0"
+    ranked = (
+        f'SELECT rowid AS id, COUNT(*) OVER (PARTITION BY {column_str}) AS n, '
+        f'ROW_NUMBER() OVER (PARTITION BY {column_str} ORDER BY {n_values} DESC, rowid) AS i FROM "{table.name}"'
+    )
+    if others:
+        same = " AND ".join(f'd."{c}" IS "{table.name}"."{c}"' for c in columns)
+        assignments = ", ".join(
+            f'"{c}" = COALESCE("{c}", (SELECT d."{c}" FROM "{table.name}" AS d WHERE {same} AND d."{c}" IS NOT NULL '
+            f'ORDER BY d.rowid LIMIT 1))' for c in others
+        )
+        conn.execute(
+            sqlalchemy.text(
+                f'UPDATE "{table.name}" SET {assignments} WHERE rowid IN (SELECT id FROM ({ranked}) WHERE i = 1 AND n > 1)'
+            )
+        )
+    n = conn.execute(
+        sqlalchemy.text(f'DELETE FROM "{table.name}" WHERE rowid IN (SELECT id FROM ({ranked}) WHERE i > 1)')
+    ).rowcount
+    if n > 0:
+        logger.warning(
+            f"Upgrading database: removed {n} duplicate records from table {table.name}, their values are merged "
+            f"into the remaining record"
+        )
+
+
+def add_missing_indexes(engine, logger=logging):
+    """
+    Create indexes that are defined on the models, but missing in existing tables.
+
+    As for columns, ``Base.metadata.create_all`` only creates indexes together with new tables. Creating an index
+    on a large table (e.g. years of water levels) may take a few seconds, but only happens once. Existing indexes
+    that became unique are replaced, after removing records that would violate the unique index.
+
+    Parameters
+    ----------
+    engine : sqlalchemy.engine.Engine
+    logger : Logger, optional
+
+    """
+    inspector = sqlalchemy.inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {index["name"]: bool(index["unique"]) for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if existing.get(index.name) == bool(index.unique):
+                    continue
+                if index.name in existing:
+                    logger.info(f"Upgrading database: replacing index {index.name} of table {table.name}")
+                    conn.execute(sqlalchemy.text(f'DROP INDEX "{index.name}"'))
+                else:
+                    logger.info(f"Upgrading database: adding index {index.name} to table {table.name}")
+                if index.unique:
+                    remove_duplicates(conn, table, [c.name for c in index.columns], logger=logger)
+                index.create(conn)
+
+
+def upgrade(engine, logger=logging):
+    """Upgrade the database behind ``engine`` to the current models."""
+    add_missing_columns(engine, logger=logger)
+    add_missing_indexes(engine, logger=logger)
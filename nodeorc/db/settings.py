@@ -5,6 +5,8 @@ from sqlalchemy import Column, String, DateTime, Float, Integer, Boolean
 from sqlalchemy.orm import validates
 from nodeorc.db import Base
 
+QUEUE_POLICIES = ["oldest", "newest", "thin"]
+QUEUE_STALE_ACTIONS = ["defer", "drop"]
 
 class Settings(Base):
     __tablename__ = 'settings'
@@ -51,6 +53,67 @@ class Settings(Base):
         comment="Flag for enabling the daemon. If disabled, the daemon will not be started and the service will "
                 "only run in the foreground."
     )
+    max_workers = Column(
+        Integer,
+        default=1,
+        nullable=False,
+        comment="Maximum number of videos processed at the same time. Values larger than the number of CPU cores "
+                "are capped to the number of cores."
+    )
+    process_pool = Column(
+        Boolean,
+        default=True,
+        nullable=False,
+        comment="Flag for processing videos in separate worker processes (True, default), so that multiple videos can "
+                "use multiple CPU cores, or in threads of the main process (False)."
+    )
+    queue_policy = Column(
+        String,
+        default="oldest",
+        nullable=True,
+        comment="Order in which queued videos are processed: \"oldest\" (default) or \"newest\" first, or "
+                "\"thin\" to only process the newest video of each past period of queue_thin_interval minutes, "
+                "newest first. Other videos of past periods are skipped."
+    )
+    queue_thin_interval = Column(
+        Float,
+        default=60,
+        nullable=True,
+        comment="Period [min] of which only one video of the backlog is processed with queue_policy \"thin\"."
+    )
+    queue_max_depth = Column(
+        Integer,
+        nullable=True,
+        comment="Number of queued videos above which videos older than queue_max_age are deferred or dropped. If "
+                "not set, videos are never deferred or dropped."
+    )
+    queue_max_age = Column(
+        Float,
+        nullable=True,
+        comment="Age [s] above which queued videos are deferred or dropped when the queue is deeper than "
+                "queue_max_depth."
+    )
+    queue_stale_action = Column(
+        String,
+        default="defer",
+        nullable=True,
+        comment="What to do with queued videos older than queue_max_age when the queue is too deep: \"defer\" "
+                "(default) processes them after all other videos, \"drop\" skips them entirely."
+    )
+    callback_max_workers = Column(
+        Integer,
+        default=1,
+        nullable=True,
+        comment="Maximum number of stored callbacks that are sent to the server at the same time when retrying. "
+                "Callbacks of a new video are always sent one after the other."
+    )
+    callback_timeout = Column(
+        Float,
+        default=30.,
+        nullable=True,
+        comment="Timeout [s] for connecting to the server and for waiting for its response, per callback."
+    )
+
     def __str__(self):
         return "Settings {} ({})".format(self.created_at, self.id)
 
@@ -65,6 +128,36 @@ class Settings(Base):
         check_datetime_fmt(cls, value)
         return value
 
+    @validates("callback_max_workers")
+    def check_callback_max_workers(cls, key, value):
+        if value is not None and value < 1:
+            raise ValueError("callback_max_workers must be at least 1")
+        return value
+
+    @validates("callback_timeout")
+    def check_callback_timeout(cls, key, value):
+        if value is not None and value <= 0:
+            raise ValueError("callback_timeout must be larger than 0")
+        return value
+
+    @validates("queue_policy")
+    def check_queue_policy(cls, key, value):
+        if value is not None and value not in QUEUE_POLICIES:
+            raise ValueError(f"queue_policy must be one of {QUEUE_POLICIES}, not {value}")
+        return value
+
+    @validates("queue_stale_action")
+    def check_queue_stale_action(cls, key, value):
+        if value is not None and value not in QUEUE_STALE_ACTIONS:
+            raise ValueError(f"queue_stale_action must be one of {QUEUE_STALE_ACTIONS}, not {value}")
+        return value
+
+    @validates("max_workers")
+    def check_max_workers(cls, key, value):
+        if value is not None and value < 1:
+            raise ValueError("max_workers must be at least 1")
+        return value
+
 
 def check_datetime_fmt(cls, fn_fmt):
     # check string within {}, see if that can be parsed to datetime
@@ -1,10 +1,19 @@
 """Model for water level time series."""
+import enum
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, DateTime, Float, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, Float, ForeignKey, Enum
 from sqlalchemy.orm import relationship
 from nodeorc.db import RemoteBase
 
+
+class TimeSeriesSource(enum.Enum):
+    SCRIPT = 1  # reading of the water level script
+    IMPORT = 2  # imported from a water level file with ``nodeorc upload-water-level-file``
+    FILE = 3  # read from a water level file for the timestamp of a video
+    VIDEO = 4  # water level of a video without a reading at its timestamp (copied, interpolated or detected optically)
+
+
 class TimeSeries(RemoteBase):
     """
     Represents water level data with timestamp and value.
@@ -24,10 +33,12 @@ class TimeSeries(RemoteBase):
         the current UTC datetime at the time of record creation.
     level : float
         The measured water level value. This attribute is mandatory.
+    source : TimeSeriesSource
+        Where the water level comes from. None for records made before the source was stored.
     """
     __tablename__ = "time_series"
     id = Column(Integer, primary_key=True)
-    timestamp = Column(DateTime, default=lambda: datetime.now())
+    timestamp = Column(DateTime, default=lambda: datetime.now(), index=True, unique=True)
     h = Column(Float, nullable=False)
     q_05 = Column(Float, nullable=True)
     q_25 = Column(Float, nullable=True)
@@ -37,6 +48,7 @@ class TimeSeries(RemoteBase):
     wetted_surface = Column(Float, nullable=True)
     wetted_perimeter = Column(Float, nullable=True)
     fraction_velocimetry = Column(Float, nullable=True)
+    source = Column(Enum(TimeSeriesSource), nullable=True, comment="Where the water level comes from")
 
     video_id = Column(Integer, ForeignKey("video.id"))
     video = relationship("Video", uselist=False, back_populates="time_series")
@@ -1,26 +1,37 @@
 """Model for water level time series."""
-import cv2
 import enum
+import logging
 import os
+import queue
 import shutil
+import threading
 
 from datetime import datetime
-from PIL import Image
-from pyorc import Video
-from sqlalchemy import Column, Integer, DateTime, ForeignKey, String, Enum, event
-from sqlalchemy.orm import relationship, mapped_column, Mapped
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, String, Enum, Index, event
+from sqlalchemy.orm import relationship, mapped_column, Mapped, Session, object_session
 from nodeorc import __home__
 from nodeorc.db import RemoteBase
 from typing import Optional
 
 UPLOAD_DIRECTORY = os.path.join(__home__, "uploads")
+IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png"]
 
-def create_thumbnail(image_path: str, size=(50, 50)) -> Image:
-    """Create thumbnail for image."""
-    cap = cv2.VideoCapture(image_path)
-    res, image = cap.read()
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    img = Image.fromarray(image)
+def create_thumbnail(image_path: str, size=(50, 50)):
+    """Create thumbnail for image, or for the first frame of a video, as PIL Image."""
+    # import lazily, only needed when thumbnails are made
+    from PIL import Image
+    if os.path.splitext(image_path)[1].lower() in IMAGE_EXTENSIONS:
+        img = Image.open(image_path)
+        # only decode as much of a JPEG as needed for the thumbnail size
+        img.draft("RGB", (size[0] * 2, size[1] * 2))
+        img = img.convert("RGB")
+    else:
+        import cv2
+        cap = cv2.VideoCapture(image_path)
+        res, image = cap.read()
+        cap.release()
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        img = Image.fromarray(image)
     img.thumbnail(size, Image.LANCZOS)
     return img
 
@@ -31,6 +42,7 @@ class VideoStatus(enum.Enum):
     TASK = 3
     DONE = 4
     ERROR = 5
+    SKIPPED = 6  # dropped from the queue without processing
 
 
 class Video(RemoteBase):
@@ -58,16 +70,24 @@ class Video(RemoteBase):
         The thumbnail of the video. Can be null.
     camera_config : int
         Foreign key linking to the associated camera configuration.
+    lease_expires : datetime or None
+        Moment until which a video with status TASK is claimed by a worker. After that, the video may be claimed
+        again.
     """
     __tablename__ = "video"
+    __table_args__ = (
+        # queue operations filter on status and order by timestamp
+        Index("ix_video_status_timestamp", "status", "timestamp"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    timestamp: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now())
+    timestamp: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(), index=True)
     status: Mapped[enum.Enum] = mapped_column(Enum(VideoStatus), default=VideoStatus.NEW)
     file: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     image: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     thumbnail: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     camera_config_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("camera_config.id"), nullable=True)  # relate by id
+    lease_expires: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)  # end of claim on a TASK video
     # time_series = Column(ForeignKey("time_series.id"))
     camera_config = relationship("CameraConfig")
     time_series = relationship("TimeSeries", uselist=False, back_populates="video")
@@ -78,20 +98,132 @@ class Video(RemoteBase):
     def __repr__(self):
         return "{}".format(self.__str__())
 
-@event.listens_for(Video, "before_insert")
-@event.listens_for(Video, "before_update")
-def create_thumbnail_listener(mapper, connection, target):
-    """Create a thumbnail if this does not yet exist."""
-    if target.file and not target.thumbnail:
-        # now make a thumbnail and store
-        rel_thumb_path = f"{os.path.splitext(target.file)[0]}_thumb.jpg"
-        abs_file_path = os.path.join(UPLOAD_DIRECTORY, target.file)
-        abs_thumb_path = os.path.join(UPLOAD_DIRECTORY, rel_thumb_path)
-        # only if we are 100% sure the video file exists, we create a thumb
-        if os.path.exists(abs_file_path):
-            thumb = create_thumbnail(abs_file_path)
-            thumb.save(abs_thumb_path, "JPEG")
-            target.thumbnail = rel_thumb_path
+class ThumbnailQueue:
+    """
+    Creates thumbnails of videos in a background thread, after the video records are committed.
+
+    Thumbnails are made from the image of the results of a video if it has one, so that the video does not need to
+    be decoded. Otherwise, the first frame of the video is used. The thread stops when there is nothing to do for
+    ``idle_timeout`` seconds, and is started again when needed.
+
+    Parameters
+    ----------
+    size : tuple, optional
+        maximum (width, height) of thumbnails, by default (50, 50)
+    idle_timeout : float, optional
+        seconds after which an idle thread stops, by default 60
+    logger : logging.Logger, optional
+
+    """
+    def __init__(self, size=(50, 50), idle_timeout=60., logger=logging):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.logger = logger
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def put(self, engine, video_id):
+        """Queue the creation of the thumbnail of a video in the database of ``engine``."""
+        with self._lock:
+            self._queue.put((engine, video_id))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="thumbnails", daemon=True)
+                self._thread.start()
+
+    def join(self):
+        """Wait until all queued thumbnails are made."""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            try:
+                engine, video_id = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                with self._lock:
+                    if self._queue.empty():
+                        self._thread = None
+                        return
+                continue
+            try:
+                self.make(engine, video_id)
+            except Exception as e:
+                self.logger.error(f"Could not create thumbnail of video {video_id}. Reason: {e}")
+            finally:
+                self._queue.task_done()
+
+    def make(self, engine, video_id):
+        """
+        Create the thumbnail of a video and fill in its path.
+
+        Returns
+        -------
+        str or None
+            path of the thumbnail relative to the uploads folder, None if no thumbnail was made.
+        """
+        from nodeorc import db_ops  # import lazily to prevent circular imports
+        with Session(engine) as session:
+            video = session.get(Video, video_id)
+            if video is None or video.thumbnail:
+                return None
+            sources = [fn for fn in [video.image, video.file] if fn]
+            sources = [fn for fn in sources if os.path.isfile(os.path.join(UPLOAD_DIRECTORY, fn))]
+            if len(sources) == 0:
+                return None
+            rel_thumb_path = f"{os.path.splitext(video.file or video.image)[0]}_thumb.jpg"
+            thumb = create_thumbnail(os.path.join(UPLOAD_DIRECTORY, sources[0]), size=self.size)
+            thumb.save(os.path.join(UPLOAD_DIRECTORY, rel_thumb_path), "JPEG")
+            # only the thumbnail is written, the video may have been changed by others in the meantime. A bulk update
+            # does not queue the video again.
+            session.query(Video).filter(Video.id == video_id, Video.thumbnail.is_(None)).update(
+                {Video.thumbnail: rel_thumb_path}, synchronize_session=False
+            )
+            # the files of the video were catalogued before the thumbnail was made, add it in the same transaction
+            db_ops.add_files(
+                session, [os.path.join(UPLOAD_DIRECTORY, rel_thumb_path)], "thumbnails", video_id=video_id
+            )
+        return rel_thumb_path
+
+
+# thumbnails of all databases are made in one background thread
+thumbnail_queue = ThumbnailQueue()
+
+
+@event.listens_for(Video, "after_insert")
+@event.listens_for(Video, "after_update")
+def queue_thumbnail_listener(mapper, connection, target):
+    """
+    Note videos that need a thumbnail. Thumbnails are made in the background, once the video is committed.
+
+    Only sessions with ``info={"make_thumbnails": True}`` (the sessions of ``nodeorc.db``) make thumbnails, as the
+    background thread opens its own connections to the database of the session. Other sessions, e.g. of an
+    in-memory database, which is not shared between connections, do not make thumbnails.
+    """
+    if target.thumbnail:
+        return
+    session = object_session(target)
+    if session is None or not session.info.get("make_thumbnails"):
+        return
+    # a queued video is still being moved or processed, its thumbnail is made from the results image later
+    if target.image or (target.file and target.status not in [VideoStatus.QUEUE, VideoStatus.TASK]):
+        session.info.setdefault("thumbnails", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def create_thumbnails_listener(session):
+    """Queue the creation of thumbnails of videos noted in the committed transaction."""
+    video_ids = session.info.pop("thumbnails", None)
+    if video_ids:
+        engine = session.get_bind()
+        for video_id in sorted(video_ids):
+            thumbnail_queue.put(engine, video_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def forget_thumbnails_listener(session, previous_transaction):
+    """Forget videos noted for a thumbnail in a transaction that was rolled back."""
+    session.info.pop("thumbnails", None)
+
 
 @event.listens_for(Video, "before_delete")
 def delete_files_listener(mapper, connection, target):
@@ -44,7 +44,10 @@ class WaterLevelSettings(Base):
         String,
         default="print(\"2000-01-01T00:00:00Z, 10\")",
         comment="Content of the script to be executed to retrieve water level data from the device or API. Script must "
-                "print a water level value to stdout in the form \"%Y-%m-%dT%H:%M:%SZ, <value>\""
+                "print a water level value to stdout in the form \"%Y-%m-%dT%H:%M:%SZ, <value>\". Several water "
+                "levels may be printed, one per line. The timestamp of the last water level in the database is "
+                "available to the script in environment variable NODEORC_WATER_LEVEL_SINCE (same format), so that "
+                "only missing water levels need to be retrieved."
     )
     optical = Column(
         Boolean,
@@ -52,6 +55,21 @@ class WaterLevelSettings(Base):
         comment="Whether to measure water level optically if no water level can be retrieved from the database or "
                 "files. "
     )
+    persistent_script = Column(
+        Boolean,
+        default=True,
+        comment="Whether to keep a PYTHON script loaded in a long-lived worker process, which saves starting a new "
+                "interpreter and importing modules for every water level retrieval. If False, a new interpreter is "
+                "started for every retrieval. BASH scripts are always run in a new shell."
+    )
+    interpolate = Column(
+        Boolean,
+        default=False,
+        comment="Whether to interpolate the water level of a video linearly between the water levels before and "
+                "after the video timestamp. Both must be within the allowed_dt of the settings. If False, or if "
+                "interpolation is not possible, the water level closest in time is used. Interpolated water levels "
+                "are stored at the video timestamp."
+    )
     def __str__(self):
         return "WaterLevel: {} ({})".format(self.created_at, self.id)
 
@@ -1,9 +1,27 @@
+import numpy as np
+import os
+import pandas as pd
 import sqlalchemy
+import threading
+import weakref
 
-from datetime import datetime
-from typing import Optional, Literal
+from datetime import datetime, timedelta
+from typing import Optional, Literal, Union
 
-from nodeorc import db
+from nodeorc import db, water_level
+
+# in-memory water level indexes per database engine
+_water_level_indexes = weakref.WeakKeyDictionary()
+_water_level_index_lock = threading.Lock()
+# primary keys of current configuration records per database engine
+_config_cache = weakref.WeakKeyDictionary()
+# number of times configuration records were written per database engine and model, so that sessions know when
+# records they loaded earlier must be reloaded
+_config_generation = weakref.WeakKeyDictionary()
+
+# sources of water levels that were read, other water levels are only stored with the results of a video
+READING_SOURCES = [db.TimeSeriesSource.SCRIPT, db.TimeSeriesSource.IMPORT]
+CONFIG_MODELS = [db.Settings, db.DiskManagement, db.CallbackUrl, db.WaterLevelSettings, db.TaskForm]
 
 def add_config(
         session: sqlalchemy.orm.session.Session,
@@ -55,6 +73,7 @@ def add_config(
 
 
 
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 from nodeorc.db import WaterLevelSettings, TimeSeries
 
@@ -124,59 +143,133 @@ def add_replace_water_level_script(
 def get_session():
     return db.session
 
+
+def reset_config_cache(session, model):
+    """
+    Forget cached configuration records of a model, and make all sessions reload the records when they get them.
+
+    This is done automatically when records are written through the ORM. Bulk updates or deletes (e.g. with
+    ``Query.update``) must call it after commit.
+
+    Parameters
+    ----------
+    session : Session
+        Active SQLAlchemy database session.
+    model : Base
+        configuration model, one of CONFIG_MODELS
+    """
+    _reset_config_cache(session.get_bind(), model)
+
+
+def _reset_config_cache(engine, model):
+    cache = _config_cache.get(engine)
+    if cache:
+        # other threads may be adding keys, iterate over a copy
+        for key in list(cache):
+            if key[0] is model:
+                cache.pop(key, None)
+    generation = _config_generation.setdefault(engine, {})
+    generation[model] = generation.get(model, 0) + 1
+
+
+def _invalidate_config_cache(mapper, connection, target):
+    """Forget cached configuration records of the written model, again once the write is committed."""
+    _reset_config_cache(connection.engine, type(target))
+    session = sqlalchemy.orm.object_session(target)
+    if session is not None:
+        session.info.setdefault("config_written", set()).add(type(target))
+
+
+def _invalidate_committed_config_cache(session):
+    """Make other sessions reload configuration records written in the committed transaction."""
+    for model in session.info.pop("config_written", ()):
+        _reset_config_cache(session.get_bind(), model)
+
+
+for _model in CONFIG_MODELS:
+    for _event in ["after_insert", "after_update", "after_delete"]:
+        sqlalchemy.event.listen(_model, _event, _invalidate_config_cache)
+sqlalchemy.event.listen(Session, "after_commit", _invalidate_committed_config_cache)
+
+
+def _get_first(session, model, status=None):
+    """Get the first record of a configuration model, optionally with a given status.
+
+    The primary key of the record is cached per database, so that repeated calls only need the record from the
+    session, or a query on primary key. Otherwise, a single LIMIT 1 query is done. The cache is invalidated when
+    records of the model are written. Records are not expired on commit, so after a write (e.g. by another thread)
+    the record is reloaded from the database once.
+
+    Parameters
+    ----------
+    session : Session
+        Active SQLAlchemy database session.
+    model : Base
+        configuration model, one of CONFIG_MODELS
+    status : enum.Enum, optional
+        status the record must have
+
+    Returns
+    -------
+    Base or None
+        first record, None if no record exists
+    """
+    engine = session.get_bind()
+    cache = _config_cache.setdefault(engine, {})
+    key = (model, status)
+    # the record in this session may be older than the last write of the model
+    generation = _config_generation.get(engine, {}).get(model, 0)
+    seen = session.info.setdefault("config_generation", {})
+    reload = seen.get(key) != generation
+    seen[key] = generation
+    pk = cache.get(key)
+    if pk is not None:
+        record = session.get(model, pk, populate_existing=reload)
+        if record is not None and (status is None or record.status == status):
+            return record
+    query = session.query(model)
+    if reload:
+        query = query.populate_existing()
+    if status is not None:
+        query = query.filter_by(status=status)
+    record = query.first()
+    if record is None:
+        cache.pop(key, None)
+    else:
+        cache[key] = record.id
+    return record
+
+
 def get_settings(session):
     """Get current settings."""
-    q = session.query(db.Settings)
-    if len(q.all()) == 0:
-        return None
-    return q.first()
+    return _get_first(session, db.Settings)
 
 
 def get_disk_management(session):
     """Get current disk management."""
-    q = session.query(db.DiskManagement)
-    if len(q.all()) == 0:
-        return None
-    return q.first()
+    return _get_first(session, db.DiskManagement)
+
 
 def get_callback_url(session):
     """Get current callback url."""
-    q = session.query(db.CallbackUrl)
-    if len(q.all()) == 0:
-        return None
-    return q.first()
+    return _get_first(session, db.CallbackUrl)
 
 
 def get_water_level_settings(session):
     """Get current water level settings."""
-    q = session.query(WaterLevelSettings)
-    if len(q.all()) == 0:
-        return None
-    return q.first()
+    return _get_first(session, WaterLevelSettings)
 
 
 def get_active_task_form(session, parse=False, allow_candidate=True):
-    query = session.query(db.TaskForm)
-    if len(query.all()) == 0:
-        # there are no task forms yet, return None
-        return None
-
-    # assume a search in the accepted task forms is needed
-    get_accepted = True
+    task_form = None
     if allow_candidate:
         # first check for a candidate
-        query_candidate = query.filter_by(status=db.TaskFormStatus.CANDIDATE)
-        if len(query_candidate.all()) > 0:
-            # accepted task form not needed
-            get_accepted = False
-            query = query_candidate
-
-    if get_accepted:
+        task_form = _get_first(session, db.TaskForm, status=db.TaskFormStatus.CANDIDATE)
+    if task_form is None:
         # find the single task form that is active
-        query = query.filter_by(status=db.TaskFormStatus.ACCEPTED)
-        if len(query.all()) == 0:
-            return None
-    task_form = query.first()
+        task_form = _get_first(session, db.TaskForm, status=db.TaskFormStatus.ACCEPTED)
+    if task_form is None:
+        return None
     # check if task body can be parsed. If version upgrade occurred this may turn invalid
     if parse:
         task_form = task_form.task_body
@@ -184,11 +277,7 @@ def get_active_task_form(session, parse=False, allow_candidate=True):
 
 
 def get_water_level_config(session):
-    query = session.query(WaterLevelSettings)
-    if len(query.all()) == 0:
-        # there are no task forms yet, return None
-        return None
-    return session.query(WaterLevelSettings).first()
+    return get_water_level_settings(session)
 
 
 def patch_active_config_to_accepted():
@@ -217,7 +306,8 @@ def get_data_folder():
 def add_water_level(
     session: Session,
     timestamp: datetime,
-    level: float
+    level: float,
+    source: db.TimeSeriesSource = db.TimeSeriesSource.SCRIPT,
 ):
     """
     Adds a new water level record to the database using the provided session.
@@ -230,23 +320,34 @@ def add_water_level(
         Timestamp of the water level reading.
     level : float
         Water level value [m].
+    source : TimeSeriesSource, optional
+        Where the water level comes from, by default a reading of the water level script. A reading takes the place
+        of a water level stored for a video at the same timestamp, the results of the video are kept.
 
     Returns
     -------
     TimeSeries
-        The created water level record.
+        The created water level record, or the existing record at the timestamp.
     """
     try:
         # check if the time stamp already exists in the database
         water_level = session.query(TimeSeries).filter_by(timestamp=timestamp).first()
-        if not water_level:
+        if water_level and water_level.source not in READING_SOURCES + [None] and source in READING_SOURCES:
+            water_level.h, water_level.source = level, source
+            session.commit()
+            _reset_water_level_index(session)
+        elif not water_level:
             # Create a new instance of WaterLevelSettings with given data
             water_level = TimeSeries(
                 timestamp=timestamp,
-                h=level
+                h=level,
+                source=source
             )
             session.add(water_level)  # Add record to the session
             session.commit()  # Commit the transaction
+            if session.get_bind() in _water_level_indexes:
+                # add the new record to the in-memory index
+                get_water_level_index(session)
         return water_level  # Return the new record
     except Exception as e:
         # Rollback session in case of an error
@@ -254,10 +355,192 @@ def add_water_level(
         raise ValueError(f"Failed to add water level: {e}")
 
 
+def add_water_levels(
+    session: Session,
+    timestamps,
+    levels,
+    source: db.TimeSeriesSource = db.TimeSeriesSource.SCRIPT,
+    chunk_size: int = 50000,
+):
+    """
+    Adds many water level records to the database in one transaction, skipping timestamps that already exist.
+
+    Records are inserted with INSERT ... ON CONFLICT DO NOTHING on the unique timestamp, so that existing records
+    (and duplicates within the new records) are skipped by the database itself, without a lookup per record.
+    Readings take the place of water levels stored for videos at the same timestamp (see ``add_result_summary``),
+    the results of the videos are kept.
+
+    Parameters
+    ----------
+    session : Session
+        Active SQLAlchemy database session.
+    timestamps : array-like of datetime
+        Timestamps of the water levels, e.g. a list of datetimes or a pandas DatetimeIndex.
+    levels : array-like of float
+        Water level values [m]. Missing values (NaN) are skipped.
+    source : TimeSeriesSource, optional
+        Where the water levels come from, by default readings of the water level script.
+    chunk_size : int, optional
+        Number of records sent to the database per statement, by default 50000.
+
+    Returns
+    -------
+    int
+        Number of records added, or taken over from water levels stored for videos.
+    """
+    timestamps = pd.DatetimeIndex(timestamps)
+    if timestamps.tz is not None:
+        # SQLite does not allow for tzinfo in a time stamp
+        timestamps = timestamps.tz_localize(None)
+    timestamps = timestamps.to_pydatetime()
+    levels = np.asarray(levels, dtype=np.float64)
+    if len(timestamps) != len(levels):
+        raise ValueError(f"Got {len(timestamps)} timestamps for {len(levels)} water levels")
+    valid = ~np.isnan(levels)
+    statement = sqlite_insert(TimeSeries.__table__).on_conflict_do_nothing(index_elements=["timestamp"])
+    table = TimeSeries.__table__
+    replace = sqlalchemy.update(table).where(
+        table.c.timestamp == sqlalchemy.bindparam("t"),
+        # no IN operator, which cannot be used with many parameter sets
+        sqlalchemy.or_(*[table.c.source == s for s in db.TimeSeriesSource if s not in READING_SOURCES]),
+    ).values(h=sqlalchemy.bindparam("new_h"), source=sqlalchemy.bindparam("new_source", type_=table.c.source.type))
+    n, n_replaced = 0, 0
+    try:
+        conn = session.connection()
+        if source in READING_SOURCES and valid.any() and session.query(TimeSeries.id).filter(
+            sqlalchemy.not_(_is_reading()),
+            TimeSeries.timestamp.between(min(timestamps[valid]), max(timestamps[valid]))
+        ).first() is not None:
+            # only when videos have water levels within the time span of the readings
+            n_replaced = conn.execute(replace, [
+                {"t": t, "new_h": h, "new_source": source} for t, h, v in zip(timestamps, levels.tolist(), valid) if v
+            ]).rowcount
+        for i in range(0, len(levels), chunk_size):
+            rows = [
+                {"timestamp": t, "h": h, "source": source} for t, h, v in zip(
+                    timestamps[i:i + chunk_size],
+                    levels[i:i + chunk_size].tolist(),
+                    valid[i:i + chunk_size]
+                ) if v
+            ]
+            if rows:
+                n += conn.execute(statement, rows).rowcount
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        raise ValueError(f"Failed to add water levels: {e}")
+    if n_replaced:
+        _reset_water_level_index(session)
+    elif n and session.get_bind() in _water_level_indexes:
+        # add the new records to the in-memory index
+        get_water_level_index(session)
+    return n + n_replaced
+
+
+def _reset_water_level_index(session: Session):
+    """Load the in-memory water level index again on next use, e.g. after existing records became readings."""
+    with _water_level_index_lock:
+        index = _water_level_indexes.get(session.get_bind())
+        if index is not None:
+            index.clear()
+
+
+def _is_reading():
+    """Filter for water levels that were read (by the script or imported), not stored for a video."""
+    return sqlalchemy.or_(TimeSeries.source.is_(None), TimeSeries.source.in_(READING_SOURCES))
+
+
+def get_last_water_level_timestamp(session: Session):
+    """Get the timestamp of the most recent reading of the water level script, None if there are none.
+
+    Water levels from other sources (e.g. stored for a video, or imported) are left out, so that they do not hide
+    gaps in the readings of the script.
+    """
+    return session.query(sqlalchemy.func.max(TimeSeries.timestamp)).filter(
+        TimeSeries.source == db.TimeSeriesSource.SCRIPT
+    ).scalar()
+
+
+def get_water_level_index(session: Session):
+    """Get the in-memory water level index of the database of ``session``, updated with any new records.
+
+    The index is loaded from the time_series table on first use. After that, only records with an id higher than
+    the highest id in the index are loaded, so that records added by other processes (e.g. by the
+    ``upload-water-level`` command) are also found.
+
+    Parameters
+    ----------
+    session : Session
+        Active SQLAlchemy database session.
+
+    Returns
+    -------
+    water_level.WaterLevelIndex
+    """
+    engine = session.get_bind()
+    with _water_level_index_lock:
+        # threads with their own session share the index, and must not load the same records twice
+        index = _water_level_indexes.get(engine)
+        if index is None:
+            index = _water_level_indexes[engine] = water_level.WaterLevelIndex()
+        # water levels stored for videos (copied, interpolated, from files) are not used to find water levels
+        rows = session.query(TimeSeries.id, TimeSeries.timestamp, TimeSeries.h).filter(
+            TimeSeries.id > index.last_id, _is_reading()
+        ).all()
+        if rows:
+            ids, timestamps, levels = zip(*rows)
+            index.extend(timestamps, levels, ids)
+    return index
+
+
+def add_result_summary(
+    session: Session,
+    video: db.Video,
+    record: Optional[TimeSeries],
+    summary: Optional[dict],
+):
+    """
+    Store the summary of the results of a processed video with the water level record at the video timestamp.
+
+    Parameters
+    ----------
+    session : Session
+        Active SQLAlchemy database session.
+    video : Video
+        The processed video.
+    record : TimeSeries, optional
+        Water level record used for processing. If it is not stored or not at the video timestamp (e.g. interpolated,
+        read from a file or the closest reading), a record with the same water level is added at the video timestamp,
+        so that each video has its own record. The source of that record is the source of ``record`` if it is not
+        stored, otherwise VIDEO. If None, the water level of the summary (e.g. measured optically) is used. Records
+        added here are not used to find water levels for other videos. A reading that arrives later for the video
+        timestamp takes their place, and keeps the results of the video.
+    summary : dict, optional
+        Summary of the results, with keys that are columns of TimeSeries (see ``callbacks.read_summary``).
+
+    Returns
+    -------
+    TimeSeries
+        The water level record holding the summary, linked to the video.
+    """
+    summary = summary or {}
+    if record is None or record.id is None or record.timestamp != video.timestamp:
+        h = record.h if record is not None else summary.get("h")
+        source = record.source if record is not None and record.id is None else None
+        record = add_water_level(session, video.timestamp, h, source=source or db.TimeSeriesSource.VIDEO)
+    for key, value in summary.items():
+        if key != "h" and hasattr(TimeSeries, key):
+            setattr(record, key, value)
+    record.video_id = video.id
+    session.commit()
+    return record
+
+
 def get_water_level(
     session: Session,
     timestamp: datetime,
     allowed_dt: Optional[float] = None,
+    interpolate: bool = False,
 ):
     """Fetch the water level closest to the given timestamp.
 
@@ -277,11 +560,17 @@ def get_water_level(
         Maximum allowed time difference, in seconds, between the closest
         record's timestamp and the specified timestamp. If provided,
         the function raises a ValueError if no record fits within this range.
+    interpolate : bool, optional
+        If True, the water level is linearly interpolated between the records before
+        and after the timestamp, if both are within `allowed_dt`. The result is returned
+        as a new record at the timestamp, which is not yet added to the session. If
+        interpolation is not possible, the closest record is returned.
 
     Returns
     -------
     TimeSeries
-        The water level record closest to the specified timestamp.
+        The water level record closest to the specified timestamp, or an interpolated
+        (new) record.
 
     Raises
     ------
@@ -291,28 +580,467 @@ def get_water_level(
     """
     # SQLite does not allow for tzinfo in a time stamp, therefore, first remove the tzinfo if it exists
     timestamp = timestamp.replace(tzinfo=None)
-    before_record = session.query(TimeSeries).filter(TimeSeries.timestamp <= timestamp).order_by(TimeSeries.timestamp.desc()).first()
-    after_record = session.query(TimeSeries).filter(TimeSeries.timestamp > timestamp).order_by(TimeSeries.timestamp).first()
-    
-    # Determine the closest record
-    closest_record = None
-    if before_record and after_record:
-        if abs((before_record.timestamp - timestamp).total_seconds()) <= abs((after_record.timestamp - timestamp).total_seconds()):
-            closest_record = before_record
-        else:
-            closest_record = after_record
-    elif before_record:
-        closest_record = before_record
-    elif after_record:
-        closest_record = after_record
+    index = get_water_level_index(session)
+    if interpolate:
+        h, record_id = index.interpolate(timestamp, allowed_dt=allowed_dt)
+        if record_id is None:
+            return TimeSeries(timestamp=timestamp, h=h)
+    else:
+        _, _, record_id = index.nearest(timestamp, allowed_dt=allowed_dt)
+    closest_record = session.get(TimeSeries, record_id)
+    if closest_record is None:
+        # records were removed from the database, rebuild the index
+        index.clear()
+        return get_water_level(session, timestamp, allowed_dt=allowed_dt, interpolate=interpolate)
+    return closest_record
 
-    if not closest_record:
-        raise ValueError(f"No water level entries found for timestamp: {timestamp}")
 
-    if allowed_dt:
-        # Ensure the time difference is within the allowed range
-        diff = abs((closest_record.timestamp - timestamp).total_seconds())
-        if diff > allowed_dt:
-            raise ValueError(f"No water level found within {allowed_dt} seconds of timestamp {timestamp}.")
+def get_due_callbacks(session: Session, limit: Optional[int] = None, now: Optional[datetime] = None):
+    """
+    Get stored callbacks that are due for another attempt, oldest first.
 
-    return closest_record
+    Parameters
+    ----------
+    session : Session
+        Active SQLAlchemy database session.
+    limit : int, optional
+        Maximum number of callbacks returned.
+    now : datetime, optional
+        Current time, by default ``datetime.now()``.
+
+    Returns
+    -------
+    list[db.Callback]
+    """
+    now = now or datetime.now()
+    query = session.query(db.Callback).filter(
+        sqlalchemy.or_(db.Callback.next_attempt.is_(None), db.Callback.next_attempt <= now)
+    ).order_by(db.Callback.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+
+def _claimable(now):
+    """Filter for videos that are queued, or were claimed but not finished in time."""
+    return sqlalchemy.or_(
+        db.Video.status == db.VideoStatus.QUEUE,
+        sqlalchemy.and_(db.Video.status == db.VideoStatus.TASK, db.Video.lease_expires < now)
+    )
+
+
+def get_claimable_videos(session: Session):
+    """Get id and timestamp of all videos that can be claimed for processing.
+
+    Returns
+    -------
+    list[tuple]
+        (id, timestamp) of each claimable video
+    """
+    return [
+        (row.id, row.timestamp) for row in session.query(db.Video.id, db.Video.timestamp).filter(
+            _claimable(datetime.now())
+        )
+    ]
+
+
+def get_first_claimable_video(session: Session, newest: bool = False):
+    """Get the id of the oldest (or newest) video that can be claimed for processing, without loading the others.
+
+    Returns
+    -------
+    int or None
+        id of the video, None if no video can be claimed
+    """
+    now = datetime.now()
+    order = (db.Video.timestamp.desc(), db.Video.id.desc()) if newest else (db.Video.timestamp, db.Video.id)
+    # one query per status, so that each walks the (status, timestamp) index instead of sorting all queued videos
+    rows = [
+        session.query(db.Video.id, db.Video.timestamp).filter(claimable).order_by(*order).first()
+        for claimable in [
+            db.Video.status == db.VideoStatus.QUEUE,
+            sqlalchemy.and_(db.Video.status == db.VideoStatus.TASK, db.Video.lease_expires < now)
+        ]
+    ]
+    rows = [row for row in rows if row is not None]
+    if len(rows) == 0:
+        return None
+    return (max if newest else min)(rows, key=lambda row: (row.timestamp, row.id)).id
+
+
+def skip_videos(session: Session, video_ids: list):
+    """Set queued videos to SKIPPED, so that they are not processed.
+
+    The raw files of skipped videos stay in their buckets. They are added to the file catalogue as "videos", so that
+    quotas and purging of videos by space account for them.
+    """
+    if not video_ids:
+        return 0
+    now = datetime.now()
+    skipped = session.query(db.Video.id, db.Video.file).filter(db.Video.id.in_(video_ids), _claimable(now)).all()
+    n = session.query(db.Video).filter(
+        db.Video.id.in_([row.id for row in skipped]),
+        _claimable(now)
+    ).update(
+        {db.Video.status: db.VideoStatus.SKIPPED, db.Video.lease_expires: None},
+        synchronize_session=False
+    )
+    session.commit()
+    skipped = [row for row in skipped if row.file]
+    add_files(
+        session,
+        [os.path.join(db.video.UPLOAD_DIRECTORY, row.file) for row in skipped],
+        "videos",
+        video_id=[row.id for row in skipped]
+    )
+    return n
+
+
+def claim_video(
+    session: Session,
+    lease: float = 3600.,
+    video_id: Optional[int] = None,
+):
+    """Claim a queued video for processing.
+
+    A video can be claimed if it has status QUEUE, or status TASK with an expired lease (i.e. the worker that
+    claimed it earlier did not finish or renew it in time). Claiming sets the status to TASK and a new lease in one
+    conditional UPDATE, so that a video can never be claimed twice.
+
+    Parameters
+    ----------
+    session : Session
+        Active SQLAlchemy database session.
+    lease : float, optional
+        Duration of the claim in seconds, by default 3600.
+    video_id : int, optional
+        Id of the video to claim. If not provided, the oldest claimable video is claimed.
+
+    Returns
+    -------
+    Video or None
+        The claimed video, or None if no (or not the requested) video could be claimed.
+    """
+    now = datetime.now()
+    claimable = _claimable(now)
+    if video_id is None:
+        row = session.query(db.Video.id).filter(claimable).order_by(db.Video.timestamp).first()
+        if row is None:
+            return None
+        video_id = row.id
+    n = session.query(db.Video).filter(db.Video.id == video_id, claimable).update(
+        {db.Video.status: db.VideoStatus.TASK, db.Video.lease_expires: now + timedelta(seconds=lease)},
+        synchronize_session=False
+    )
+    session.commit()
+    if n == 0:
+        return None
+    video = session.get(db.Video, video_id)
+    session.refresh(video)
+    return video
+
+
+def renew_video_leases(
+    session: Session,
+    video_ids: list,
+    lease: float = 3600.,
+):
+    """Extend the lease of videos that are still being processed."""
+    if not video_ids:
+        return 0
+    n = session.query(db.Video).filter(
+        db.Video.id.in_(video_ids),
+        db.Video.status == db.VideoStatus.TASK
+    ).update(
+        {db.Video.lease_expires: datetime.now() + timedelta(seconds=lease)},
+        synchronize_session=False
+    )
+    session.commit()
+    return n
+
+
+def requeue_videos(session: Session):
+    """Put all videos with status TASK back in the queue.
+
+    Only to be used when no worker is processing videos, typically at startup of the daemon, to resume
+    videos that were being processed while the daemon stopped (e.g. by a reboot).
+
+    Returns
+    -------
+    int
+        number of videos put back in the queue
+    """
+    n = session.query(db.Video).filter(db.Video.status == db.VideoStatus.TASK).update(
+        {db.Video.status: db.VideoStatus.QUEUE, db.Video.lease_expires: None},
+        synchronize_session=False
+    )
+    session.commit()
+    return n
+
+
+def add_files(
+        session: Session,
+        paths: list,
+        category: str,
+        video_id: Optional[Union[int, list]] = None,
+        chunk_size: int = 500
+):
+    """
+    Add files to the file catalogue with their current size and modification time, or update them.
+
+    Parameters
+    ----------
+    session : Session
+        Active SQLAlchemy database session.
+    paths : list[str]
+        Paths of the files. Paths that are not (or no longer) files are skipped.
+    category : str
+        Kind of the files, e.g. "failed" or "results".
+    video_id : int or list[int], optional
+        Video of which the files were written, or the video of each file.
+    chunk_size : int, optional
+        Number of records sent to the database per statement, by default 500.
+
+    Returns
+    -------
+    int
+        Number of files added or updated.
+    """
+    video_ids = video_id if isinstance(video_id, list) else [video_id] * len(paths)
+    rows = []
+    for path, video_id in zip(paths, video_ids):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        rows.append({
+            "path": os.path.abspath(path),
+            "size": stat.st_size,
+            "mtime": datetime.fromtimestamp(stat.st_mtime),
+            "category": category,
+            "video_id": video_id,
+        })
+    statement = sqlite_insert(db.CataloguedFile.__table__)
+    statement = statement.on_conflict_do_update(
+        index_elements=["path"],
+        set_={c: statement.excluded[c] for c in ["size", "mtime", "category", "video_id"]}
+    )
+    try:
+        conn = session.connection()
+        for i in range(0, len(rows), chunk_size):
+            conn.execute(statement, rows[i:i + chunk_size])
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        raise ValueError(f"Failed to add files to catalogue: {e}")
+    return len(rows)
+
+
+def remove_files(session: Session, paths: list, chunk_size: int = 500):
+    """Remove files from the file catalogue (not from disk), returns the number of records removed."""
+    paths = [os.path.abspath(path) for path in paths]
+    n = 0
+    for i in range(0, len(paths), chunk_size):
+        n += session.query(db.CataloguedFile).filter(
+            db.CataloguedFile.path.in_(paths[i:i + chunk_size])
+        ).delete(synchronize_session=False)
+    session.commit()
+    return n
+
+
+def has_files(session: Session, category: str):
+    """Check if the file catalogue holds any file of ``category``."""
+    return session.query(db.CataloguedFile.id).filter(db.CataloguedFile.category == category).first() is not None
+
+
+def get_oldest_files(session: Session, category: str, size: int):
+    """
+    Get the oldest files of a category in the file catalogue that together hold at least ``size`` bytes.
+
+    The running total of file sizes is computed by the database (window function), so that the set of files to
+    remove is found in one query, without reading the catalogue or scanning folders.
+
+    Parameters
+    ----------
+    session : Session
+        Active SQLAlchemy database session.
+    category : str
+        Kind of files, e.g. "failed" or "results".
+    size : int
+        Number of bytes to free up.
+
+    Returns
+    -------
+    list[tuple]
+        (path, size) of the files, oldest first. Fewer bytes are returned if the category does not hold enough.
+    """
+    F = db.CataloguedFile
+    running = sqlalchemy.func.sum(F.size).over(order_by=(F.mtime, F.id)).label("running")
+    files = session.query(F.path, F.size, running).filter(F.category == category).subquery()
+    return [
+        tuple(row) for row in session.query(files.c.path, files.c.size).filter(
+            files.c.running - files.c.size < size
+        ).order_by(files.c.running)
+    ]
+
+
+def get_files(session: Session, category: str, before: Optional[datetime] = None):
+    """
+    Get the files of a category in the file catalogue, oldest first.
+
+    Parameters
+    ----------
+    session : Session
+        Active SQLAlchemy database session.
+    category : str
+        Kind of files, e.g. "failed" or "results".
+    before : datetime, optional
+        Only return files last modified before this moment.
+
+    Returns
+    -------
+    list[tuple]
+        (path, size) of the files.
+    """
+    F = db.CataloguedFile
+    query = session.query(F.path, F.size).filter(F.category == category)
+    if before is not None:
+        query = query.filter(F.mtime < before)
+    return [tuple(row) for row in query.order_by(F.mtime, F.id)]
+
+
+def get_file_usage(session: Session):
+    """Get the number of bytes of catalogued files per category, as dict."""
+    F = db.CataloguedFile
+    return dict(session.query(F.category, sqlalchemy.func.sum(F.size)).group_by(F.category).all())
+
+
+def get_written_bytes(session: Session, since: datetime):
+    """
+    Get the number of bytes of catalogued files that were last modified since a given moment.
+
+    Parameters
+    ----------
+    session : Session
+        Active SQLAlchemy database session.
+    since : datetime
+        Start of the period.
+
+    Returns
+    -------
+    int
+        Number of bytes.
+    datetime or None
+        Modification time of the oldest of these files, None if there are none.
+    """
+    F = db.CataloguedFile
+    size, first = session.query(sqlalchemy.func.sum(F.size), sqlalchemy.func.min(F.mtime)).filter(
+        F.mtime >= since
+    ).one()
+    return size or 0, first
+
+
+# videos that are no longer needed for processing, and may be purged
+PURGEABLE_VIDEO_STATUSES = [db.VideoStatus.DONE, db.VideoStatus.ERROR, db.VideoStatus.SKIPPED]
+
+
+def get_oldest_videos(
+        session: Session,
+        before: Optional[datetime] = None,
+        size: Optional[int] = None,
+        category: Optional[str] = None,
+        limit: Optional[int] = None
+):
+    """
+    Get the oldest processed (or skipped) videos, by age and/or up to a number of bytes of their catalogued files.
+
+    Parameters
+    ----------
+    session : Session
+        Active SQLAlchemy database session.
+    before : datetime, optional
+        Only return videos with a timestamp before this moment.
+    size : int, optional
+        Only return the oldest videos that together hold at least this number of bytes. Videos without catalogued
+        files (of ``category``) are left out, as removing them frees no space that is counted.
+    category : str, optional
+        Only count bytes of catalogued files of this category (e.g. "videos" for raw videos), by default all files.
+    limit : int, optional
+        Maximum number of videos returned.
+
+    Returns
+    -------
+    list[tuple]
+        (id, file, size) of the videos, oldest first.
+    """
+    V, F = db.Video, db.CataloguedFile
+    sizes = session.query(F.video_id, sqlalchemy.func.sum(F.size).label("size")).filter(F.video_id.is_not(None))
+    if category is not None:
+        sizes = sizes.filter(F.category == category)
+    sizes = sizes.group_by(F.video_id).subquery()
+    video_size = sqlalchemy.func.coalesce(sizes.c.size, 0)
+    query = session.query(
+        V.id,
+        V.file,
+        V.timestamp,
+        video_size.label("size"),
+        sqlalchemy.func.sum(video_size).over(order_by=(V.timestamp, V.id)).label("running"),
+    ).outerjoin(sizes, sizes.c.video_id == V.id).filter(V.status.in_(PURGEABLE_VIDEO_STATUSES))
+    if before is not None:
+        query = query.filter(V.timestamp < before)
+    if size is not None:
+        query = query.filter(video_size > 0)
+    videos = query.subquery()
+    query = session.query(videos.c.id, videos.c.file, videos.c.size)
+    if size is not None:
+        query = query.filter(videos.c.running - videos.c.size < size)
+    query = query.order_by(videos.c.timestamp, videos.c.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return [tuple(row) for row in query]
+
+
+def get_video_files(session: Session, video_ids: list):
+    """Get the catalogued files of videos, as list of (path, size)."""
+    F = db.CataloguedFile
+    return [tuple(row) for row in session.query(F.path, F.size).filter(F.video_id.in_(video_ids))]
+
+
+def delete_videos(session: Session, video_ids: list, chunk_size: int = 500):
+    """
+    Delete video records in bulk, with their file catalogue records. Water levels and results (time series
+    records) of the videos are kept.
+
+    The records are deleted with single statements, so that the ORM events of ``Video`` (e.g. removal of files) are
+    not run. Files must be removed beforehand, see ``disk_mng.purge_videos``.
+
+    Parameters
+    ----------
+    session : Session
+        Active SQLAlchemy database session.
+    video_ids : list[int]
+        ids of the videos.
+    chunk_size : int, optional
+        Number of ids per statement, by default 500.
+
+    Returns
+    -------
+    int
+        Number of videos deleted.
+    """
+    n = 0
+    try:
+        for i in range(0, len(video_ids), chunk_size):
+            ids = video_ids[i:i + chunk_size]
+            session.query(TimeSeries).filter(TimeSeries.video_id.in_(ids)).update(
+                {TimeSeries.video_id: None}, synchronize_session=False
+            )
+            session.query(db.CataloguedFile).filter(db.CataloguedFile.video_id.in_(ids)).delete(
+                synchronize_session=False
+            )
+            n += session.query(db.Video).filter(db.Video.id.in_(ids)).delete(synchronize_session=False)
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        raise ValueError(f"Failed to delete videos: {e}")
+    return n
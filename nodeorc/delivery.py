@@ -0,0 +1,432 @@
+"""Delivery of callbacks to the server over persistent HTTP connections."""
+import concurrent.futures
+import logging
+import os
+import requests
+import threading
+import time
+
+from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
+from typing import Optional
+from urllib.parse import urljoin
+
+# default timeout [s] for connecting to the server and for waiting for its response
+DEFAULT_TIMEOUT = 30.
+
+
+def upload_chunked(
+        session,
+        url: str,
+        f,
+        chunk_size: int,
+        headers: Optional[dict] = None,
+        timeout: Optional[float] = None,
+        on_progress=None
+):
+    """
+    Upload a file in chunks, resuming from the number of bytes the server already received.
+
+    The server reports the number of bytes received in header ``Upload-Offset``, in response to a HEAD request to
+    ``url`` (status 404 if nothing was received yet) and to each chunk. Chunks are sent with PUT requests with a
+    ``Content-Range: bytes <first>-<last>/<total>`` header. An interrupted upload therefore continues where it
+    stopped, instead of starting from zero.
+
+    Parameters
+    ----------
+    session : requests.Session or module requests
+        session to send requests with
+    url : str
+        upload url of the file
+    f : file object
+        file opened in binary mode
+    chunk_size : int
+        maximum number of bytes per chunk
+    headers : dict, optional
+        headers added to each request, e.g. for authorization
+    timeout : float, optional
+        timeout [s] per request
+    on_progress : callable, optional
+        called with the number of bytes received by the server, after each chunk
+
+    Returns
+    -------
+    int
+        size of the file [bytes]
+
+    Raises
+    ------
+    requests.HTTPError
+        If the server does not accept the upload, or does not move the offset forward after a chunk (reported as
+        status 502)
+    """
+    headers = headers or {}
+    total = os.fstat(f.fileno()).st_size
+    r = session.request("HEAD", url, headers=headers, timeout=timeout)
+    if r.status_code == 404:
+        offset = 0
+    else:
+        r.raise_for_status()
+        offset = int(r.headers.get("Upload-Offset", 0))
+    while offset < total or total == 0:
+        f.seek(offset)
+        chunk = f.read(chunk_size)
+        content_range = f"bytes {offset}-{offset + len(chunk) - 1}/{total}" if total else "bytes */0"
+        r = session.request(
+            "PUT", url, data=chunk, headers={**headers, "Content-Range": content_range}, timeout=timeout
+        )
+        r.raise_for_status()
+        received = int(r.headers.get("Upload-Offset", offset + len(chunk)))
+        if total and received <= offset:
+            # the server did not take the chunk, sending it again and again would never end
+            r.status_code, r.reason = 502, f"Upload-Offset {received} did not advance past {offset}"
+            r.raise_for_status()
+        offset = received
+        if on_progress is not None:
+            on_progress(offset)
+        if total == 0:
+            break
+    return total
+
+
+class CallbackDelivery:
+    """
+    Sends callbacks over a persistent HTTP session.
+
+    Connections to the server are kept alive and reused from a connection pool, so that a TCP (and TLS) handshake is
+    only needed for the first callback instead of for every callback, which costs seconds per callback over e.g. a
+    cellular link. Independent callbacks can be sent in parallel with ``send_many``.
+
+    Parameters
+    ----------
+    callback_url : nodeorc.models.CallbackUrl
+        server to send callbacks to
+    max_workers : int, optional
+        maximum number of callbacks sent at the same time by ``send_many``, by default 1
+    timeout : float, optional
+        timeout [s] for connecting to the server and for waiting for its response, per request, by default 30
+    logger : logging.Logger, optional
+
+    """
+    def __init__(
+            self,
+            callback_url,
+            max_workers: int = 1,
+            timeout: float = DEFAULT_TIMEOUT,
+            logger=logging
+    ):
+        self.callback_url = callback_url
+        self.max_workers = max(int(max_workers), 1)
+        self.timeout = timeout
+        self.logger = logger
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = None
+
+    @classmethod
+    def from_settings(cls, callback_url, settings, logger=logging):
+        """Create a delivery for a callback url, configured by a ``Settings`` record."""
+        return cls(
+            callback_url,
+            max_workers=settings.callback_max_workers or 1,
+            timeout=settings.callback_timeout or DEFAULT_TIMEOUT,
+            logger=logger
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Stop the threads for parallel sending and close all connections."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.session.close()
+
+    def send(self, callback) -> Optional[requests.Response]:
+        """
+        Send one callback.
+
+        Parameters
+        ----------
+        callback : nodeorc.models.Callback or nodeorc.db.Callback
+            callback to send
+
+        Returns
+        -------
+        requests.Response or None
+            response of the server, None if the callback could not be sent
+
+        Raises
+        ------
+        Exception
+            If the callback cannot be made from its (stored) message body and files, see
+            ``CallbackUrl.send_callback``.
+        """
+        url = urljoin(str(self.callback_url.url), callback.endpoint)
+        self.logger.info(f"Sending {callback.func_name} callback to {url}")
+        return self.callback_url.send_callback(callback, session=self.session, timeout=self.timeout)
+
+    def send_many(self, callbacks: list) -> list:
+        """
+        Send independent callbacks, up to ``max_workers`` at the same time.
+
+        Parameters
+        ----------
+        callbacks : list
+            callbacks to send, which must not depend on each other's order of arrival
+
+        Returns
+        -------
+        list[requests.Response or None or Exception]
+            responses in the order of the callbacks, None for callbacks that could not be sent, and the exception
+            raised for callbacks that could not be made
+        """
+        if self.max_workers == 1 or len(callbacks) <= 1:
+            return [self._try_send(callback) for callback in callbacks]
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="callback"
+            )
+        return list(self._executor.map(self._try_send, callbacks))
+
+    def _try_send(self, callback):
+        try:
+            return self.send(callback)
+        except Exception as e:
+            return e
+
+
+class CircuitBreaker:
+    """
+    Keeps track of whether the server is reachable, so that no callbacks are sent while it is known to be down.
+
+    After ``failure_threshold`` consecutive connection failures the breaker opens, and callbacks are not sent for
+    ``reset_timeout`` seconds. After that, one callback may be sent as a probe (half-open). If it succeeds the
+    breaker closes, if it fails the breaker opens again for twice as long, up to ``max_reset_timeout`` seconds.
+
+    Parameters
+    ----------
+    failure_threshold : int, optional
+        number of consecutive failures after which the breaker opens, by default 3
+    reset_timeout : float, optional
+        seconds the breaker stays open after it opened for the first time, by default 60
+    max_reset_timeout : float, optional
+        maximum seconds the breaker stays open, by default 3600
+    clock : callable, optional
+        function returning the current time in seconds, by default ``time.monotonic``
+
+    """
+    def __init__(
+            self,
+            failure_threshold: int = 3,
+            reset_timeout: float = 60.,
+            max_reset_timeout: float = 3600.,
+            clock=time.monotonic
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.timeout = reset_timeout
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """"closed" (sending), "open" (not sending) or "half-open" (a probe may be sent)."""
+        if self._opened_at is None:
+            return "closed"
+        if self._probing or self.clock() - self._opened_at < self.timeout:
+            return "open"
+        return "half-open"
+
+    def allow(self):
+        """Return True if a callback may be sent now. In half-open state, only one probe is allowed."""
+        with self._lock:
+            state = self.state
+            if state == "half-open":
+                self._probing = True
+            return state != "open"
+
+    @property
+    def probing(self):
+        """True while the probe of the half-open breaker is out, and nothing else should be sent."""
+        return self._probing
+
+    def release(self):
+        """Give back a probe that was allowed but not used, because nothing was sent."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        """Close the breaker after a callback reached the server."""
+        with self._lock:
+            self.failures = 0
+            self.timeout = self.reset_timeout
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        """Count a failure to reach the server, and open the breaker if needed."""
+        with self._lock:
+            self.failures += 1
+            if self._probing:
+                # the probe failed, stay away for longer
+                self.timeout = min(self.timeout * 2, self.max_reset_timeout)
+                self._opened_at = self.clock()
+            elif self._opened_at is None and self.failures >= self.failure_threshold:
+                self._opened_at = self.clock()
+            self._probing = False
+
+
+class OutboxDrainer:
+    """
+    Sends stored callbacks (the outbox in the callback table) in the background.
+
+    Callbacks are sent in batches as long as the server is reachable, so that a backlog drains quickly when the
+    connection returns. A callback that cannot be delivered is tried again after an exponentially increasing delay
+    (tracked in the ``attempts`` and ``next_attempt`` columns). While the circuit breaker is open, nothing is sent.
+
+    Parameters
+    ----------
+    delivery : CallbackDelivery
+        delivery used to send callbacks
+    breaker : CircuitBreaker, optional
+        breaker shared with other senders of callbacks, by default a new one
+    interval : float, optional
+        seconds between checks of the outbox, unless woken up with ``wake``, by default 60
+    batch_size : int, optional
+        maximum number of callbacks read from the database at once, by default 50
+    base_delay : float, optional
+        seconds before a callback is tried again after its first failure, by default 60
+    max_delay : float, optional
+        maximum seconds between attempts, by default 6 hours
+    logger : logging.Logger, optional
+
+    """
+    def __init__(
+            self,
+            delivery: CallbackDelivery,
+            breaker: Optional[CircuitBreaker] = None,
+            interval: float = 60.,
+            batch_size: int = 50,
+            base_delay: float = 60.,
+            max_delay: float = 6 * 3600.,
+            logger=logging
+    ):
+        self.delivery = delivery
+        self.breaker = breaker or CircuitBreaker()
+        self.interval = interval
+        self.batch_size = batch_size
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.logger = logger
+        self._wake = threading.Event()
+
+    def wake(self):
+        """Check the outbox now, e.g. after a callback was stored or the server was reached."""
+        self._wake.set()
+
+    def backoff(self, attempts: int):
+        """Seconds to wait before the next attempt, after a number of failed attempts."""
+        return min(self.base_delay * 2 ** max(attempts - 1, 0), self.max_delay)
+
+    def _failed(self, record, error, now):
+        record.attempts = (record.attempts or 0) + 1
+        record.next_attempt = now + timedelta(seconds=self.backoff(record.attempts))
+        record.last_error = error
+
+    def drain(self, session, now: Optional[datetime] = None):
+        """
+        Send all callbacks that are due, in batches, until the outbox is empty or the server cannot be reached.
+
+        Parameters
+        ----------
+        session : Session
+            database session
+        now : datetime, optional
+            current time, by default ``datetime.now()``
+
+        Returns
+        -------
+        int
+            number of callbacks delivered
+        """
+        from nodeorc import db_ops  # import lazily to prevent circular imports
+        now = now or datetime.now()
+        delivered = 0
+        while self.breaker.allow():
+            # a half-open breaker allows one callback as probe, the others are sent once it reached the server
+            limit = 1 if self.breaker.probing else self.batch_size
+            records = db_ops.get_due_callbacks(session, limit=limit, now=now)
+            if len(records) == 0:
+                # nothing to send, a probe may be sent by the next callback
+                self.breaker.release()
+                break
+            reachable = False
+            for i in range(0, len(records), self.delivery.max_workers):
+                batch = records[i:i + self.delivery.max_workers]
+                # callbacks are sent as rendered when they were stored, older records are rendered again
+                responses = self.delivery.send_many([rec if rec.rendered else rec.callback for rec in batch])
+                for record, r in zip(batch, responses):
+                    if isinstance(r, Exception):
+                        # the callback cannot be made from what was stored, sending it again will not help
+                        self.logger.error(f"Callback {record.id} cannot be sent, removing it. Reason: {r}")
+                        session.delete(record)
+                    elif r is None:
+                        self._failed(record, "connection error", now)
+                    elif r.status_code >= 500:
+                        reachable = True
+                        self._failed(record, f"server error {r.status_code}", now)
+                    else:
+                        reachable = True
+                        if r.status_code not in [200, 201]:
+                            # the server refuses the callback, sending it again will not help
+                            self.logger.error(
+                                f"Callback {record.id} refused with error code {r.status_code}, removing it"
+                            )
+                        else:
+                            delivered += 1
+                        session.delete(record)
+                session.commit()
+                if None in responses:
+                    break
+            if None in responses:
+                self.breaker.record_failure()
+                if not reachable:
+                    break
+            elif reachable:
+                self.breaker.record_success()
+            else:
+                # none of the callbacks could be made, so the server was not contacted
+                self.breaker.release()
+        if delivered:
+            self.logger.info(f"{delivered} stored callback(s) delivered")
+        return delivered
+
+    def run(self, stop_event: threading.Event):
+        """Drain the outbox every ``interval`` seconds or when woken up, until ``stop_event`` is set."""
+        from nodeorc import db, db_ops  # import lazily to prevent circular imports
+        session = db_ops.get_session()
+        self.logger.info("Starting thread for sending stored callbacks")
+        try:
+            while not stop_event.is_set():
+                try:
+                    self.drain(session)
+                except Exception as e:
+                    session.rollback()
+                    self.logger.error(f"Error while sending stored callbacks. Reason: {e}")
+                self._wake.wait(timeout=self.interval)
+                self._wake.clear()
+        finally:
+            db.Session.remove()
+        self.logger.info("Callback thread terminated.")
@@ -1,7 +1,12 @@
+import logging
 import numpy as np
 import os
 import shutil
 
+from datetime import datetime, timedelta
+
+from nodeorc import __home__
+
 # functions to manage that disk space remains below a threshold
 def get_free_space(path_dir):
     """
@@ -103,7 +108,164 @@ def delete_file(path_to_file, logger):
         )
         return False
 
-def purge(paths, free_space, min_free_space, logger, home="/home"):
+def catalogue_folder(session, folder, category, prune=False):
+    """
+    Add all files in a folder to the file catalogue, e.g. files written before the catalogue existed.
+
+    Parameters
+    ----------
+    session : Session
+        database session
+    folder : str, path-like
+        folder to scan (recursively)
+    category : str
+        kind of the files, e.g. "failed" or "results"
+    prune : bool, optional
+        if True, catalogued files of the category that are no longer in the folder are removed from the catalogue
+
+    Returns
+    -------
+    int
+        number of files catalogued
+    """
+    from nodeorc import db_ops  # import lazily to prevent circular imports
+    fns = scan_folder(folder, clean_empty_dirs=False)
+    if prune:
+        current = {os.path.abspath(fn) for fn in fns}
+        db_ops.remove_files(session, [fn for fn, _ in db_ops.get_files(session, category) if fn not in current])
+    return db_ops.add_files(session, fns, category)
+
+
+def remove_empty_parent(path, roots):
+    """Remove the folder of a removed file if it is empty, unless it is one of the ``roots``."""
+    folder = os.path.dirname(os.path.abspath(path))
+    if folder in [os.path.abspath(root) for root in roots]:
+        return
+    try:
+        os.rmdir(folder)
+    except OSError:
+        # not empty
+        pass
+
+
+def remove_catalogued(session, files, roots, logger):
+    """
+    Remove catalogued files from disk and from the file catalogue.
+
+    Parameters
+    ----------
+    session : Session
+        database session
+    files : list[tuple]
+        (path, size) of the files
+    roots : list[str]
+        top folders, which are not removed when they become empty
+    logger : Logger
+
+    Returns
+    -------
+    int
+        number of bytes removed
+    list[str]
+        paths of files that could not be removed
+    """
+    from nodeorc import db_ops  # import lazily to prevent circular imports
+    removed = []
+    failed = []
+    size_removed = 0
+    for fn, size in files:
+        if not os.path.exists(fn):
+            # removed by something else, only the record is left
+            removed.append(fn)
+        elif delete_file(fn, logger=logger):
+            removed.append(fn)
+            size_removed += size
+            remove_empty_parent(fn, roots)
+        else:
+            logger.warning(f"File {fn} could not be deleted, skipping...")
+            failed.append(fn)
+    db_ops.remove_files(session, removed)
+    return size_removed, failed
+
+
+def purge_catalogue(session, category, paths, free_space, min_free_space, logger, home="/home"):
+    """
+    Remove the oldest catalogued files of a category until the free space is at least ``min_free_space``.
+
+    The files to remove are computed from the sizes in the file catalogue, so that no folders are scanned and the
+    free space is only checked after each set of removed files, instead of after every file.
+
+    Parameters
+    ----------
+    session : Session
+        database session
+    category : str
+        kind of files to remove, e.g. "failed" or "results"
+    paths : list[str]
+        top folders of the category, which are not removed when they become empty
+    free_space : float
+        GB amount of free space currently available
+    min_free_space : float
+        GB amount of free space required
+    logger : Logger
+    home : str, optional
+        folder from which to check the free space
+
+    Returns
+    -------
+    bool
+        True if enough space was freed up
+    """
+    from nodeorc import db_ops  # import lazily to prevent circular imports
+    failed = set()
+    while free_space < min_free_space:
+        # GB to bytes as in get_free_space
+        needed = int(np.ceil((min_free_space - free_space) * 10e8))
+        # files that could not be removed earlier are skipped, the next oldest files are added instead
+        needed += sum(os.path.getsize(fn) for fn in failed if os.path.isfile(fn))
+        files = [(fn, size) for fn, size in db_ops.get_oldest_files(session, category, needed) if fn not in failed]
+        if len(files) == 0:
+            logger.warning(
+                f"No {category} files can be deleted, but free space {free_space} GB is lower than threshold "
+                f"{min_free_space} GB"
+            )
+            return False
+        _, not_removed = remove_catalogued(session, files, paths, logger)
+        failed.update(not_removed)
+        free_space = get_free_space(home)
+    return True
+
+
+def purge(paths, free_space, min_free_space, logger, home="/home", session=None, category=None):
+    """
+    Remove the oldest files in folders until the free space is at least ``min_free_space``.
+
+    With ``session`` and ``category``, files are taken from the file catalogue (see ``purge_catalogue``). Otherwise,
+    the folders are scanned.
+
+    Parameters
+    ----------
+    paths : list[str]
+        folders with files to remove
+    free_space : float
+        GB amount of free space currently available
+    min_free_space : float
+        GB amount of free space required
+    logger : Logger
+    home : str, optional
+        folder from which to check the free space
+    session : Session, optional
+        database session with the file catalogue
+    category : str, optional
+        kind of catalogued files to remove
+
+    Returns
+    -------
+    bool
+        True if enough space was freed up
+    """
+    if session is not None and category is not None:
+        return purge_catalogue(session, category, paths, free_space, min_free_space, logger, home=home)
     # check for files
     fns = scan_folder(paths)
     # get timestamp of files
@@ -127,3 +289,279 @@ def purge(paths, free_space, min_free_space, logger, home="/home"):
         # continue with the next file in the list
         cur_idx += 1
     return True
+
+
+def purge_videos(
+        session,
+        logger,
+        before=None,
+        size=None,
+        category=None,
+        roots=(),
+        batch_size=500
+):
+    """
+    Remove the oldest processed videos: their files (raw video, results, images and thumbnails) and their records.
+
+    Videos are removed in batches: the files of a batch are removed first, then the records are deleted with single
+    statements. Water levels and results of the videos (time series records) are kept. Videos that are queued or
+    being processed are never removed.
+
+    Parameters
+    ----------
+    session : Session
+        database session
+    logger : Logger
+    before : datetime, optional
+        remove videos with a timestamp before this moment
+    size : int, optional
+        remove the oldest videos until this number of bytes is removed
+    category : str, optional
+        only count bytes of files of this category towards ``size``, e.g. "videos" for raw videos
+    roots : list[str], optional
+        top folders, which are not removed when they become empty
+    batch_size : int, optional
+        maximum number of videos removed at once, by default 500
+
+    Returns
+    -------
+    int
+        number of bytes removed, counted as for ``size``
+    """
+    from nodeorc import db_ops  # import lazily to prevent circular imports
+    if before is None and size is None:
+        raise ValueError("Provide before and/or size to select videos to remove")
+    removed = 0
+    while size is None or removed < size:
+        videos = db_ops.get_oldest_videos(
+            session,
+            before=before,
+            size=None if size is None else size - removed,
+            category=category,
+            limit=batch_size
+        )
+        if len(videos) == 0:
+            break
+        ids = [video_id for video_id, _, _ in videos]
+        for fn, _ in db_ops.get_video_files(session, ids):
+            try:
+                os.remove(fn)
+            except FileNotFoundError:
+                pass
+        # the bucket of a video also holds files that are not catalogued, e.g. of videos processed before
+        buckets = {
+            os.path.dirname(os.path.join(__home__, "uploads", fn)) for _, fn, _ in videos if fn
+        }
+        for bucket in buckets:
+            shutil.rmtree(bucket, ignore_errors=True)
+            remove_empty_parent(bucket, roots)
+        db_ops.delete_videos(session, ids)
+        size_removed = sum(video_size for _, _, video_size in videos)
+        removed += size_removed
+        logger.info(f"Purged {len(ids)} videos ({size_removed / 1e6:.1f} MB), up to video {ids[-1]}")
+    return removed
+
+
+def file_category(fn):
+    """
+    Category of a file written by NodeORC, from its name.
+
+    Raw videos cannot be recognized from their name alone, see ``catalogue_video``.
+
+    Parameters
+    ----------
+    fn : str
+        path of the file
+
+    Returns
+    -------
+    str
+        "thumbnails", "images", "logs" or "results"
+    """
+    name = os.path.basename(fn).lower()
+    if name.endswith("_thumb.jpg"):
+        return "thumbnails"
+    if os.path.splitext(name)[1] in [".jpg", ".jpeg", ".png"]:
+        return "images"
+    if name.endswith(".log") or ".log." in name:
+        # also rotated log files, e.g. nodeorc.log.1
+        return "logs"
+    return "results"
+
+
+def catalogue_video(session, video_id, folder, filename):
+    """
+    Add the files of a processed video (raw video, results, images and thumbnail) to the file catalogue.
+
+    Parameters
+    ----------
+    session : Session
+        database session
+    video_id : int
+        id of the video
+    folder : str
+        folder (bucket) with the files of the video
+    filename : str
+        name of the raw video file
+    """
+    from nodeorc import db_ops  # import lazily to prevent circular imports
+    categories = {}
+    for fn in scan_folder(folder, clean_empty_dirs=False):
+        category = "videos" if os.path.basename(fn) == filename else file_category(fn)
+        categories.setdefault(category, []).append(fn)
+    for category, fns in categories.items():
+        db_ops.add_files(session, fns, category, video_id=video_id)
+
+
+class DiskBudget:
+    """
+    Keeps the use of disk space within budget, before free space runs out.
+
+    Files are taken from the file catalogue. On every check:
+
+    - files older than the retention of their category (``DiskManagement.retention``, days) are removed;
+    - the oldest files of categories that use more than their quota (``DiskManagement.quotas``, GB) are removed;
+    - the rate at which files were written recently is used to project the free space ``lead_time`` seconds ahead.
+      If it would drop under ``min_free_space``, the oldest files are removed now, in the order of
+      ``FILE_CATEGORIES``. Log files are only removed by retention or quota.
+
+    Raw videos ("videos") are removed together with the other files and the record of their video, with
+    ``purge_videos``.
+
+    Parameters
+    ----------
+    disk_management : nodeorc.db.DiskManagement
+        disk management settings
+    roots : list[str], optional
+        top folders, which are not removed when they become empty. By default the folders of ``disk_management``
+        and the uploads folder.
+    window : float, optional
+        seconds over which the rate of writing files is estimated, by default 7 days
+    logger : logging.Logger, optional
+
+    """
+    def __init__(self, disk_management, roots=None, window=7 * 86400., logger=logging):
+        self.disk_management = disk_management
+        self.roots = roots if roots is not None else [
+            disk_management.home_folder,
+            disk_management.failed_path,
+            disk_management.results_path,
+            disk_management.log_path,
+            os.path.join(__home__, "uploads"),
+        ]
+        self.window = window
+        self.logger = logger
+
+    def rate(self, session, now=None):
+        """Bytes per second written recently, estimated from the catalogued files of the last ``window`` seconds."""
+        from nodeorc import db_ops  # import lazily to prevent circular imports
+        now = now or datetime.now()
+        size, first = db_ops.get_written_bytes(session, now - timedelta(seconds=self.window))
+        if first is None:
+            return 0.
+        # a young catalogue covers less than the full window
+        span = max((now - first).total_seconds(), 3600.)
+        return size / span
+
+    def time_to_full(self, free_space, rate):
+        """
+        Seconds until the free space drops under ``min_free_space``.
+
+        Parameters
+        ----------
+        free_space : float
+            GB amount of free space currently available
+        rate : float
+            bytes written per second
+
+        Returns
+        -------
+        float
+            seconds, 0 if free space is already too low, inf if nothing is written
+        """
+        margin = (free_space - self.disk_management.min_free_space) * 10e8
+        if margin <= 0:
+            return 0.
+        if rate <= 0:
+            return np.inf
+        return margin / rate
+
+    def _remove(self, session, files, category, reason):
+        if len(files) == 0:
+            return 0
+        size, _ = remove_catalogued(session, files, self.roots, self.logger)
+        self.logger.info(f"Removed {len(files)} {category} files ({size / 1e6:.1f} MB) {reason}")
+        return size
+
+    def check(self, session, free_space=None, now=None):
+        """
+        Apply retention and quotas, and free up space for the projected use of the coming ``lead_time`` seconds.
+
+        Parameters
+        ----------
+        session : Session
+            database session
+        free_space : float, optional
+            GB amount of free space currently available, by default checked on disk
+        now : datetime, optional
+            current time, by default ``datetime.now()``
+
+        Returns
+        -------
+        float
+            GB amount of free space after the check
+        """
+        from nodeorc import db, db_ops  # import lazily to prevent circular imports
+        dm = self.disk_management
+        now = now or datetime.now()
+        # log files are written by the logger and rotated, their catalogue is refreshed from the log folder
+        catalogue_folder(session, dm.log_path, "logs", prune=True)
+        removed = 0
+        for category, days in (dm.retention or {}).items():
+            if category == "videos":
+                removed += purge_videos(session, self.logger, before=now - timedelta(days=days), roots=self.roots)
+                continue
+            files = db_ops.get_files(session, category, before=now - timedelta(days=days))
+            removed += self._remove(session, files, category, f"older than {days} days")
+        usage = db_ops.get_file_usage(session)
+        for category, quota in (dm.quotas or {}).items():
+            excess = usage.get(category, 0) - int(quota * 10e8)
+            if excess <= 0:
+                continue
+            if category == "videos":
+                removed += purge_videos(session, self.logger, size=excess, category="videos", roots=self.roots)
+                continue
+            files = db_ops.get_oldest_files(session, category, excess)
+            removed += self._remove(session, files, category, f"to stay within quota of {quota} GB")
+        if free_space is None or removed > 0:
+            free_space = get_free_space(dm.home_folder)
+        rate = self.rate(session, now=now)
+        lead_time = dm.lead_time or 0.
+        self.logger.info(
+            f"Free space {free_space:.1f} GB, writing {rate * 3600 / 1e6:.1f} MB per hour, "
+            f"{self.time_to_full(free_space, rate) / 3600:.1f} hours until {dm.min_free_space} GB is reached"
+        )
+        target = dm.min_free_space + rate * lead_time / 10e8
+        if free_space < target:
+            self.logger.warning(
+                f"Free space is projected to drop under {dm.min_free_space} GB within {lead_time / 3600:.1f} hours, "
+                f"removing oldest files to free up to {target:.1f} GB"
+            )
+            usage = db_ops.get_file_usage(session)
+            for category in db.FILE_CATEGORIES:
+                if category == "logs" or not usage.get(category):
+                    continue
+                if category == "videos":
+                    # videos are removed with all their files and records
+                    purge_videos(
+                        session, self.logger, size=int(np.ceil((target - free_space) * 10e8)), roots=self.roots
+                    )
+                    if get_free_space(dm.home_folder) >= target:
+                        break
+                elif purge_catalogue(
+                        session, category, self.roots, free_space, target, self.logger, home=dm.home_folder
+                ):
+                    break
+                free_space = get_free_space(dm.home_folder)
+            free_space = get_free_space(dm.home_folder)
+        return free_space
@@ -0,0 +1,167 @@
+"""Execution backends for running tasks in worker processes or threads."""
+import concurrent.futures
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import threading
+import time
+
+from concurrent.futures.process import BrokenProcessPool
+
+from nodeorc import models
+
+# name of the logger used inside worker processes, set by the pool initializer
+_worker_logger_name = None
+
+
+def _init_worker(log_queue, logger_name, log_level):
+    """Forward all log records of a worker process to the parent process."""
+    global _worker_logger_name
+    logger = logging.getLogger(logger_name)
+    for _ in range(len(logger.handlers)):
+        logger.handlers.pop().close()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(log_level)
+    logger.propagate = False
+    _worker_logger_name = logger_name
+
+
+def execute_task(task_json, tmp, keep_src=False):
+    """
+    Execute a serialized task, typically inside a worker process.
+
+    Parameters
+    ----------
+    task_json : str
+        task serialized with ``Task.to_json``
+    tmp : str
+        path to temporary location where task is conducted
+    keep_src : bool, optional
+        if set, input files are copied instead of moved to ``tmp``
+
+    Returns
+    -------
+    dict
+        id of the executed task and duration of the execution in seconds
+
+    """
+    t0 = time.time()
+    task = models.Task(**json.loads(task_json))
+    task.logger = logging.getLogger(_worker_logger_name) if _worker_logger_name else logging
+    task.execute(tmp, keep_src=keep_src)
+    return {"id": str(task.id), "duration": time.time() - t0}
+
+
+class TaskExecutor:
+    """
+    Execute tasks in a pool of worker processes or in the calling thread.
+
+    With ``process_pool=True``, each task is serialized and executed with ``Task.execute`` in one of
+    ``max_workers`` worker processes, so that several videos can be processed on separate CPU cores without
+    competing for the GIL. Log messages of the workers are forwarded to the handlers of ``logger``. Errors are
+    raised in the calling thread, which remains the only owner of database records. If a worker process dies
+    (e.g. killed for lack of memory), the pool is replaced before the next task.
+    With ``process_pool=False``, tasks are executed directly in the calling thread.
+
+    Parameters
+    ----------
+    max_workers : int, optional
+        number of worker processes, by default 1
+    process_pool : bool, optional
+        execute tasks in worker processes (True, default) or in the calling thread (False)
+    logger : Logger, optional
+        logging object
+
+    """
+    def __init__(self, max_workers: int = 1, process_pool: bool = True, logger=logging):
+        self.max_workers = max_workers
+        self.process_pool = process_pool
+        self.logger = logger
+        self._pool = None
+        self._log_queue = None
+        self._log_listener = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = self._create_pool()
+            return self._pool
+
+    def _create_pool(self):
+        # spawn fresh interpreters, forking a process with running threads and open database connections is
+        # not safe
+        ctx = multiprocessing.get_context("spawn")
+        # the logging module itself may be passed as logger, it logs to the root logger
+        logger = self.logger if isinstance(self.logger, logging.Logger) else logging.getLogger()
+        if self._log_listener is None:
+            self._log_queue = ctx.Queue()
+            self._log_listener = logging.handlers.QueueListener(
+                self._log_queue,
+                *logger.handlers,
+                respect_handler_level=True
+            )
+            self._log_listener.start()
+        logger_name = logger.name
+        log_level = logger.getEffectiveLevel()
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(self._log_queue, logger_name, log_level)
+        )
+
+    def submit(self, fn, *args, **kwargs):
+        """Submit a picklable function to the worker processes and return a future."""
+        try:
+            return self._get_pool().submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            self.logger.warning("Worker processes were terminated unexpectedly, starting new workers.")
+            self._pool = None
+            return self._get_pool().submit(fn, *args, **kwargs)
+
+    def execute(self, task, tmp, keep_src=False):
+        """
+        Execute a task and wait for it to finish.
+
+        Parameters
+        ----------
+        task : Task
+            task to execute
+        tmp : str
+            path to temporary location where task is conducted
+        keep_src : bool, optional
+            if set, input files are copied instead of moved to ``tmp``
+
+        Returns
+        -------
+        dict
+            id of the executed task and duration of the execution in seconds
+
+        Raises
+        ------
+        Exception
+            if the task fails, with the reason of failure
+
+        """
+        if not self.process_pool:
+            t0 = time.time()
+            task.execute(tmp, keep_src=keep_src)
+            return {"id": str(task.id), "duration": time.time() - t0}
+        future = self.submit(execute_task, task.to_json(), tmp, keep_src=keep_src)
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            # the worker died while executing this task, make sure the next task gets a fresh pool
+            self._pool = None
+            raise Exception(f"Worker process terminated unexpectedly while executing task {str(task.id)}")
+
+    def shutdown(self):
+        """Stop all worker processes and the log forwarding."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._log_listener is not None:
+            self._log_listener.stop()
+            self._log_listener = None
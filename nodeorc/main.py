@@ -1,4 +1,5 @@
 import click
+import functools
 import json
 import os
 
@@ -6,21 +7,9 @@ from pydantic import ValidationError
 from dotenv import load_dotenv
 # import tasks
 
-# import nodeorc specifics
-from nodeorc import db, log, models, db_ops, tasks, settings_path, utils, __version__
-
-session = db_ops.get_session()  # db.session
-# see if there is an active config, if not logger goes to $HOME/.nodeorc
-disk_management = db_ops.get_disk_management(session=session)
-if disk_management:
-    log_path = disk_management.log_path
-else:
-    log_path = None
-logger = log.start_logger(
-    True,
-    False,
-    log_path=log_path
-)
+# import nodeorc specifics. Modules that open the database or import pyorc and friends are imported by the commands
+# that need them, so that e.g. ``nodeorc --version`` or ``nodeorc --help`` start quickly
+from nodeorc import log, settings_path, __version__
 
 # load env variables. These are not overridden if they are already defined
 load_dotenv()
@@ -28,7 +17,30 @@ load_dotenv()
 # temp_path = os.getenv("TEMP_PATH", "./tmp")
 # settings_path = os.path.join(os.path.split(__file__)[0], "..", "settings")
 
-device = session.query(db.Device).first()
+
+@functools.cache
+def get_logger():
+    """Start the logger once, in the log path of the disk management configuration if available."""
+    from nodeorc import db_ops
+    session = db_ops.get_session()
+    # see if there is an active config, if not logger goes to $HOME/.nodeorc
+    disk_management = db_ops.get_disk_management(session=session)
+    if disk_management:
+        log_path = disk_management.log_path
+    else:
+        log_path = None
+    return log.start_logger(
+        True,
+        False,
+        log_path=log_path
+    )
+
+
+def get_device(session):
+    """Get the device record of this node."""
+    from nodeorc import db
+    return session.query(db.Device).first()
+
 
 # def get_docs_settings():
 #     fixed_fields = ["id", "created_at", "metadata", "registry", "callback_url", "storage", "settings", "disk_management"]
@@ -180,8 +192,11 @@ def cli(ctx, info, license, debug):  # , quiet, verbose):
 
 @cli.command(short_help="Start main daemon")
 def start():
-    # get the device id
+    from nodeorc import db, db_ops, models, tasks, utils
     session = db_ops.get_session()
+    logger = get_logger()
+    # get the device id
+    device = get_device(session)
     logger.info(f"Device {str(device)} is online to run video analyses")
     # remote storage parameters with local processing is not possible
     # if listen == "local" and storage == "remote":
@@ -256,6 +271,8 @@ def start():
             disk_management=disk_management,
             callback_url=callback_url,
             water_level_settings=water_level_settings,
+            max_workers=settings.max_workers or 1,
+            process_pool=settings.process_pool if settings.process_pool is not None else True,
         )
         processor.await_task()
     except Exception as e:
@@ -274,7 +291,10 @@ def start():
 )
 def upload_config(json_file):
     """Upload a new configuration for this device from a JSON formatted file"""
+    from nodeorc import db_ops
     session = db_ops.get_session()
+    logger = get_logger()
+    device = get_device(session)
     logger.info(f"Device {str(device)} receiving new configuration from {json_file}")
     config_data = load_config(json_file)
     rec = db_ops.add_config(session, config_data=config_data)
@@ -327,7 +347,10 @@ def upload_config(json_file):
     show_default=True,
 )
 def upload_water_level_script(script, script_type, file_template, frequency, datetime_fmt):
+    from nodeorc import db_ops
     session = db_ops.get_session()
+    logger = get_logger()
+    device = get_device(session)
     logger.info(f"Device {str(device)} receiving new water level script configuration. Script must provide ")
     logger.info(
         "valid outputs. If API is called, ensure a valid response is returned and you are connected to internet."
@@ -343,6 +366,38 @@ def upload_water_level_script(script, script_type, file_template, frequency, dat
     )
     logger.info(f"Settings updated successfully to {rec}")
 
+
+@cli.command(
+    short_help="Upload water levels from a file to NodeORC database",
+)
+@click.argument(
+    "WATER-LEVEL-FILE",
+    type=click.Path(exists=True, resolve_path=True, dir_okay=False, file_okay=True),
+    required=True,
+)
+@click.option(
+    "-dt",
+    "--datetime-fmt",
+    type=str,
+    help="datetime format of datetime indexes in the water level file. If not provided, the format of the water "
+         "level settings is used.",
+)
+def upload_water_level_file(water_level_file, datetime_fmt):
+    """Upload water levels from a space separated file with a datetime and water level on each line"""
+    from nodeorc import db, db_ops, water_level
+    session = db_ops.get_session()
+    logger = get_logger()
+    if datetime_fmt is None:
+        water_level_settings = db_ops.get_water_level_settings(session)
+        if water_level_settings is None:
+            raise click.UsageError("No water level settings available, provide a datetime format with -dt.")
+        datetime_fmt = water_level_settings.datetime_fmt
+    df = water_level.read_water_level_file(water_level_file, fmt=datetime_fmt)
+    logger.info(f"Read {len(df)} water levels from {water_level_file}")
+    n = db_ops.add_water_levels(session, df.index, df["water_level"].values, source=db.TimeSeriesSource.IMPORT)
+    logger.info(f"Added {n} water levels, {len(df) - n} were already available or missing.")
+
+
 # def main():
 #     connection = pika.BlockingConnection(
 #         pika.URLParameters(
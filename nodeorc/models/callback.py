@@ -1,6 +1,8 @@
+import uuid
+
 from datetime import datetime
 from typing import Optional, Dict, Any, List, Union
-from pydantic import field_validator, BaseModel
+from pydantic import field_validator, BaseModel, Field
 
 # nodeodm specific imports
 from nodeorc import callbacks
@@ -16,6 +18,11 @@ class Callback(BaseModel):
     request_type: str = "POST"
     kwargs: Optional[Dict[str, Any]] = dict  # set of kwargs to add to the callback msg body
     endpoint: Optional[str] = "/api/timeseries/"  # used to extend the default callback url
+    summary: Optional[Dict[str, Optional[float]]] = None  # summary of results, if available used instead of the file
+    chunk_size: Optional[int] = None  # if set, files are uploaded in resumable chunks of this number of bytes
+    upload_endpoint: Optional[str] = "/api/upload/"  # used to extend the default callback url for chunked uploads
+    upload_id: str = Field(default_factory=lambda: uuid.uuid4().hex)  # identifies chunked uploads, also in retries
+    video_max_height: Optional[int] = None  # if set, videos are downscaled to this height [pixels] before sending
 
     @field_validator("func_name")
     @classmethod
@@ -32,9 +39,36 @@ class Callback(BaseModel):
         return data, files
 
     def to_db(self):
+        """
+        Store the callback for a later retry.
+
+        The callback is rendered now, and its message body and (links to) its files are stored, so that a retry
+        only needs to send them.
+        """
         from nodeorc import db  # import lazily to prevent circular imports
-        rec = db.models.Callback(
-            body=self.model_dump_json()
-        )
-        db.session.add(rec)
-        db.session.commit()
\ No newline at end of file
+        data, files = self.get_body()
+        try:
+            rec = db.Callback(
+                body=self.model_dump_json(),
+                func_name=self.func_name,
+                endpoint=self.endpoint,
+                request_type=self.request_type,
+                data=data,
+            )
+            db.session.add(rec)
+            # the id of the record is needed for its outbox
+            db.session.flush()
+            rec.store_files(files)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            close_files(files)
+        return rec
+
+
+def close_files(files):
+    """Close the file objects of a callback body, in the form {field: (name, file object)}."""
+    for _, f in (files or {}).values():
+        f.close()
\ No newline at end of file
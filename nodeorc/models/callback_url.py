@@ -1,14 +1,20 @@
 import os
 import requests
+import threading
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from pydantic import field_validator, BaseModel, AnyHttpUrl
 # nodeodm specific imports
 from .. import callbacks
+from .callback import close_files
+from ..delivery import upload_chunked
 from urllib.parse import urljoin
 
 from .. import settings_path
 
+# guards refreshing of access tokens
+_token_lock = threading.Lock()
+
 
 class Callback(BaseModel):
     func_name: Optional[str] = "discharge"  # name of function that establishes the callback json
@@ -90,37 +96,101 @@ class CallbackUrl(BaseModel):
         callback_url.token_expiration = self.token_expiration
         session.commit()
 
-    def send_callback(self, callback):
+    def send_callback(self, callback, session=None, timeout=None):
+        """
+        Send a callback, either a Callback model or a callback record of the outbox.
+
+        Parameters
+        ----------
+        callback : Callback or nodeorc.db.Callback
+            callback to send
+        session : requests.Session, optional
+            HTTP session to send the callback with, so that connections are reused. If not provided, a new connection
+            is made.
+        timeout : float or tuple, optional
+            timeout [s] of the request, as for ``requests``
+
+        Returns
+        -------
+        requests.Response or None
+            response of the server (also of a failed upload of the files of the callback), None if the callback
+            could not be sent
+
+        Raises
+        ------
+        Exception
+            If the message body or files of the callback cannot be made, e.g. ``nodeorc.db.OutboxError`` when the
+            files of a stored callback are missing or have changed. Sending the callback again will not help.
+        """
         data, files = callback.get_body()
         # get the type of request. Typically this is POST for an entirely new time series record created from an edge
         # device, and PATCH for an existing record that must be provided with analyzed flows
         try:
-            r = self.send_request(callback, data, files)
+            r = self.send_request(callback, data, files, session=session, timeout=timeout)
+        except requests.HTTPError as e:
+            # the server was reached but did not accept the upload of the files, this is no connection error
+            r = e.response
         except Exception as e:
             # store callback in database instead
             r = None
+        finally:
+            close_files(files)
         return r
 
-    def send_request(self, callback, data, files):
-        if self.has_token:
-            # first check if tokens must be refreshed
+    def get_headers(self):
+        """Get the headers for a request, refreshing the access token first if it has expired."""
+        if not self.has_token:
+            return {}
+        # callbacks may be sent from several threads, only one of them refreshes the tokens
+        with _token_lock:
             if datetime.now() > self.token_expiration:
                 # first refresh tokens
                 self.refresh_tokens()
-            headers = {"Authorization": f"Bearer {self.token_access}"}
-        else:
-            headers = {}
+            return {"Authorization": f"Bearer {self.token_access}"}
+
+    def upload_files(self, callback, files, session=None, timeout=None):
+        """
+        Upload the files of a callback in resumable chunks of ``callback.chunk_size`` bytes.
+
+        Each file is uploaded to ``<upload_endpoint><upload id>/``, with an upload id that stays the same when the
+        callback is retried, so that an interrupted upload is resumed.
+
+        Returns
+        -------
+        dict
+            upload id per field, to send in the message body instead of the files
+        """
+        upload_ids = {}
+        for field, (name, f) in files.items():
+            upload_id = f"{callback.upload_id}-{field}"
+            set_progress = getattr(callback, "set_progress", None)
+            upload_chunked(
+                session or requests,
+                urljoin(str(self.url), f"{callback.upload_endpoint}{upload_id}/"),
+                f,
+                callback.chunk_size,
+                headers={**self.get_headers(), "Upload-Name": name},
+                timeout=timeout,
+                on_progress=(lambda offset, field=field: set_progress(field, offset)) if set_progress else None
+            )
+            upload_ids[f"{field}_upload_id"] = upload_id
+        return upload_ids
+
+    def send_request(self, callback, data, files, session=None, timeout=None):
+        if files and getattr(callback, "chunk_size", None):
+            # files are uploaded first, the callback refers to them
+            data = {**data, **self.upload_files(callback, files, session=session, timeout=timeout)}
+            files = None
+        headers = self.get_headers()
         url = urljoin(str(self.url), callback.endpoint)
-        request = getattr(
-            requests,
-            callback.request_type.lower()
-        )
         # perform callback (arrange the adding of token)
-        r = request(
+        r = (session or requests).request(
+            callback.request_type.upper(),
             url,
             data=data,
             headers=headers,
-            files=files
+            files=files,
+            timeout=timeout,
         )
         return r
         # if r.status_code != 200 and r.status_code != 201:
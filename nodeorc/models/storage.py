@@ -38,9 +38,48 @@ class Storage(BaseModel):
         path = os.path.split(fn)[0]
         if not(os.path.isdir(path)):
             os.makedirs(path)
-        # create file
+        # create file, in chunks so that the content is not duplicated in memory
         with open(fn, "wb") as f:
-            f.write(obj.read())
+            shutil.copyfileobj(obj, f)
+
+    def upload_file(self, src, dest, keep_src=True):
+        """
+        Upload a local file to a file on storage location, without reading it into memory
+
+        The file is hard-linked (``keep_src=True``) or renamed (``keep_src=False``) into the bucket, which costs no
+        data transfer at all. If source and bucket are on different file systems, the file is copied with
+        ``shutil.copyfile``, which lets the kernel copy the data (``os.sendfile``) where possible.
+
+        Parameters
+        ----------
+        src : str
+            path to local file
+        dest : str
+            destination filename (only name, full path is formed from self.bucket)
+        keep_src : bool, optional
+            if set (default), the source file remains in place, if not set, it is moved
+
+        Returns
+        -------
+
+        """
+        fn = os.path.join(self.bucket, dest)
+        path = os.path.split(fn)[0]
+        if not(os.path.isdir(path)):
+            os.makedirs(path)
+        if os.path.lexists(fn):
+            # replace an earlier upload, linking onto an existing file is not possible
+            os.remove(fn)
+        try:
+            if keep_src:
+                os.link(src, fn)
+            else:
+                os.rename(src, fn)
+        except OSError:
+            # e.g. source and bucket are on different file systems
+            shutil.copyfile(src, fn)
+            if not keep_src:
+                os.remove(src)
 
     def download_file(self, src, trg, keep_src=False):
         """
@@ -54,7 +93,8 @@ class Storage(BaseModel):
         trg : str
             file as it should be named locally
         keep_src : bool
-            if set, the file is copied, if not set, a rename will be performed instead.
+            if set, the file is hard-linked (or copied if linking is not possible), if not set, a rename will be
+            performed instead.
 
         Returns
         -------
@@ -64,10 +104,18 @@ class Storage(BaseModel):
         if not os.path.isdir(dirname):
             os.makedirs(dirname)
         if keep_src:
-            shutil.copyfile(
-                os.path.join(self.bucket, src),
-                trg
-            )
+            try:
+                # a hard link costs no space or time, and leaves the source in place
+                os.link(
+                    os.path.join(self.bucket, src),
+                    trg
+                )
+            except OSError:
+                # e.g. source and target are on different file systems
+                shutil.copyfile(
+                    os.path.join(self.bucket, src),
+                    trg
+                )
         else:
             os.rename(
                 os.path.join(self.bucket, src),
@@ -3,8 +3,6 @@ import os
 import requests
 from typing import Optional, Dict, List
 from pydantic import field_validator, BaseModel
-from pyorc import service
-from io import BytesIO
 
 # nodeodm specific imports
 from . import Callback
@@ -28,6 +26,7 @@ class Subtask(BaseModel):
     @field_validator("name")
     @classmethod
     def name_in_service(cls, v):
+        from pyorc import service  # import lazily, pyorc takes seconds to import
         if not(hasattr(service, v)):
             raise ValueError(f"task {v} not available in pyorc.service")
         return v
@@ -92,6 +91,7 @@ class Subtask(BaseModel):
 
         """
         # retrieve task name from pyorc service level
+        from pyorc import service  # import lazily, pyorc takes seconds to import
         logger.info(f"Executing task {self.name}")
         task_func = getattr(service, self.name)
         task_func(**self.kwargs, logger=logger)
@@ -117,7 +117,5 @@ class Subtask(BaseModel):
                 # check if file is present
                 if not(os.path.isfile(tmp_file)):
                     raise FileNotFoundError(f"Temporary file {tmp_file} was not created by subtask")
-                with open(tmp_file, "rb") as f:
-                    obj = BytesIO(f.read())
-                obj.seek(0)
-                storage.upload_io(obj, dest=v.remote_name)
+                # outputs are linked or streamed to the bucket, never read into memory
+                storage.upload_file(tmp_file, dest=v.remote_name)
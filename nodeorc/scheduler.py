@@ -0,0 +1,157 @@
+"""Scheduling of queued videos for processing."""
+import logging
+
+from datetime import datetime, timedelta
+from typing import Literal, Optional
+
+from nodeorc import db_ops
+
+
+class VideoScheduler:
+    """
+    Decide which queued video is processed next.
+
+    Queued videos are ordered on the timestamp parsed from their file name, not on their arrival time, so that a
+    backlog (e.g. after a power or network outage) can be processed in the most useful order:
+
+    - "oldest": oldest video first, so that results come in chronologically.
+    - "newest": newest video first, so that the current state of the river is published as soon as possible.
+    - "thin": the backlog is thinned to the newest video of each period of ``thin_interval`` minutes (newest period
+      first). Other videos of past periods are dropped (set to ``VideoStatus.SKIPPED``), so that a sparse time series
+      is available quickly. Videos of the current period are all processed.
+
+    When more than ``max_depth`` videos are queued, videos older than ``max_age`` seconds are either deferred
+    until all other videos are processed, or dropped (set to ``VideoStatus.SKIPPED``) altogether.
+
+    Parameters
+    ----------
+    policy : str, optional {"oldest", "newest", "thin"}
+        order of processing, by default "oldest"
+    thin_interval : float, optional
+        period [min] of which only one video of the backlog is processed with policy "thin", by default 60
+    max_depth : int, optional
+        queue depth above which stale videos are deferred or dropped, if not set (default), they never are
+    max_age : float, optional
+        age [s] of the video timestamp above which a video is considered stale
+    stale_action : str, optional {"defer", "drop"}
+        what to do with stale videos, by default "defer"
+    logger : Logger, optional
+        logging object
+
+    """
+    def __init__(
+        self,
+        policy: Literal["oldest", "newest", "thin"] = "oldest",
+        thin_interval: float = 60.,
+        max_depth: Optional[int] = None,
+        max_age: Optional[float] = None,
+        stale_action: Literal["defer", "drop"] = "defer",
+        logger=logging
+    ):
+        if policy not in ["oldest", "newest", "thin"]:
+            raise ValueError(f'policy must be "oldest", "newest" or "thin", not "{policy}"')
+        if stale_action not in ["defer", "drop"]:
+            raise ValueError(f'stale_action must be "defer" or "drop", not "{stale_action}"')
+        if thin_interval <= 0:
+            raise ValueError("thin_interval must be larger than zero")
+        self.policy = policy
+        self.thin_interval = thin_interval
+        self.max_depth = max_depth
+        self.max_age = max_age
+        self.stale_action = stale_action
+        self.logger = logger
+
+    @classmethod
+    def from_settings(cls, settings, logger=logging):
+        """Create a scheduler from a ``Settings`` record."""
+        return cls(
+            policy=settings.queue_policy or "oldest",
+            thin_interval=settings.queue_thin_interval or 60.,
+            max_depth=settings.queue_max_depth,
+            max_age=settings.queue_max_age,
+            stale_action=settings.queue_stale_action or "defer",
+            logger=logger
+        )
+
+    def order(self, videos: list, now: Optional[datetime] = None):
+        """
+        Order queued videos for processing.
+
+        Parameters
+        ----------
+        videos : list[tuple]
+            (id, timestamp) of each queued video
+        now : datetime, optional
+            current time, by default ``datetime.now()``
+
+        Returns
+        -------
+        ordered : list
+            ids of videos to process, in order of processing
+        dropped : list
+            ids of stale videos, or videos thinned out of the backlog, that should not be processed
+
+        """
+        now = datetime.now() if now is None else now
+        stale = []
+        if self.max_depth is not None and self.max_age is not None and len(videos) > self.max_depth:
+            min_timestamp = now - timedelta(seconds=self.max_age)
+            stale = [v for v in videos if v[1] < min_timestamp]
+            videos = [v for v in videos if v[1] >= min_timestamp]
+        ordered, thinned = self._order(videos, now)
+        if self.stale_action == "drop":
+            return ordered, thinned + [v[0] for v in stale]
+        ordered_stale, thinned_stale = self._order(stale, now)
+        return ordered + ordered_stale, thinned + thinned_stale
+
+    def _order(self, videos, now):
+        """Order videos according to the policy, returns ids to process and ids thinned out of the backlog."""
+        if self.policy == "oldest":
+            return [v[0] for v in sorted(videos, key=lambda v: (v[1], v[0]))], []
+        newest_first = sorted(videos, key=lambda v: (v[1], v[0]), reverse=True)
+        if self.policy == "newest":
+            return [v[0] for v in newest_first], []
+        # thin: only the first video (i.e. the newest) of each past period is processed
+        period = self.thin_interval * 60.
+        current = now.timestamp() // period
+        ordered, thinned, periods = [], [], set()
+        for v in newest_first:
+            p = v[1].timestamp() // period
+            if p >= current or p not in periods:
+                periods.add(p)
+                ordered.append(v[0])
+            else:
+                thinned.append(v[0])
+        return ordered, thinned
+
+    def next_video(self, session, now: Optional[datetime] = None):
+        """
+        Get the id of the next video to process, and drop stale videos if configured.
+
+        With policy "oldest" or "newest" and no ``max_depth``, the first video is found with a single query that
+        returns one row, instead of ordering the whole queue.
+
+        Parameters
+        ----------
+        session : Session
+            database session
+        now : datetime, optional
+            current time, by default ``datetime.now()``
+
+        Returns
+        -------
+        int or None
+            id of the video to claim next, None if no videos are queued
+
+        """
+        if self.policy != "thin" and (self.max_depth is None or self.max_age is None):
+            # nothing is dropped or deferred, only the first video is needed and the backlog is not loaded
+            return db_ops.get_first_claimable_video(session, newest=self.policy == "newest")
+        ordered, dropped = self.order(db_ops.get_claimable_videos(session), now=now)
+        if dropped:
+            n = db_ops.skip_videos(session, dropped)
+            self.logger.warning(
+                f"Skipped {n} queued videos, stale (queue deeper than {self.max_depth} videos, older than "
+                f"{self.max_age} seconds) or thinned out of the backlog (policy \"{self.policy}\")."
+            )
+        return ordered[0] if ordered else None
@@ -9,18 +9,21 @@ import sys
 import threading
 import time
 import uuid
-import xarray as xr
 from urllib.parse import urljoin
 
 import numpy as np
 
 from nodeorc.tasks import request_task_form
-from nodeorc import models, disk_mng, db, db_ops, utils, water_level, __home__
+from nodeorc import models, delivery, disk_mng, db, db_ops, executor, scheduler, utils, water_level, watcher, __home__
+from nodeorc.callbacks import read_summary
 
 from typing import Optional, List
 
-session = db_ops.get_session()
-device = session.query(db.Device).first()
+def get_device():
+    """Get the device record in the session of the calling thread, so that changes are committed with it."""
+    session = db_ops.get_session()
+    return session.query(db.Device).first()
+
 
 REPLACE_ARGS = ["input_files", "output_files", "storage", "callbacks"]
 
@@ -33,6 +36,8 @@ class LocalTaskProcessor:
             water_level_settings: dict,
             disk_management: db.DiskManagement,
             max_workers: int = 1,
+            process_pool: bool = True,
+            watch_mode: str = "auto",
             auto_start_threads: bool = True,
             logger=logging,
 
@@ -42,14 +47,30 @@ class LocalTaskProcessor:
         self.video_file_ext = settings.video_file_fmt.split(".")[-1]
         self.disk_management = disk_management
         self.callback_url = callback_url.pydantic
+        # callbacks are sent over persistent connections
+        self.delivery = delivery.CallbackDelivery.from_settings(self.callback_url, settings, logger=logger)
+        # callbacks that could not be sent are retried in the background
+        self.outbox = delivery.OutboxDrainer(self.delivery, logger=logger)
         self.water_level_settings = water_level_settings
-        self.max_workers = max_workers  # for now we always only do one job at the time
+        self.max_workers = max_workers  # maximum number of videos processed at the same time
+        self.watch_mode = watch_mode  # "inotify" for file events, "poll" for periodic scans, "auto" to choose
         self.logger = logger
-        self.processing = False  # state for checking if any processing is going on
+        self.n_processing = 0  # number of videos currently being processed
+        self.processing_lock = threading.Lock()
+        # tasks are executed in worker processes (or threads), records are kept in this process
+        self.task_executor = executor.TaskExecutor(
+            max_workers=min(max_workers, multiprocessing.cpu_count()),
+            process_pool=process_pool,
+            logger=logger
+        )
+        # keeps the use of disk space within budget
+        self.budget = disk_mng.DiskBudget(disk_management, logger=logger)
+        # decides in which order queued videos are processed
+        self.scheduler = scheduler.VideoScheduler.from_settings(settings, logger=logger)
         self.reboot = False  # state that checks if a scheduled reboot should be done
         self.water_level_file_template = os.path.join(self.disk_management.water_level_path, self.water_level_settings["file_template"])
-        # make a list for processed files or files that are being processed so that they are not duplicated
-        self.processed_files = set()
+        # videos are claimed from the queue for this amount of seconds, and renewed while processing
+        self.lease = 3600.
         self.logger.info(f'Water levels will be searched for in {self.water_level_file_template} using a datetime format "{water_level_settings["datetime_fmt"]}')
         self.logger.info(f"Start listening to new videos in folder {self.disk_management.incoming_path}.")
         self.event = threading.Event()
@@ -62,6 +83,12 @@ class LocalTaskProcessor:
         self.water_level_thread = threading.Thread(
             target=self.add_water_level
         )
+        # add a thread for sending stored callbacks
+        self.outbox_thread = threading.Thread(
+            target=self.outbox.run,
+            args=(self.event,),
+            daemon=True
+        )
         if auto_start_threads:
             # automatically start threads
             self.start_threads()
@@ -69,6 +96,7 @@ class LocalTaskProcessor:
     def start_threads(self):
         self.thread.start()
         self.water_level_thread.start()
+        self.outbox_thread.start()
         try:
             # No events would mean the program can stop
             while not self.event.is_set():
@@ -79,10 +107,19 @@ class LocalTaskProcessor:
             self.event.set()
             self.thread.join()
         # Cleanup and exit
+        self.outbox.wake()
+        self.task_executor.shutdown()
+        self.delivery.close()
         self.logger.info("Program terminated.")
 
+    @property
+    def processing(self):
+        """State for checking if any processing is going on."""
+        return self.n_processing > 0
+
 
     def await_task(self, single_task=False):
+        session = db_ops.get_session()
         # Get the number of available CPU cores
         max_workers = np.minimum(
             self.max_workers,
@@ -92,7 +129,24 @@ class LocalTaskProcessor:
         disk_mng_t0 = time.time()
         reboot_t0 = time.time()
         get_task_form_t0 = time.time()
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        lease_t0 = time.time()
+        # files written before the file catalogue existed are catalogued once
+        self.catalogue_files()
+        # resume videos that were queued or being processed when the daemon stopped
+        self.recover_queue()
+        # files found but possibly still being written into
+        pending_files = set()
+        # videos being processed, with their futures
+        in_process = {}
+        tracker = watcher.FileStabilityTracker()
+        folder_watcher = watcher.FolderWatcher(
+            self.disk_management.incoming_path,
+            suffix=self.video_file_ext,
+            mode=self.watch_mode,
+            tracker=tracker,
+            logger=self.logger
+        )
+        with folder_watcher, concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
             while not self.event.is_set():
                 if not os.path.isdir(self.disk_management.home_folder):
                     # usually happens when USB drive is removed
@@ -102,30 +156,50 @@ class LocalTaskProcessor:
                         f"disk. "
                     )
                     os._exit(1)
-
-                file_paths = disk_mng.scan_folder(
-                    self.disk_management.incoming_path,
-                    suffix=self.video_file_ext
-                )
-                for file_path in file_paths:
-                    # each file is checked if it is not yet in the queue and not
-                    # being written into
-                    if os.path.isfile(file_path) and \
-                            file_path not in self.processed_files and \
-                            not utils.is_file_size_changing(file_path):
-                        self.logger.info(f"Found file: {file_path}")
-                        # Submit the file processing task to the thread pool
-                        executor.submit(
-                            self.process_file,
-                            file_path,
-                        )
-                        # make sure the file is in the list of processed files to ensure the task is not
-                        # duplicated to another thread instance
-                        self.processed_files.add(file_path)
-                        if single_task:
-                            # only one task must be performed, return
-                            return True
-                time.sleep(5)  # wait for 5 secs before re-investigating the monitored folder for new files
+                # wait for a new file, only shortly if files are waiting to be completed, so that housekeeping
+                # below is done regularly
+                file_path = folder_watcher.get(timeout=tracker.interval / 2 if pending_files else 1.)
+                while file_path is not None:
+                    pending_files.add(file_path)
+                    file_path = folder_watcher.get(timeout=0)
+                for file_path in list(pending_files):
+                    # each file is checked if it still exists and is no longer being written into
+                    if not os.path.isfile(file_path):
+                        pending_files.discard(file_path)
+                        tracker.forget(file_path)
+                        continue
+                    if not tracker.observe(file_path):
+                        continue
+                    pending_files.discard(file_path)
+                    tracker.forget(file_path)
+                    self.logger.info(f"Found file: {file_path}")
+                    # store the video in the persistent queue, this moves the file out of the incoming folder
+                    try:
+                        self.queue_file(file_path)
+                    except Exception as e:
+                        self.logger.error(f"Could not queue {file_path} for processing. Reason: {e}")
+                # hand out queued videos to free workers
+                for video_id in [k for k, future in in_process.items() if future.done()]:
+                    in_process.pop(video_id)
+                while len(in_process) < max_workers:
+                    video_id = self.scheduler.next_video(session)
+                    if video_id is None:
+                        break
+                    video = db_ops.claim_video(session, lease=self.lease, video_id=video_id)
+                    if video is None:
+                        break
+                    # Submit the video processing task to the thread pool
+                    in_process[video.id] = executor.submit(
+                        self.process_video,
+                        video.id,
+                    )
+                    if single_task:
+                        # only one task must be performed, return
+                        return True
+                if in_process and time.time() - lease_t0 > self.lease / 4:
+                    # keep the claims on videos being processed
+                    lease_t0 = time.time()
+                    db_ops.renew_video_leases(session, list(in_process), lease=self.lease)
                 # do housekeeping, reboots, new task forms, disk management
                 if self.settings.reboot_after != 0:
                     if time.time() - reboot_t0 > max(self.settings.reboot_after, 3600) and not self.reboot:
@@ -138,44 +212,113 @@ class LocalTaskProcessor:
                 if time.time() - disk_mng_t0 > self.disk_management.frequency:
                     # reset the disk management t0 counter
                     disk_mng_t0 = time.time()
-                    self.logger.info(
-                        f"Checking for disk space exceedance of {self.disk_management.min_free_space}"
-                    )
-                    free_space = disk_mng.get_free_space(
-                        self.disk_management.home_folder
-                    )
-                    if free_space < self.disk_management.min_free_space:
-                        self.cleanup_space(free_space=free_space)
+                    self.check_disk_space()
 
     def add_water_level(self, single_task=False):
         session = db_ops.get_session()
         self.logger.info("Starting thread for retrieving water levels")
         # TODO: retrieve water level parameters and only if available run this!
         if self.water_level_settings:
-            while not self.event.is_set():
-                try:
-                    self.logger.info("Checking for water levels.")
-                    timestamp, level = water_level.execute_water_level_script(
-                        script=self.water_level_settings["script"],
-                        script_type=self.water_level_settings["script_type"].name,
-                    )
-                    self.logger.info(f"Water level found for timestamp {timestamp} with value {level}. Will add to database if not already existing.")
-                    db_ops.add_water_level(session=session, timestamp=timestamp, level=level)
-                    if single_task:
-                        return timestamp, level
-                except RuntimeError:
-                    self.logger.error(f"Error in retrieval of water levels, likely due to a connection problem.")
-                # sleep for configured amount of seconds
-                time.sleep(self.water_level_settings["frequency"])
+            script_worker = None
+            if self.water_level_settings["script_type"] in [None, db.ScriptType.PYTHON] and \
+                    self.water_level_settings.get("persistent_script") is not False:
+                # load the script once in a worker process, instead of starting an interpreter for each reading
+                script_worker = water_level.WaterLevelScriptWorker(
+                    self.water_level_settings["script"],
+                    logger=self.logger
+                )
+            try:
+                while not self.event.is_set():
+                    try:
+                        self.logger.info("Checking for water levels.")
+                        # scripts may use the last known timestamp to only fetch readings that are missing
+                        since = db_ops.get_last_water_level_timestamp(session)
+                        if script_worker is not None:
+                            readings = script_worker.read(since=since, all_lines=True)
+                        else:
+                            readings = water_level.execute_water_level_script(
+                                script=self.water_level_settings["script"],
+                                script_type=self.water_level_settings["script_type"].name,
+                                since=since,
+                                all_lines=True,
+                            )
+                        timestamp, level = readings[-1]
+                        self.logger.info(f"{len(readings)} water level(s) found, last for timestamp {timestamp} with value {level}. Will add to database if not already existing.")
+                        n = db_ops.add_water_levels(session, *zip(*readings), source=db.TimeSeriesSource.SCRIPT)
+                        self.logger.debug(f"{n} new water level(s) added to database.")
+                        if single_task:
+                            return timestamp, level
+                    except RuntimeError:
+                        self.logger.error(f"Error in retrieval of water levels, likely due to a connection problem.")
+                    except ValueError as e:
+                        self.logger.error(f"Error in retrieval or storage of water level. Reason: {e}")
+                    # sleep for configured amount of seconds
+                    time.sleep(self.water_level_settings["frequency"])
+            finally:
+                if script_worker is not None:
+                    script_worker.stop()
             self.logger.info("Water level thread terminated.")
         else:
             self.logger.info("No water level parameters configured, skipping retrieval.")
 
 
+    @property
+    def purge_folders(self):
+        """Folders of which files are removed when disk space runs low, per category of files, in order of purging."""
+        return {
+            "failed": str(self.disk_management.failed_path),
+            "results": str(self.disk_management.results_path),
+        }
+
+    def catalogue_files(self):
+        """
+        Add the files in folders that are purged to the file catalogue, for categories that are not catalogued yet.
+
+        Files written by NodeORC are catalogued when they are written, so that folders only need to be scanned once,
+        e.g. after an upgrade.
+        """
+        session = db_ops.get_session()
+        for category, folder in self.purge_folders.items():
+            if not db_ops.has_files(session, category):
+                n = disk_mng.catalogue_folder(session, folder, category)
+                self.logger.info(f"{n} files in {folder} added to the file catalogue")
+        if not db_ops.has_files(session, "videos"):
+            # files of videos processed before, so that videos can be purged by size
+            videos = session.query(db.Video.id, db.Video.file).filter(
+                db.Video.status == db.VideoStatus.DONE, db.Video.file.is_not(None)
+            ).all()
+            for video_id, fn in videos:
+                disk_mng.catalogue_video(
+                    session,
+                    video_id,
+                    os.path.dirname(os.path.join(__home__, "uploads", fn)),
+                    os.path.basename(fn)
+                )
+            if len(videos) > 0:
+                self.logger.info(f"Files of {len(videos)} processed videos added to the file catalogue")
+
+    def check_disk_space(self):
+        """
+        Keep the use of disk space within budget (retention, quotas and projected use), and clean up further if free
+        space is still too low.
+        """
+        session = db_ops.get_session()
+        self.logger.info(
+            f"Checking for disk space exceedance of {self.disk_management.min_free_space}"
+        )
+        try:
+            free_space = self.budget.check(session)
+        except Exception as e:
+            session.rollback()
+            self.logger.error(f"Could not check the disk budget. Reason: {e}")
+            free_space = disk_mng.get_free_space(self.disk_management.home_folder)
+        if free_space < self.disk_management.min_free_space:
+            self.cleanup_space(free_space=free_space)
+
     def cleanup_space(self, free_space):
         """
         Free up space on disk by removing oldest files first.
-        First success and failed paths are cleaned, then results path is cleaned.
+        First failed path is cleaned, then the oldest processed videos are removed, then results path is cleaned.
 
         Parameters
         ----------
@@ -183,6 +326,7 @@ class LocalTaskProcessor:
             GB amount of free space currently available
 
         """
+        session = db_ops.get_session()
         ret = disk_mng.purge(
             [
                 str(self.disk_management.failed_path)
@@ -190,11 +334,26 @@ class LocalTaskProcessor:
             free_space=free_space,
             min_free_space=self.disk_management.min_free_space,
             logger=self.logger,
-            home=self.disk_management.home_folder
+            home=self.disk_management.home_folder,
+            session=session,
+            category="failed"
         )
+        # if returned is False then continue with the oldest processed videos
+        if not ret:
+            self.logger.warning(f"Space after purging still not enough, purging oldest videos")
+            free_space = disk_mng.get_free_space(self.disk_management.home_folder)
+            disk_mng.purge_videos(
+                session,
+                self.logger,
+                size=int((self.disk_management.min_free_space - free_space) * 10e8),
+                roots=self.budget.roots
+            )
+            free_space = disk_mng.get_free_space(self.disk_management.home_folder)
+            ret = free_space >= self.disk_management.min_free_space
         # if returned is False then continue purging the results path
         if not ret:
             self.logger.warning(f"Space after purging still not enough, purging results folder")
+            free_space = disk_mng.get_free_space(self.disk_management.home_folder)
             ret = disk_mng.purge(
                 [
                     str(self.disk_management.results_path)
@@ -202,7 +361,9 @@ class LocalTaskProcessor:
                 free_space=free_space,
                 min_free_space=self.disk_management.min_free_space,
                 logger=self.logger,
-                home=self.disk_management.home_folder
+                home=self.disk_management.home_folder,
+                session=session,
+                category="results"
             )
         if not ret:
             self.logger.warning(f"Not enough space freed up. Checking for critical space.")
@@ -224,20 +385,102 @@ class LocalTaskProcessor:
 
     def get_new_task_form(self):
         new_task_form_row = request_task_form(
-            session=session,
+            session=db_ops.get_session(),
             callback_url=self.callback_url,
-            device=device,
+            device=get_device(),
             logger=self.logger
         )
         if new_task_form_row:
             # replace the task form template
             self.task_form_template = new_task_form_row.task_body
 
-    def process_file(
+    def recover_queue(self):
+        """Put videos that were being processed at a stop of the daemon back in the queue and clean up tmp files."""
+        session = db_ops.get_session()
+        n = db_ops.requeue_videos(session)
+        if n > 0:
+            self.logger.info(f"Resuming {n} video(s) that were being processed before the last stop.")
+        n_queued = session.query(db.Video).filter(db.Video.status == db.VideoStatus.QUEUE).count()
+        if n_queued > 0:
+            self.logger.info(f"{n_queued} video(s) in the queue.")
+        # temporary task folders are left behind when processing was interrupted, raw videos are kept in their bucket
+        tmp_path = self.disk_management.tmp_path
+        if tmp_path and os.path.isdir(tmp_path):
+            for folder in os.listdir(tmp_path):
+                shutil.rmtree(os.path.join(tmp_path, folder), ignore_errors=True)
+
+    def queue_file(
             self,
             file_path,
     ):
+        """
+        Add a new video file to the persistent queue of videos to process.
+
+        A Video record with status QUEUE is created and the file is moved from the incoming folder to its final
+        bucket under ``uploads/videos/<date>/<video id>``, so that queued videos survive reboots and are never
+        found twice. The file is catalogued as raw video ("videos") of the video.
+
+        Parameters
+        ----------
+        file_path : str
+            path to new video file in incoming folder
+
+        Returns
+        -------
+        Video or None
+            queued video record, None if the video cannot be queued.
+
+        """
+        session = db_ops.get_session()
+        filename = os.path.split(file_path)[1]
+        try:
+            timestamp = get_timestamp(
+                file_path,
+                parse_from_fn=self.settings.parse_dates_from_file,
+                fn_fmt=self.settings.video_file_fmt,
+            )
+        except Exception as e:
+            message = f"Could not get a logical timestamp from file {file_path}. Reason: {e}"
+            get_device().message = message
+            session.commit()
+            self.logger.error(message)
+            # set files aside in the failed location
+            self._set_results_to_final_path(file_path, self.disk_management.failed_path, filename, None)
+            db_ops.add_files(session, [os.path.join(self.disk_management.failed_path, filename)], "failed")
+            return None
+        self.logger.info(f"Timestamp for video found at {timestamp.strftime('%Y%m%dT%H%M%S')}")
+        video = db.Video(
+            timestamp=timestamp,
+            status=db.VideoStatus.QUEUE,
+        )
+        session.add(video)
+        session.commit()
+        storage = get_video_storage(video)
+        # record the final location before moving, so that a video is never lost
+        video.file = f"{os.path.relpath(storage.bucket, os.path.join(__home__, 'uploads'))}/{filename}"
+        session.commit()
+        if not(os.path.isdir(storage.bucket)):
+            os.makedirs(storage.bucket)
+        shutil.move(file_path, os.path.join(storage.bucket, filename))
+        # the raw video takes space from now on, also if it is never processed (e.g. skipped by the scheduler)
+        db_ops.add_files(session, [os.path.join(storage.bucket, filename)], "videos", video_id=video.id)
+        self.logger.info(f"Video {video.id} queued for processing")
+        return video
+
+    def process_video(
+            self,
+            video_id,
+    ):
+        """
+        Process a claimed video from the queue.
+
+        Parameters
+        ----------
+        video_id : int
+            id of Video record, claimed with ``db_ops.claim_video``
 
+        """
+        session = db_ops.get_session()
         # before any processing, check for new task forms online
         self.get_new_task_form()
 
@@ -249,156 +492,122 @@ class LocalTaskProcessor:
         # ensure the tmp path is in place
         if not(os.path.isdir(task_path)):
             os.makedirs(task_path)
-        # now we really start processing
-        self.processing = True
         try:
-            url, filename = os.path.split(file_path)
-            cur_path = file_path
-            self.logger.info(f"Processing file: {file_path}")
-            # determine time stamp
+            # now we really start processing. The count goes down again in any case, also if the video cannot be
+            # processed at all, so that reboots and shutdowns do not wait forever
+            with self.processing_lock:
+                self.n_processing += 1
+            video = session.get(db.Video, video_id)
+            if video is None:
+                self.logger.error(f"Video {video_id} is not in the database, skipping")
+                shutil.rmtree(task_path, ignore_errors=True)
+                return
+            timestamp = video.timestamp
+            storage = get_video_storage(video)
+            filename = os.path.split(video.file)[1]
+            # the raw video stays in its bucket during processing, it is only linked into the task path
+            cur_path = os.path.join(storage.bucket, filename)
             try:
-                timestamp = get_timestamp(
-                    file_path,
-                    parse_from_fn=self.settings.parse_dates_from_file,
-                    fn_fmt=self.settings.video_file_fmt,
+                self.logger.info(f"Processing video {video.id}: {cur_path}")
+                if not os.path.isfile(cur_path):
+                    raise FileNotFoundError(f"Video file {cur_path} is missing")
+                # collect water level
+                rec = get_water_level(
+                    timestamp,
+                    file_fmt=self.water_level_file_template,
+                    datetime_fmt=self.water_level_settings["datetime_fmt"],
+                    allowed_dt=self.settings.allowed_dt,
+                    interpolate=bool(self.water_level_settings.get("interpolate")),
+                    logger=self.logger
                 )
-            except Exception as e:
-                timestamp = None
-                message = f"Could not get a logical timestamp from file {file_path}. Reason: {e}"
-                device.message = message
-                session.commit()
-                self.logger.error(message)
-                raise ValueError(message)
-                # set message on device
-            # create Storage instance
-            self.logger.info(f"Timestamp for video found at {timestamp.strftime('%Y%m%dT%H%M%S')}")
-
-            # create a preliminary video record in database
-            video = db.Video(
-                timestamp=timestamp,
-                status=db.VideoStatus.TASK,
-            )
-            session.add(video)
-            session.commit()
-            session.refresh(video)
+                if rec is None:
+                    message = f"Could not obtain a water level for date {timestamp.strftime('%Y%m%d')} at timestamp {timestamp.strftime('%Y%m%dT%H%M%S')}."
+                    if self.water_level_settings["optical"]:
+                        self.logger.warning(message)
+                        self.logger.warning("Optical water level detection will be attempted.")
+                        h_a = None
+                    else:
+                        get_device().message = message
+                        session.commit()
+                        self.logger.error(message)
+                        raise ValueError(message)
 
-            # change storage to match nodeorc api requirements
-            storage = models.Storage(
-                url=os.path.join(__home__, "uploads", "videos", timestamp.strftime("%Y%m%d")),
-                bucket_name=str(video.id)
-            )
-            # move the file to the intended bucket
-            if not(os.path.isdir(storage.bucket)):
-                os.makedirs(storage.bucket)
-            os.rename(file_path, os.path.join(storage.bucket, filename))
-            # update the location of the current path of the video file (only used in exception)
-            cur_path = os.path.join(storage.bucket, filename)
-            # collect water level
-            rec = get_water_level(
-                timestamp,
-                file_fmt=self.water_level_file_template,
-                datetime_fmt=self.water_level_settings["datetime_fmt"],
-                allowed_dt=self.settings.allowed_dt,
-                logger=self.logger
-            )
-            if rec is None:
-                message = f"Could not obtain a water level for date {timestamp.strftime('%Y%m%d')} at timestamp {timestamp.strftime('%Y%m%dT%H%M%S')}."
-                if self.water_level_settings["optical"]:
-                    self.logger.warning(message)
-                    self.logger.warning("Optical water level detection will be attempted.")
-                    h_a = None
                 else:
-                    device.message = message
-                    session.commit()
-                    self.logger.error(message)
-                    raise ValueError(message)
-
-            else:
-                # retrieve water level from time series record
-                h_a = rec.h
-
-            # create the task object from all data
-            task = create_task(
-                self.task_form_template,
-                task_uuid,
-                task_path,
-                storage,
-                filename,
-                timestamp,
-                h_a,
-                self.water_level_settings["optical"],
-                logger=self.logger
-            )
-            # set cur_path to tmp location (only used on exception)
-            cur_path = os.path.join(task_path, filename)
-            # process the task
-            task.execute(task_path)
-
-            if self.disk_management.results_path:
-                dst_path = os.path.join(
-                    self.disk_management.results_path,
-                    timestamp.strftime("%Y%m%d")
-                )
-            # video is success, if task form is still CANDIDATE, upgrade to ACCEPTED
-            db_ops.patch_active_config_to_accepted()
-            # perform the callbacks here only when video was successfully completed
-            # set files and cleanup
-            self._set_results_to_final_path(cur_path, storage.bucket, filename, task_path)
-            # if the video was treated successfully, then store a record in the database
-            rel_path_name = os.path.relpath(storage.bucket, os.path.join(__home__, "uploads"))
-            if rec is None:
-                # check if a water level was detected and store that
-                callback = task.callbacks[0]
-                fn = os.path.join(
-                    callback.storage.url,
-                    callback.storage.bucket_name,
-                    callback.file.remote_name
+                    # retrieve water level from time series record
+                    h_a = rec.h
+
+                # create the task object from all data
+                task = create_task(
+                    self.task_form_template,
+                    task_uuid,
+                    task_path,
+                    storage,
+                    filename,
+                    timestamp,
+                    h_a,
+                    self.water_level_settings["optical"],
+                    logger=self.logger
                 )
-                ds = xr.open_dataset(fn)
-                h_a = float(ds.h_a)
-                rec = db_ops.add_water_level(session, timestamp, h_a)
+                # process the task, in a worker process if configured. The raw video is kept in its bucket.
+                result = self.task_executor.execute(task, task_path, keep_src=True)
+                self.logger.info(f"Task {result['id']} executed in {result['duration']:.1f} seconds")
+
+                # video is success, if task form is still CANDIDATE, upgrade to ACCEPTED
+                db_ops.patch_active_config_to_accepted()
+                # remove any left over temporary files
+                shutil.rmtree(task_path, ignore_errors=True)
+                # if the video was treated successfully, then store a record in the database
+                rel_path_name = os.path.relpath(storage.bucket, os.path.join(__home__, "uploads"))
+                # summarize the results once, the callbacks and the time series record are made from the summary
+                summary = get_result_summary(task.callbacks)
+                if rec is None and summary is None:
+                    raise ValueError("No water level available and no results to read a detected water level from")
+                # store the summary with the (detected) water level at the video timestamp
+                db_ops.add_result_summary(session, video, rec, summary)
+                video.image = f"{rel_path_name}/{task.output_files['jpg'].remote_name}"
+                video.status = db.VideoStatus.DONE
+                video.lease_expires = None
+                session.commit()
+                # keep track of the disk space used by the video
+                disk_mng.catalogue_video(session, video.id, storage.bucket, filename)
+                # very finally, perform the callback
+                callback_success = self._post_callbacks(task.callbacks)
+                if callback_success:
+                    video.sync_status = True
+                else:
+                    video.sync_status = False
                 session.commit()
 
-            video.time_series_id = rec.id,
-            video.file = f"{rel_path_name}/{filename}"
-            video.image = f"{rel_path_name}/{task.output_files['jpg'].remote_name}"
-            video.status = db.VideoStatus.DONE
-            session.commit()
-            # very finally, perform the callback
-            callback_success = self._post_callbacks(task.callbacks)
-            if callback_success:
-                video.sync_status = True
-            else:
-                video.sync_status = False
-            session.commit()
-
-        except Exception as e:
-            callback_success = False  # video was unsuccessful so callbacks are also not successful
-            message = f"Error processing {file_path}: {str(e)}"
-            device.message = message
-            if "video" in locals():
+            except Exception as e:
+                callback_success = False  # video was unsuccessful so callbacks are also not successful
+                message = f"Error processing {cur_path}: {str(e)}"
+                get_device().message = message
                 video.status = db.VideoStatus.ERROR
+                video.lease_expires = None
                 session.commit()
-            self.logger.error(message)
-            # find back the file and place in the failed location, organised per day
-            if timestamp:
+                self.logger.error(message)
+                # find back the file and place in the failed location, organised per day
                 dst_path = os.path.join(self.disk_management.failed_path, timestamp.strftime("%Y%m%d"))
-            else:
-                dst_path = self.disk_management.failed_path
-            # set files and cleanup
-            self._set_results_to_final_path(cur_path, dst_path, filename, task_path)
-            # also check if the current form is a CANDIDATE form. If so report to device and roll back to the ACCEPTED FORM
-            task_form_template = db_ops.get_active_task_form(session, parse=False)
-
-        # once done, the file is removed from list of considered files for processing
-        self.processed_files.remove(file_path)
-        # if callbacks were successful, try to send off old callbacks that were not successful earlier
-        if callback_success:
-            self.logger.debug("Checking for old callbacks to send")
-            self._post_old_callbacks()
-        # processing done, so set back to False
-        self.logger.debug("Processing done, setting processing state to False")
-        self.processing = False
+                # set files and cleanup
+                if os.path.isfile(cur_path):
+                    self._set_results_to_final_path(cur_path, dst_path, filename, task_path)
+                    db_ops.remove_files(session, [cur_path])
+                    db_ops.add_files(session, [os.path.join(dst_path, filename)], "failed", video_id=video.id)
+                else:
+                    shutil.rmtree(task_path, ignore_errors=True)
+                # also check if the current form is a CANDIDATE form. If so report to device and roll back to the ACCEPTED FORM
+                task_form_template = db_ops.get_active_task_form(session, parse=False)
+
+            # if callbacks were successful, the server is reachable, so send off old callbacks that were not successful
+            # earlier
+            if callback_success:
+                self.logger.debug("Checking for old callbacks to send")
+                self.outbox.wake()
+        finally:
+            # processing done, so count down the number of videos in process
+            self.logger.debug("Processing done, decreasing number of videos in process")
+            with self.processing_lock:
+                self.n_processing -= 1
         # shutdown if configured to shutdown after task
         self._shutdown_or_not()
         # check if any reboots are needed and reboot
@@ -412,7 +621,7 @@ class LocalTaskProcessor:
         os.rename(cur_path, dst)
         self.logger.debug(f"Video file moved from {cur_path} to {dst_path}")
 
-        if os.path.isdir(task_path):
+        if task_path and os.path.isdir(task_path):
             # remove any left over temporary files
             shutil.rmtree(task_path)
 
@@ -437,28 +646,42 @@ class LocalTaskProcessor:
         """
         # get the name of callback
         success = True
+        # callbacks of one video are sent in order
         for callback in callbacks:
-
             url = urljoin(str(self.callback_url.url), callback.endpoint)
-            self.logger.info(f"Sending {callback.func_name} callback to {url}")
-            store_callback = False
-            r = self.callback_url.send_callback(callback)
-            if r is None:
-                success = False
-                self.logger.error(
-                    f"Connection to {url} failed, connection error"
-                )
-                store_callback = True
-            elif r.status_code != 201 and r.status_code != 200:
-                success = False
+            if not self.outbox.breaker.allow():
+                # the server is known to be down, do not wait for another connection timeout
+                self.logger.warning(f"Server is not reachable, not sending callback to {url}")
+                r = None
+            else:
+                try:
+                    r = self.delivery.send(callback)
+                except Exception as e:
+                    # the callback cannot be made, storing it for a retry will not help
+                    self.outbox.breaker.release()
+                    success = False
+                    self.logger.error(f"Callback to {url} cannot be made. Reason: {e}")
+                    continue
+                if r is None:
+                    self.outbox.breaker.record_failure()
+                    self.logger.error(
+                        f"Connection to {url} failed, connection error"
+                    )
+                else:
+                    self.outbox.breaker.record_success()
+            if r is not None and r.status_code != 201 and r.status_code != 200:
                 self.logger.error(
                     f'callback to {url} failed with error code {r.status_code}, storing callback in database'
                 )
-                store_callback = True
-            if store_callback:
+            if r is None or (r.status_code != 201 and r.status_code != 200):
                 # something went wrong while sending, store callback for a later re-try
+                success = False
                 self.logger.info(f"Storing callback in database to prevent loss of data")
-                callback.to_db()
+                try:
+                    callback.to_db()
+                except Exception as e:
+                    # the video itself was processed successfully, only its callback is lost
+                    self.logger.error(f"Callback to {url} could not be stored. Reason: {e}")
 
         return success
 
@@ -473,34 +696,43 @@ class LocalTaskProcessor:
                 utils.reboot_now()
 
 
-    def _post_old_callbacks(self):
-        """
-        Try to post remaining non-posted callbacks and change their states in database
-        if successful
-        """
-        callback_records = session.query(db.Callback)
-        callbacks = [cb.callback for cb in callback_records]
-        # send off
-        success = True
-        for callback_record in callback_records:
-            callback = callback_record.callback
-            url = urljoin(str(self.callback_url.url), callback.endpoint)
-            self.logger.info(f"Sending {callback.func_name} callback to {url}")
-            r = self.callback_url.send_callback(callback)
-            if r is None:
-                success = False
-                self.logger.error(
-                    f"Connection to {url} failed, connection error, stopping posts"
-                )
-            elif r.status_code != 201 and r.status_code != 200:
-                self.logger.error(
-                    f'callback to {url} failed with error code {r.status_code}, skipping record'
-                )
-            if not(success):
-                # immediately stop the processing of callbacks
-                break
-            session.delete(callback_record)
-            session.commit()
+def get_result_summary(callbacks):
+    """
+    Read the summary of the results of a task from its transect file, and add it to the callbacks that report it.
+
+    The file is only read once, and callbacks that are retried later do not need the file anymore.
+
+    Parameters
+    ----------
+    callbacks : list[Callback]
+        callbacks of the task, the file of the first discharge callback (or else of the first callback with a file)
+        is read
+
+    Returns
+    -------
+    dict or None
+        summary of the results (see ``callbacks.read_summary``), None if no callback has a file
+    """
+    with_file = [cb for cb in callbacks if isinstance(cb.file, models.File)]
+    with_file.sort(key=lambda cb: cb.func_name != "discharge")
+    if len(with_file) == 0:
+        return None
+    callback = with_file[0]
+    summary = read_summary(
+        os.path.join(callback.storage.url, callback.storage.bucket_name, callback.file.remote_name)
+    )
+    for cb in callbacks:
+        if cb.func_name == "discharge" and cb.file == callback.file:
+            cb.summary = summary
+    return summary
+
+
+def get_video_storage(video):
+    """Return the storage (bucket) in which the files of a video are kept."""
+    return models.Storage(
+        url=os.path.join(__home__, "uploads", "videos", video.timestamp.strftime("%Y%m%d")),
+        bucket_name=str(video.id)
+    )
 
 
 def get_timestamp(
@@ -552,13 +784,24 @@ def get_water_level(
     file_fmt,
     datetime_fmt,
     allowed_dt=10,
-    session=session,
+    interpolate=False,
+    session=None,
     logger=logging
 ):
+    """Get the water level of a video from the database, or else from water level files, None if there is none.
+
+    Interpolated water levels and water levels from files are returned as records that are not stored, so that they
+    are never used as water level for other videos. They are stored with the results of the video only.
+    """
+    session = session or db_ops.get_session()
     try:
         # first try to get water level from database
-        rec = db_ops.get_water_level(session, timestamp, allowed_dt)
-        logger.info(f"Water level found in database at closest timestamp {timestamp} with value {rec.h} m.")
+        rec = db_ops.get_water_level(session, timestamp, allowed_dt, interpolate=interpolate)
+        if rec.id is None:
+            # the interpolated water level is not stored as a water level, only with the results of the video
+            logger.info(f"Water level interpolated from database at timestamp {timestamp} with value {rec.h} m.")
+        else:
+            logger.info(f"Water level found in database at closest timestamp {timestamp} with value {rec.h} m.")
     except Exception as db_ex:
         logger.warning(f"Failed to fetch water level from database at timestamp {timestamp.strftime('%Y%m%dT%H%M%S')}. Trying data file.")
         try:
@@ -567,12 +810,12 @@ def get_water_level(
                 timestamp,
                 file_fmt=file_fmt,
                 datetime_fmt=datetime_fmt,
-                allowed_dt=allowed_dt
+                allowed_dt=allowed_dt,
+                interpolate=interpolate,
             )
 
             logger.info(f"Water level found in file with value {h_a} m.")
-            rec = db_ops.add_water_level(session, timestamp, h_a)
-            session.commit()
+            rec = db.TimeSeries(timestamp=timestamp, h=h_a, source=db.TimeSeriesSource.FILE)
         except Exception as e:
             return None
             # raise ValueError(message)
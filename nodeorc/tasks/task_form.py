@@ -9,6 +9,7 @@ from urllib.parse import urljoin
 import uuid
 import json
 
+from nodeorc import db_ops
 from nodeorc.models import Task
 from nodeorc.db import TaskForm, TaskFormStatus, DeviceFormStatus
 from .. import utils, __home__
@@ -254,12 +255,13 @@ def save_new_task_form(session, task_form_rec):
 
 
     """
-    # find if there is a status.CANDIDATE task form
-    query = session.query(TaskForm)
-    query.filter_by(status=TaskFormStatus.CANDIDATE)
-    if len(query.all()) > 0:
-        for item in query:
-            item.status = TaskFormStatus.ANCIENT
+    # make any status.CANDIDATE task forms ANCIENT, in one statement
+    session.query(TaskForm).filter_by(status=TaskFormStatus.CANDIDATE).update(
+        {TaskForm.status: TaskFormStatus.ANCIENT},
+        synchronize_session="fetch"
+    )
     # store the new validated task form as candidate
     session.add(task_form_rec)
     session.commit()
+    # the bulk update does not run ORM events, make sure that no session keeps using an earlier CANDIDATE form
+    db_ops.reset_config_cache(session, TaskForm)
@@ -1,4 +1,3 @@
-import boto3
 import os
 import logging
 import time
@@ -33,6 +32,7 @@ def get_s3(
     access_key,
     secret_key,
 ):
+    import boto3  # import lazily, only needed for S3 storage
     return boto3.resource(
         "s3",
         endpoint_url=endpoint_url,
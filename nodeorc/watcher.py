@@ -0,0 +1,334 @@
+"""Watchers for new files in the incoming folder of NodeORC."""
+import ctypes
+import ctypes.util
+import logging
+import os
+import queue
+import select
+import struct
+import threading
+import time
+
+from typing import Literal, Optional
+
+from nodeorc import disk_mng
+
+# inotify event flags, see inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def _load_libc():
+    """Return libc with inotify symbols, or None if inotify is not supported on this platform."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        _ = libc.inotify_init1, libc.inotify_add_watch, libc.inotify_rm_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+def inotify_available():
+    """Check if the kernel inotify interface can be used for watching folders."""
+    libc = _load_libc()
+    if libc is None:
+        return False
+    fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+        return False
+    os.close(fd)
+    return True
+
+
+class FileStabilityTracker:
+    """
+    Track whether files are completely written, without waiting for them.
+
+    For each path, the (size, modification time) pair is recorded every time the file is observed. A file is
+    promoted to "ready" once it has been observed unchanged ``observations`` times, with at least ``interval``
+    seconds between counted observations, or immediately when a close-after-write or move event for the file is
+    received from the watcher. Observing a file only requires one ``os.stat`` call, so that the caller never sleeps.
+
+    Parameters
+    ----------
+    observations : int, optional
+        number of unchanged observations needed before a file is ready, by default 2
+    interval : float, optional
+        minimum seconds between two counted observations, by default 1
+
+    """
+    def __init__(self, observations: int = 2, interval: float = 1.):
+        if observations < 1:
+            raise ValueError("observations must be at least 1")
+        self.observations = observations
+        self.interval = interval
+        self._state = {}  # path -> (size, mtime, count, time of last counted observation)
+        self._ready = set()
+        self._lock = threading.Lock()
+
+    def mark_closed(self, path: str):
+        """Promote a file to ready, e.g. after the writing process closed it."""
+        with self._lock:
+            self._ready.add(path)
+            self._state.pop(path, None)
+
+    def is_ready(self, path: str):
+        """Check if a file is known to be ready, without touching the file system."""
+        return path in self._ready
+
+    def observe(self, path: str, now: Optional[float] = None):
+        """
+        Observe size and modification time of a file and return if it is ready.
+
+        Parameters
+        ----------
+        path : str
+            path to file
+        now : float, optional
+            current time [s], by default ``time.monotonic()``
+
+        Returns
+        -------
+        bool
+            True if the file is ready for processing, False if it may still be written into (or has disappeared)
+
+        """
+        if path in self._ready:
+            return True
+        now = time.monotonic() if now is None else now
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.forget(path)
+            return False
+        with self._lock:
+            state = self._state.get(path)
+            if state is None or state[:2] != (stat.st_size, stat.st_mtime_ns):
+                # new or changed file, start counting again
+                state = (stat.st_size, stat.st_mtime_ns, 1, now)
+            elif now - state[3] >= self.interval:
+                state = (state[0], state[1], state[2] + 1, now)
+            if state[2] >= self.observations:
+                self._ready.add(path)
+                self._state.pop(path, None)
+                return True
+            self._state[path] = state
+        return False
+
+    def forget(self, path: str):
+        """Remove all information on a file, e.g. after it has been processed."""
+        with self._lock:
+            self._ready.discard(path)
+            self._state.pop(path, None)
+
+
+class FolderWatcher:
+    """
+    Watch a folder (recursively) for new files and push their paths onto a queue.
+
+    Two modes are supported. With "inotify", the kernel notifies the watcher as soon as a file is closed after
+    writing or moved into the watched tree, so that new files are seen almost instantly and without walking the
+    folder. With "poll", the folder is scanned with ``disk_mng.scan_folder`` every ``interval`` seconds, which is
+    the fallback when inotify is not available (e.g. on non-Linux systems or some network file systems).
+    In both modes, files already present at start are pushed first.
+
+    Parameters
+    ----------
+    path : str
+        folder to watch
+    suffix : str, optional
+        only files ending with this suffix are reported
+    mode : str, optional {"auto", "inotify", "poll"}
+        watch mode, "auto" (default) uses inotify where available and falls back to polling otherwise
+    interval : float, optional
+        seconds between scans in poll mode, by default 5
+    tracker : FileStabilityTracker, optional
+        if provided, files that are closed after writing or moved into the tree are marked ready in the tracker
+    logger : Logger, optional
+        logging object
+
+    """
+    def __init__(
+        self,
+        path: str,
+        suffix: Optional[str] = None,
+        mode: Literal["auto", "inotify", "poll"] = "auto",
+        interval: float = 5.,
+        tracker: Optional[FileStabilityTracker] = None,
+        logger=logging
+    ):
+        if mode not in ["auto", "inotify", "poll"]:
+            raise ValueError(f'Watch mode must be "auto", "inotify" or "poll", not "{mode}"')
+        self.path = path
+        self.suffix = suffix
+        self.interval = interval
+        self.tracker = tracker
+        self.logger = logger
+        self.queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+        self._fd = None
+        self._libc = None
+        self._watches = {}  # watch descriptor -> folder
+        self._seen = set()  # files already reported in poll mode
+        if mode == "auto":
+            mode = "inotify" if inotify_available() else "poll"
+        elif mode == "inotify" and not inotify_available():
+            raise OSError("inotify is not available on this system, use mode=\"poll\" instead")
+        self.mode = mode
+
+    def start(self):
+        """Report all files currently present and start watching in a background thread."""
+        if self.mode == "inotify":
+            self._libc = _load_libc()
+            self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if self._fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+            # add watches before the initial scan, so that no file can slip through in between
+            for root, _, _ in os.walk(self.path):
+                self._add_watch(root)
+            self._scan()
+            target = self._run_inotify
+        else:
+            self._scan()
+            target = self._run_poll
+        self._thread = threading.Thread(target=target, daemon=True)
+        self._thread.start()
+        self.logger.info(f"Watching {self.path} for new files using {self.mode} mode.")
+
+    def stop(self):
+        """Stop watching and release the inotify file descriptor."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._watches = {}
+
+    def get(self, timeout: Optional[float] = None):
+        """
+        Get the next new file path.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            seconds to wait for a new file, if None, wait until a file arrives
+
+        Returns
+        -------
+        str or None
+            path to a new file, or None if no file arrived within timeout
+
+        """
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _matches(self, fn):
+        return self.suffix is None or fn.endswith(self.suffix)
+
+    def _put(self, fn):
+        if self._matches(fn):
+            self.queue.put(fn)
+
+    def _scan(self, folder=None, clean_empty_dirs=True):
+        """Scan (part of) the tree and push all files not yet reported."""
+        file_paths = disk_mng.scan_folder(
+            folder or self.path,
+            clean_empty_dirs=clean_empty_dirs,
+            suffix=self.suffix
+        )
+        if folder is None:
+            # forget files that disappeared, so that they are reported again if they come back
+            self._seen.intersection_update(file_paths)
+        for fn in file_paths:
+            if fn not in self._seen:
+                self._seen.add(fn)
+                self._put(fn)
+
+    def _run_poll(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._scan()
+            except Exception as e:
+                self.logger.error(f"Error while scanning {self.path}: {e}")
+
+    def _add_watch(self, folder):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            self.logger.warning(f"Could not watch {folder}: {os.strerror(ctypes.get_errno())}")
+            return
+        self._watches[wd] = folder
+
+    def _run_inotify(self):
+        while not self._stop.is_set():
+            ready, _, _ = select.select([self._fd], [], [], 1.)
+            if not ready:
+                continue
+            try:
+                buffer = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            try:
+                self._handle_events(buffer)
+            except Exception as e:
+                self.logger.error(f"Error while handling file events in {self.path}: {e}")
+
+    def _handle_events(self, buffer):
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+            name = buffer[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+            offset += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                # the kernel dropped events, fall back on a full scan of the tree
+                self.logger.warning(f"File event queue overflow on {self.path}, rescanning folder.")
+                self._seen = set()
+                for root, _, _ in os.walk(self.path):
+                    if root not in self._watches.values():
+                        self._add_watch(root)
+                self._scan(clean_empty_dirs=False)
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            folder = self._watches.get(wd)
+            if folder is None or not name:
+                continue
+            fn = os.path.join(folder, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # watch new subfolder and report files that were written before the watch was in place
+                    self._add_watch(fn)
+                    for root, _, _ in os.walk(fn):
+                        if root != fn:
+                            self._add_watch(root)
+                    for f in disk_mng.scan_folder(fn, clean_empty_dirs=False, suffix=self.suffix):
+                        self._put(f)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                if self.tracker is not None and self._matches(fn):
+                    # the file is complete, no need to wait for its size to settle
+                    self.tracker.mark_closed(fn)
+                self._put(fn)
@@ -1,14 +1,27 @@
 """water level read utilities."""
 
+import io
+import json
+import logging
 import pandas as pd
 import numpy as np
 import os
 import re
+import select
 import sys
 import subprocess
+import threading
+import time
 
+from collections import OrderedDict
 from datetime import datetime
-from typing import Literal
+from typing import Literal, Optional
+
+# environment variable through which scripts receive the timestamp after which readings are missing
+SINCE_VARIABLE = "NODEORC_WATER_LEVEL_SINCE"
+# format of timestamps in the output of water level scripts
+SCRIPT_DATETIME_FMT = "%Y-%m-%dT%H:%M:%SZ"
+
 
 def check_script_security(script_content):
     """
@@ -74,12 +87,15 @@ def check_script_security(script_content):
 
 def execute_water_level_script(
         script: str,
-        script_type: Literal["BASH", "PYTHON"] = "PYTHON"
+        script_type: Literal["BASH", "PYTHON"] = "PYTHON",
+        since: Optional[datetime] = None,
+        all_lines: bool = False,
 ):
     """Execute a Python or bash script and retrieve the last line of its output as the result.
 
     The result is expected to be a comma-separated string containing a datetime string
-    in %Y%m%dT%H%M%SZ format and a float value.
+    in %Y%m%dT%H%M%SZ format and a float value. With ``all_lines``, every line of that form is returned, so that
+    a script can deliver many readings at once, e.g. to fill a gap after an outage.
 
     Parameters
     ----------
@@ -88,13 +104,16 @@ def execute_water_level_script(
         %Y-%m-%dT%H:%M:%SZ,<float_value>
     script_type : str, optional {'BASH', 'PYTHON'}
         by default "PYTHON"
-    dt : datetime, optional
-        datetime to be passed to the script as mandatory argument, by default datetime.now(UTC)
+    since : datetime, optional
+        timestamp of the last known reading, passed to the script in environment variable
+        NODEORC_WATER_LEVEL_SINCE in %Y-%m-%dT%H:%M:%SZ format, so that it can fetch only newer readings
+    all_lines : bool, optional
+        if set, return all readings in the output instead of only the last, by default False
 
     Returns
     -------
-    tuple
-        (datetime, float)
+    tuple or list[tuple]
+        (datetime, float), or a list of these with ``all_lines``
 
     Raises
     ------
@@ -105,42 +124,468 @@ def execute_water_level_script(
     """
     if script_type is None:
         script_type = "PYTHON"
+    kwargs = {}
+    if since is not None:
+        kwargs["env"] = {**os.environ, SINCE_VARIABLE: since.strftime(SCRIPT_DATETIME_FMT)}
     try:
         if "PYTHON" in str(script_type).upper():
             output = subprocess.run(
                 [sys.executable, "-c", script],
                 text=True,
                 capture_output=True,
+                **kwargs
             )
         else:
             output = subprocess.run(
                 script,
                 shell=True,
-                capture_output=True
+                capture_output=True,
+                **kwargs
             )
         if output.returncode != 0:
             raise RuntimeError(f"Script execution failed: gives output {output.stderr} with output code {output.returncode}")
         if "PYTHON" in str(script_type).upper():
-            last_line = output.stdout.strip().splitlines()[-1]
+            stdout = output.stdout
         else:
-            last_line = output.stdout.decode(encoding="utf-8").strip().splitlines()[-1]
-        datetime_str, float_str = last_line.split(",")
-        # Validate datetime format
-        datetime_obj = datetime.strptime(datetime_str, "%Y-%m-%dT%H:%M:%SZ")
-        float_value = float(float_str)
-        return datetime_obj, float_value
+            stdout = output.stdout.decode(encoding="utf-8")
+    except (ValueError, IndexError) as e:
+        raise ValueError(f"Invalid result format: {e}, must be of form %Y-%m-%dT%H:%M:%SZ,<value>") from e
+    return parse_water_level_output(stdout, all_lines=all_lines)
+
+
+def _parse_line(line):
+    datetime_str, float_str = line.split(",")
+    # Validate datetime format
+    return datetime.strptime(datetime_str.strip(), SCRIPT_DATETIME_FMT), float(float_str)
+
+
+def parse_water_level_output(stdout, all_lines=False):
+    """Parse the last line of the output of a water level script into a (datetime, float) tuple.
 
+    Parameters
+    ----------
+    stdout : str
+        output of the script
+    all_lines : bool, optional
+        if set, parse all lines in the form %Y-%m-%dT%H:%M:%SZ,<value> and skip any other lines (e.g. log messages)
+
+    Returns
+    -------
+    tuple or list[tuple]
+        (datetime, float), or a list of these in order of time with ``all_lines``
+
+    Raises
+    ------
+    ValueError
+        If the output format is invalid or the result cannot be parsed.
+    """
+    last_line = None
+    try:
+        lines = stdout.strip().splitlines()
+        last_line = lines[-1]
+        if not all_lines:
+            return _parse_line(last_line)
+        readings = []
+        for line in lines:
+            try:
+                readings.append(_parse_line(line))
+            except ValueError:
+                continue
+        if not readings:
+            raise ValueError("no readings found")
+        return sorted(readings)
     except (ValueError, IndexError) as e:
         raise ValueError(f"Invalid result format: {last_line}, must be of form %Y-%m-%dT%H:%M:%SZ,<value>") from e
 
 
+class WaterLevelScriptWorker:
+    """
+    Run a PYTHON water level script in a long-lived worker process.
+
+    Starting a new interpreter and importing the modules of a script for every reading costs seconds of CPU on
+    small devices. The worker process is started once (with ``python -I``, which ignores PYTHON* environment
+    variables and user site-packages), compiles the script once, and runs it in a fresh namespace, with a copy of the
+    environment, on every request sent over a pipe. This is not a sandbox: the script runs with the same rights as
+    NodeORC. Imported modules therefore remain loaded between readings. If the script does
+    not answer within ``timeout`` seconds, the worker is killed. A worker that is killed or crashed is started again
+    at the next reading.
+
+    Parameters
+    ----------
+    script : str
+        content of the PYTHON script, which must print a line of the form %Y-%m-%dT%H:%M:%SZ,<value>
+    timeout : float, optional
+        seconds to wait for a reading, by default 60
+    logger : Logger, optional
+        logging object
+
+    """
+    def __init__(self, script: str, timeout: float = 60., logger=logging):
+        self.script = script
+        self.timeout = timeout
+        self.logger = logger
+        self._process = None
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self):
+        """Check if the worker process is running."""
+        return self._process is not None and self._process.poll() is None
+
+    def start(self):
+        """Start the worker process and hand over the script."""
+        self._process = subprocess.Popen(
+            [sys.executable, "-I", "-u", os.path.join(os.path.dirname(__file__), "water_level_worker.py")],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )
+        self._process.stdin.write(json.dumps({"script": self.script}) + "\n")
+        self._process.stdin.flush()
+
+    def stop(self):
+        """Stop the worker process."""
+        if self._process is None:
+            return
+        try:
+            self._process.stdin.close()
+            self._process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self._process.kill()
+            self._process.wait()
+        self._process.stdout.close()
+        self._process = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def read(self, since: Optional[datetime] = None, all_lines: bool = False):
+        """
+        Run the script once and return its water level.
+
+        Parameters
+        ----------
+        since : datetime, optional
+            timestamp of the last known reading, passed to the script in environment variable
+            NODEORC_WATER_LEVEL_SINCE in %Y-%m-%dT%H:%M:%SZ format
+        all_lines : bool, optional
+            if set, return all readings in the output instead of only the last, by default False
+
+        Returns
+        -------
+        tuple or list[tuple]
+            (datetime, float), or a list of these with ``all_lines``
+
+        Raises
+        ------
+        ValueError
+            If the output format is invalid or the result cannot be parsed.
+        RuntimeError
+            If the script fails, does not answer in time, or the worker process crashed.
+
+        """
+        with self._lock:
+            if not self.alive:
+                if self._process is not None:
+                    self.logger.warning(
+                        f"Water level script worker stopped with code {self._process.returncode}, restarting."
+                    )
+                    self.stop()
+                self.start()
+            try:
+                request = {"since": since.strftime(SCRIPT_DATETIME_FMT)} if since is not None else {}
+                self._process.stdin.write(json.dumps(request) + "\n")
+                self._process.stdin.flush()
+            except OSError as e:
+                self.stop()
+                raise RuntimeError(f"Water level script worker is not available: {e}")
+            ready, _, _ = select.select([self._process.stdout], [], [], self.timeout)
+            if not ready:
+                self._process.kill()
+                self.stop()
+                raise RuntimeError(f"Script execution failed: no output within {self.timeout} seconds")
+            line = self._process.stdout.readline()
+            if not line:
+                self.stop()
+                raise RuntimeError("Script execution failed: water level script worker terminated unexpectedly")
+        output = json.loads(line)
+        if output["returncode"] != 0:
+            raise RuntimeError(
+                f"Script execution failed: gives output {output['stderr']} with output code {output['returncode']}"
+            )
+        return parse_water_level_output(output["stdout"], all_lines=all_lines)
+
+
+def _to_us(timestamps):
+    """Convert (an array of) datetimes to integer microseconds, ignoring time zone info like the database does."""
+    if isinstance(timestamps, datetime):
+        return np.datetime64(timestamps.replace(tzinfo=None), "us").astype(np.int64)
+    timestamps = pd.DatetimeIndex(timestamps)
+    if timestamps.tz is not None:
+        timestamps = timestamps.tz_localize(None)
+    return timestamps.values.astype("datetime64[us]").astype(np.int64)
+
+
+def _nearest(t, value):
+    """Position of the value in sorted array ``t`` closest to ``value``, the earlier one in case of a tie."""
+    n = len(t)
+    i = int(np.searchsorted(t, value, side="right"))
+    if i == n or (i > 0 and value - t[i - 1] <= t[i] - value):
+        i -= 1
+    return i
+
+
+def interpolate_water_levels(t, h, t_new, allowed_dt: Optional[float] = None):
+    """
+    Linearly interpolate water levels between the water levels before and after each of a set of timestamps.
+
+    Parameters
+    ----------
+    t : np.ndarray
+        sorted timestamps of water levels as integer microseconds
+    h : np.ndarray
+        water levels [m]
+    t_new : int or np.ndarray
+        timestamp(s) as integer microseconds, for which water levels are interpolated
+    allowed_dt : float, optional
+        maximum difference [s] between a timestamp and each of the two water levels it is interpolated from
+
+    Returns
+    -------
+    np.ndarray
+        interpolated water levels [m], NaN where a timestamp is not bracketed by water levels (within
+        ``allowed_dt``). Where a water level exists at a timestamp, that water level is returned.
+
+    """
+    t_new = np.atleast_1d(np.asarray(t_new, dtype=np.int64))
+    n = len(t)
+    if n == 0:
+        return np.full(len(t_new), np.nan)
+    i = np.searchsorted(t, t_new, side="right")
+    before, after = np.maximum(i - 1, 0), np.minimum(i, n - 1)
+    exact = (i > 0) & (t[before] == t_new)
+    valid = (i > 0) & (i < n)
+    if allowed_dt is not None:
+        valid &= (t_new - t[before] <= allowed_dt * 1e6) & (t[after] - t_new <= allowed_dt * 1e6)
+    dt = (t[after] - t[before]).astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        w = np.where(dt > 0, (t_new - t[before]) / dt, 0.)
+    h_new = h[before] + w * (h[after] - h[before])
+    return np.where(exact, h[before], np.where(valid, h_new, np.nan))
+
+
+class WaterLevelIndex:
+    """
+    Sorted in-memory index of water levels, for fast lookups of the closest water level to a timestamp.
+
+    Timestamps (as integer microseconds), water levels and record ids are kept in sorted NumPy arrays, so that
+    nearest and bracketing records are found with ``np.searchsorted`` in microseconds, regardless of the length of
+    the time series. New values are usually newer than all known values and are then appended in amortized constant
+    time. The index is thread-safe.
+
+    Parameters
+    ----------
+    capacity : int, optional
+        initial number of values for which memory is reserved, by default 1024
+
+    """
+    def __init__(self, capacity: int = 1024):
+        self._t = np.empty(capacity, dtype=np.int64)
+        self._h = np.empty(capacity, dtype=np.float64)
+        self._id = np.empty(capacity, dtype=np.int64)
+        self._n = 0
+        self.last_id = 0  # highest record id in the index
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._n
+
+    def _reserve(self, n):
+        if n <= len(self._t):
+            return
+        capacity = max(n, 2 * len(self._t))
+        for name in ["_t", "_h", "_id"]:
+            arr = getattr(self, name)
+            new = np.empty(capacity, dtype=arr.dtype)
+            new[:self._n] = arr[:self._n]
+            setattr(self, name, new)
+
+    def add(self, timestamp: datetime, h: float, id: int):
+        """
+        Add a single water level to the index.
+
+        Parameters
+        ----------
+        timestamp : datetime
+            timestamp of water level
+        h : float
+            water level [m]
+        id : int
+            id of the water level record in the database
+
+        """
+        t = _to_us(timestamp)
+        with self._lock:
+            n = self._n
+            self._reserve(n + 1)
+            i = n if n == 0 or t >= self._t[n - 1] else int(np.searchsorted(self._t[:n], t, side="right"))
+            if i < n:
+                # older than the newest value, shift the newer values to make room
+                for arr in [self._t, self._h, self._id]:
+                    arr[i + 1:n + 1] = arr[i:n]
+            self._t[i], self._h[i], self._id[i] = t, h, id
+            self._n = n + 1
+            self.last_id = max(self.last_id, id)
+
+    def extend(self, timestamps, levels, ids):
+        """
+        Add many water levels to the index at once.
+
+        Parameters
+        ----------
+        timestamps : list[datetime]
+            timestamps of water levels
+        levels : list[float]
+            water levels [m]
+        ids : list[int]
+            ids of the water level records in the database
+
+        """
+        if len(timestamps) == 0:
+            return
+        t = _to_us(timestamps)
+        with self._lock:
+            n = self._n
+            self._reserve(n + len(t))
+            self._t[n:n + len(t)] = t
+            self._h[n:n + len(t)] = levels
+            self._id[n:n + len(t)] = ids
+            self._n = n + len(t)
+            if n > 0 and t.min() < self._t[n - 1] or np.any(np.diff(t) < 0):
+                order = np.argsort(self._t[:self._n], kind="stable")
+                for arr in [self._t, self._h, self._id]:
+                    arr[:self._n] = arr[:self._n][order]
+            self.last_id = max(self.last_id, int(np.max(ids)))
+
+    def clear(self):
+        """Remove all water levels from the index."""
+        with self._lock:
+            self._n = 0
+            self.last_id = 0
+
+    def _record(self, i):
+        return (
+            self._t[i].astype("datetime64[us]").item(),
+            float(self._h[i]),
+            int(self._id[i])
+        ) if i is not None else None
+
+    def bracket(self, timestamp: datetime):
+        """
+        Get the last water level at or before, and the first water level after a timestamp.
+
+        Parameters
+        ----------
+        timestamp : datetime
+            timestamp to look up
+
+        Returns
+        -------
+        before, after : tuple or None
+            (timestamp, water level, record id) of the records before and after, None where no record exists
+
+        """
+        t = _to_us(timestamp)
+        with self._lock:
+            i = int(np.searchsorted(self._t[:self._n], t, side="right"))
+            return self._record(i - 1 if i > 0 else None), self._record(i if i < self._n else None)
+
+    def nearest(self, timestamp: datetime, allowed_dt: Optional[float] = None):
+        """
+        Get the water level closest in time to a timestamp.
+
+        If two water levels are equally close, the earlier one is returned.
+
+        Parameters
+        ----------
+        timestamp : datetime
+            timestamp to look up
+        allowed_dt : float, optional
+            maximum difference [s] between timestamp and the closest water level
+
+        Returns
+        -------
+        tuple
+            (timestamp, water level, record id) of the closest record
+
+        Raises
+        ------
+        ValueError
+            If the index is empty, or the closest water level is more than ``allowed_dt`` seconds off
+
+        """
+        t = _to_us(timestamp)
+        with self._lock:
+            n = self._n
+            if n == 0:
+                raise ValueError(f"No water level entries found for timestamp: {timestamp}")
+            i = _nearest(self._t[:n], t)
+            if allowed_dt and abs(int(self._t[i]) - int(t)) > allowed_dt * 1e6:
+                raise ValueError(f"No water level found within {allowed_dt} seconds of timestamp {timestamp}.")
+            return self._record(i)
+
+    def interpolate(self, timestamp: datetime, allowed_dt: Optional[float] = None):
+        """
+        Get the water level at a timestamp, linearly interpolated between the water levels before and after.
+
+        If the timestamp is not bracketed by water levels within ``allowed_dt`` seconds, the closest water level is
+        returned as with ``nearest``.
+
+        Parameters
+        ----------
+        timestamp : datetime
+            timestamp to look up
+        allowed_dt : float, optional
+            maximum difference [s] between timestamp and each of the water levels it is interpolated from
+
+        Returns
+        -------
+        h : float
+            water level [m]
+        id : int or None
+            id of the record at the timestamp, or of the closest record if no interpolation was possible. None if
+            the water level is interpolated.
+
+        Raises
+        ------
+        ValueError
+            If the index is empty, or the closest water level is more than ``allowed_dt`` seconds off
+
+        """
+        t = _to_us(timestamp)
+        with self._lock:
+            n = self._n
+            h = interpolate_water_levels(self._t[:n], self._h[:n], t, allowed_dt=allowed_dt)[0]
+            if not np.isnan(h):
+                i = int(np.searchsorted(self._t[:n], t, side="left"))
+                exact = i < n and self._t[i] == t
+                return float(h), int(self._id[i]) if exact else None
+        _, h, id = self.nearest(timestamp, allowed_dt=allowed_dt)
+        return h, id
+
+
 def read_water_level_file(fn, fmt):
     """
     Parse water level file using supplied datetime format
 
     Parameters
     ----------
-    fn : str
+    fn : str or file-like
         water level file
     fmt : str
         datetime format
@@ -151,30 +596,155 @@ def read_water_level_file(fn, fmt):
         content of water level file
 
     """
-    date_parser = lambda x: datetime.strptime(x, fmt)
     df = pd.read_csv(
         fn,
-        parse_dates=True,
         index_col=[0],
         sep=" ",
-        date_parser=date_parser,
         header=None,
-        names=["water_level"]
+        names=["water_level"],
+        dtype={0: str},
     )
+    # parse all datetimes at once, instead of one by one
+    df.index = pd.to_datetime(df.index, format=fmt)
     return df
 
 
 
+class WaterLevelFileCache:
+    """
+    Cache of parsed water level files, so that a file is not parsed again for every video.
+
+    Parsed files are kept as sorted NumPy arrays of timestamps and water levels and are identified by their path,
+    modification time and size. When a file has only been appended to since it was parsed (e.g. the water level file
+    of the current day), only the new lines are parsed. Any other change leads to parsing the whole file again.
+    A trailing line without line ending may still be in the process of being written. It is held back until it is
+    completed, or until the file has not been modified for ``settle_time`` seconds (e.g. the last line of a file
+    without line ending at the end). The cache is thread-safe.
+
+    Parameters
+    ----------
+    max_files : int, optional
+        maximum number of files kept in the cache, the least recently used file is removed first, by default 8
+    settle_time : float, optional
+        seconds after the last modification of a file after which a trailing line without line ending is parsed,
+        by default 5
+
+    """
+    def __init__(self, max_files: int = 8, settle_time: float = 5.):
+        self.max_files = max_files
+        self.settle_time = settle_time
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._files)
+
+    def clear(self):
+        """Remove all files from the cache."""
+        with self._lock:
+            self._files.clear()
+
+    @staticmethod
+    def _parse(data: bytes, fmt: str):
+        if not data.strip():
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        df = read_water_level_file(io.BytesIO(data), fmt=fmt)
+        return _to_us(df.index), df["water_level"].values.astype(np.float64)
+
+    def _update(self, fn, fmt, stat, entry):
+        with open(fn, "rb") as f:
+            if (
+                entry is not None and entry["fmt"] == fmt and stat.st_size >= entry["size"]
+                and entry["offset"] >= len(entry["last_line"])
+            ):
+                # check that the file has only been appended to, by comparing the last complete line
+                f.seek(entry["offset"] - len(entry["last_line"]))
+                if f.read(len(entry["last_line"])) != entry["last_line"]:
+                    entry = None
+            else:
+                entry = None
+            if entry is None:
+                entry = {
+                    "fmt": fmt, "offset": 0, "last_line": b"", "n_complete": 0,
+                    "t_file": np.empty(0, dtype=np.int64), "h_file": np.empty(0, dtype=np.float64),
+                }
+            f.seek(entry["offset"])
+            data = f.read()
+        # only complete lines are parsed for good. A trailing partial line may be cut off halfway a value, and is only
+        # parsed once the file has settled, and again after any change
+        end = data.rfind(b"\n") + 1
+        t_new, h_new = self._parse(data[:end], fmt)
+        entry["settled"] = end == len(data) or time.time() - stat.st_mtime >= self.settle_time
+        if entry["settled"]:
+            t_tail, h_tail = self._parse(data[end:], fmt)
+        else:
+            t_tail, h_tail = self._parse(b"", fmt)
+        n = entry["n_complete"]
+        entry["t_file"] = np.concatenate([entry["t_file"][:n], t_new, t_tail])
+        entry["h_file"] = np.concatenate([entry["h_file"][:n], h_new, h_tail])
+        entry["n_complete"] = n + len(t_new)
+        if end > 0:
+            entry["last_line"] = data[data.rfind(b"\n", 0, end - 1) + 1:end]
+            entry["offset"] += end
+        entry["mtime"], entry["size"] = stat.st_mtime_ns, stat.st_size
+        # water level files are normally in chronological order, only sort otherwise
+        if np.any(np.diff(entry["t_file"]) < 0):
+            order = np.argsort(entry["t_file"], kind="stable")
+            entry["t"], entry["h"] = entry["t_file"][order], entry["h_file"][order]
+        else:
+            entry["t"], entry["h"] = entry["t_file"], entry["h_file"]
+        return entry
+
+    def read(self, fn: str, fmt: str):
+        """
+        Get the water levels of a file, parsing (the new part of) the file only if it has changed.
+
+        Parameters
+        ----------
+        fn : str
+            water level file
+        fmt : str
+            datetime format used inside water level file
+
+        Returns
+        -------
+        t : np.ndarray
+            sorted timestamps as integer microseconds
+        h : np.ndarray
+            water levels [m]
+
+        """
+        fn = os.path.abspath(fn)
+        stat = os.stat(fn)
+        with self._lock:
+            entry = self._files.get(fn)
+            if entry is None or entry["fmt"] != fmt or (entry["mtime"], entry["size"]) != (
+                stat.st_mtime_ns, stat.st_size
+            ) or (not entry["settled"] and time.time() - stat.st_mtime >= self.settle_time):
+                entry = self._update(fn, fmt, stat, entry)
+                self._files[fn] = entry
+            self._files.move_to_end(fn)
+            while len(self._files) > self.max_files:
+                self._files.popitem(last=False)
+            return entry["t"], entry["h"]
+
+
+# parsed water level files shared by all lookups
+water_level_file_cache = WaterLevelFileCache()
+
 
 def get_water_level_file(
         timestamp,
         file_fmt,
         datetime_fmt,
         allowed_dt=None,
+        interpolate=False,
 ):
     """
     Get water level from file(s)
 
+    Parsed files are cached in ``water_level_file_cache``.
+
     Parameters
     ----------
     timestamp : datetime
@@ -185,6 +755,9 @@ def get_water_level_file(
         datetime format used inside water level files
     allowed_dt : float
         maximum difference between closest water level and video timestamp
+    interpolate : bool, optional
+        if True, interpolate linearly between the water levels before and after the timestamp, if both are within
+        ``allowed_dt``. Otherwise (default), or if this is not possible, the closest water level is returned.
 
     Returns
     -------
@@ -200,18 +773,23 @@ def get_water_level_file(
         water_level_fn = file_fmt
     if not (os.path.isfile(water_level_fn)):
         raise IOError(f"water level file {os.path.abspath(water_level_fn)} does not exist.")
-    df = read_water_level_file(water_level_fn, fmt=datetime_fmt)
-    t = timestamp.strftime("%Y%m%d %H:%M:%S")
+    t, h = water_level_file_cache.read(water_level_fn, fmt=datetime_fmt)
+    if len(t) == 0:
+        raise ValueError(f"water level file {os.path.abspath(water_level_fn)} does not contain water levels.")
+    t_video = _to_us(timestamp)
+    if interpolate:
+        h_a = interpolate_water_levels(t, h, t_video, allowed_dt=allowed_dt)[0]
+        if not np.isnan(h_a):
+            return float(h_a)
     # find the closest match
-    i = np.minimum(np.maximum(df.index.searchsorted(t), 0), len(df) - 1)
+    i = _nearest(t, t_video)
     # check if value is within limits of time allowed
     if allowed_dt is not None:
-        dt_seconds = abs(df.index[i] - timestamp).total_seconds()
+        dt_seconds = abs(int(t[i]) - int(t_video)) / 1e6
         if dt_seconds > allowed_dt:
             raise ValueError(
                 f"Timestamp of video {timestamp} is more than {allowed_dt} seconds off from closest "
-                f"water level timestamp {df.index[i]}"
+                f"water level timestamp {t[i].astype('datetime64[us]').item()}"
             )
-    h_a = df.iloc[i].values[0]
+    h_a = float(h[i])
     return h_a
-
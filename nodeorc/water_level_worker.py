@@ -0,0 +1,69 @@
+"""Long-lived worker process that runs a PYTHON water level script on request.
+
+This module is executed as a script in a separate interpreter (``python -I``) by
+``nodeorc.water_level.WaterLevelScriptWorker`` and must therefore not import nodeorc. The script is not sandboxed: it
+runs with all builtins and the rights of the NodeORC user, as a BASH script would. The protocol consists of
+JSON lines: the first line read from stdin holds the script, every following line is a request to run the script
+once, optionally with the timestamp to pass to the script. For each request, one line with the return code and
+captured output of the script is written back.
+"""
+import contextlib
+import io
+import json
+import os
+import sys
+import traceback
+
+
+# environment variable through which scripts receive the timestamp after which readings are missing
+SINCE_VARIABLE = "NODEORC_WATER_LEVEL_SINCE"
+# environment of the worker at start up, every run of the script gets a copy of it
+ENVIRON = dict(os.environ)
+
+
+def run(code, error, since=None):
+    """Run compiled script once in a fresh namespace and return its return code, stdout and stderr.
+
+    The script reads its environment (``os.environ`` or ``os.getenv``) from a copy of the environment of the worker
+    at start up, with the since timestamp added, so that changes made by one run do not leak into the next.
+    """
+    stdout, stderr = io.StringIO(), io.StringIO()
+    returncode = 0
+    if code is None:
+        return {"returncode": 1, "stdout": "", "stderr": error}
+    environ = dict(ENVIRON)
+    if since is not None:
+        environ[SINCE_VARIABLE] = since
+    process_environ, os.environ = os.environ, environ
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            exec(code, {"__name__": "__main__", "__builtins__": __builtins__})
+        except SystemExit as e:
+            returncode = e.code if isinstance(e.code, int) else int(e.code is not None)
+        except Exception:
+            traceback.print_exc()
+            returncode = 1
+        finally:
+            os.environ = process_environ
+    return {"returncode": returncode, "stdout": stdout.getvalue(), "stderr": stderr.getvalue()}
+
+
+def main():
+    # keep the real stdout for the protocol, anything written to file descriptor 1 by the script is discarded
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), "w", buffering=1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+    requests = sys.stdin
+    # scripts must not read from the protocol
+    sys.stdin = io.StringIO()
+    script = json.loads(requests.readline())["script"]
+    try:
+        code, error = compile(script, "<water level script>", "exec"), None
+    except SyntaxError:
+        code, error = None, traceback.format_exc()
+    for request in requests:
+        protocol.write(json.dumps(run(code, error, since=json.loads(request).get("since"))) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -81,6 +81,11 @@ def logger():
     return log.start_logger(True, False)
 
 
+@pytest.fixture
+def output_nc():
+    return os.path.join(os.path.dirname(__file__), "examples", "ngwerere_transect.nc")
+
+
 @pytest.fixture
 def callback(output_nc):
     obj = models.Callback(
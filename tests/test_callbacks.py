@@ -0,0 +1,127 @@
+import numpy as np
+import os
+
+import pytest
+
+from nodeorc import callbacks, db, models
+from nodeorc.tasks.local_task import get_result_summary
+
+
+def test_read_summary(output_nc):
+    summary = callbacks.read_summary(output_nc)
+    assert list(summary) == callbacks.SUMMARY_FIELDS
+    assert summary["h"] == 0.
+    assert summary["q_05"] < summary["q_50"] < summary["q_95"]
+    assert 0 < summary["fraction_velocimetry"] < 100
+    assert summary["wetted_surface"] == pytest.approx(0.567, abs=1e-3)
+
+
+def test_discharge_from_file(callback):
+    msg, files = callback.get_body()
+    assert files is None
+    assert msg["q_50"] == pytest.approx(0.164, abs=1e-3)
+
+
+def test_discharge_from_summary(callback, output_nc):
+    summary = callbacks.read_summary(output_nc)
+    # the file is not needed anymore, e.g. after it was purged
+    callback.file.remote_name = "missing.nc"
+    callback.summary = summary
+    msg, _ = callback.get_body()
+    assert msg["q_50"] == summary["q_50"]
+    assert "wetted_surface" not in msg
+    # stored callbacks keep the summary
+    rec = db.Callback(body=callback.model_dump_json())
+    assert rec.callback.get_body()[0] == msg
+
+
+def test_get_result_summary(callback):
+    other = models.Callback(func_name="video_no_file", kwargs={})
+    summary = get_result_summary([other, callback])
+    assert callback.summary == summary
+    assert other.summary is None
+    assert get_result_summary([other]) is None
+
+
+@pytest.fixture
+def video_callback(tmpdir):
+    bucket = tmpdir.mkdir("bucket")
+    bucket.join("video.mp4").write_binary(b"video" * 1000)
+    bucket.join("image.jpg").write_binary(b"image")
+    return models.Callback(
+        func_name="video",
+        kwargs={"camera_config": 1},
+        storage=models.Storage(url=str(tmpdir), bucket_name="bucket"),
+        files_to_send={
+            "videofile": models.File(remote_name="video.mp4", tmp_name="video.mp4"),
+            "jpg": models.File(remote_name="image.jpg", tmp_name="image.jpg"),
+        },
+        endpoint="/api/video/",
+    )
+
+
+@pytest.fixture
+def outbox(tmpdir, monkeypatch, session_empty):
+    monkeypatch.setattr("nodeorc.db.session", session_empty)
+    monkeypatch.setattr("nodeorc.db.callback.OUTBOX_DIRECTORY", str(tmpdir / "outbox"))
+    return session_empty
+
+
+def test_to_db_stores_rendered_callback(video_callback, outbox, tmpdir):
+    rec = video_callback.to_db()
+    assert rec.rendered
+    assert (rec.func_name, rec.endpoint, rec.request_type) == ("video", "/api/video/", "POST")
+    assert rec.data["camera_config"] == 1
+    assert {ref["field"]: ref["size"] for ref in rec.files} == {"file": 5000, "image": 5}
+    # results are reorganised, the callback can still be sent as stored
+    tmpdir.join("bucket").remove()
+    data, files = rec.get_body()
+    assert data == rec.data
+    assert files["file"][0] == "video.mp4"
+    assert files["file"][1].read() == b"video" * 1000
+    [f.close() for _, f in files.values()]
+    # files are removed with the record
+    outbox.delete(rec)
+    outbox.commit()
+    assert not os.path.exists(str(tmpdir / "outbox" / str(rec.id)))
+
+
+def test_stored_callback_changed_file(video_callback, outbox):
+    rec = video_callback.to_db()
+    with open(rec.files[0]["path"], "ab") as f:
+        f.write(b"more")
+    with pytest.raises(ValueError, match="is missing or has changed"):
+        rec.get_body()
+
+
+def test_stored_callback_checksum(video_callback, outbox):
+    rec = video_callback.to_db()
+    # same size, other content
+    with open(rec.files[0]["path"], "r+b") as f:
+        f.write(b"oidev")
+    with pytest.raises(db.OutboxError, match=rec.files[0]["path"]):
+        rec.get_body()
+
+
+def test_stored_callback_without_rendered_body(callback):
+    # records of older versions only hold the callback model
+    rec = db.Callback(body=callback.model_dump_json())
+    assert not rec.rendered
+    assert rec.get_body()[0]["q_50"] == pytest.approx(0.164, abs=1e-3)
+
+
+def test_downscale_video(tmp_path):
+    cv2 = pytest.importorskip("cv2")
+    fn = str(tmp_path / "video.mp4")
+    writer = cv2.VideoWriter(fn, cv2.VideoWriter_fourcc(*"mp4v"), 10, (128, 96))
+    for i in range(10):
+        writer.write(np.full((96, 128, 3), i * 20, dtype=np.uint8))
+    writer.release()
+    dst = callbacks.downscale_video(fn, 48)
+    assert dst == str(tmp_path / "video_48p.mp4")
+    cap = cv2.VideoCapture(dst)
+    assert (cap.get(cv2.CAP_PROP_FRAME_WIDTH), cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) == (64, 48)
+    assert cap.get(cv2.CAP_PROP_FRAME_COUNT) == 10
+    cap.release()
+    # videos that are small enough are sent as they are
+    assert callbacks.downscale_video(fn, 96) == fn
@@ -0,0 +1,57 @@
+import threading
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from nodeorc import db, db_ops
+from nodeorc.db.engine import create_sqlite_engine
+
+
+def test_create_sqlite_engine(tmpdir):
+    engine = create_sqlite_engine(str(tmpdir / "test.db"), busy_timeout=5)
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+
+
+def test_session_per_thread():
+    sessions = []
+
+    def get_session():
+        sessions.append(db_ops.get_session()())
+
+    threads = [threading.Thread(target=get_session) for _ in range(2)]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    assert sessions[0] is not sessions[1]
+
+
+def test_concurrent_writes(tmpdir):
+    # water levels and videos written from separate threads with their own sessions
+    engine = create_sqlite_engine(str(tmpdir / "test.db"))
+    db.Base.metadata.create_all(engine)
+    Session = scoped_session(sessionmaker(bind=engine, expire_on_commit=False))
+    t0 = datetime(2000, 1, 1)
+    errors = []
+
+    def write(model, **kwargs):
+        try:
+            for i in range(50):
+                Session.add(model(timestamp=t0 + timedelta(minutes=i), **kwargs))
+                Session.commit()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            Session.remove()
+
+    threads = [
+        threading.Thread(target=write, args=(db.TimeSeries,), kwargs={"h": 1.}),
+        threading.Thread(target=write, args=(db.Video,), kwargs={"status": db.VideoStatus.QUEUE}),
+    ]
+    [t.start() for t in threads]
+    [t.join() for t in threads]
+    assert errors == []
+    assert Session.query(db.TimeSeries).count() == 50
+    assert Session.query(db.Video).count() == 50
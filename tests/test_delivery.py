@@ -0,0 +1,320 @@
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from datetime import datetime, timedelta
+
+from nodeorc import db, models
+from nodeorc.delivery import CallbackDelivery, CircuitBreaker, OutboxDrainer, upload_chunked
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections alive
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.ports.add(self.client_address[1])
+        if self.path.endswith("/slow/"):
+            time.sleep(0.5)
+        self.send_response({"/api/error/": 500, "/api/refused/": 400}.get(self.path, 201))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.ports = set()  # client ports, one per connection
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def callback_url(server):
+    return models.CallbackUrl(url=f"http://127.0.0.1:{server.server_address[1]}")
+
+
+def video_callback(endpoint="/api/video/"):
+    return models.Callback(func_name="video_no_file", kwargs={}, endpoint=endpoint, files_to_send=None)
+
+
+@pytest.fixture
+def make_callback(monkeypatch):
+    # callback without files, so that no results are needed
+    monkeypatch.setattr(models.Callback, "get_body", lambda self: ({"timestamp": "2000-01-01T00:00:00Z"}, None))
+    return video_callback
+
+
+def test_send_reuses_connection(server, callback_url, make_callback):
+    with CallbackDelivery(callback_url) as delivery:
+        responses = [delivery.send(make_callback()) for _ in range(5)]
+    assert [r.status_code for r in responses] == [201] * 5
+    assert len(server.ports) == 1
+
+
+def test_send_many(server, callback_url, make_callback):
+    with CallbackDelivery(callback_url, max_workers=3) as delivery:
+        responses = delivery.send_many([make_callback() for _ in range(9)])
+    assert [r.status_code for r in responses] == [201] * 9
+    assert len(server.ports) <= 3
+
+
+def test_send_timeout(server, callback_url, make_callback):
+    with CallbackDelivery(callback_url, timeout=0.1) as delivery:
+        assert delivery.send(make_callback("/api/slow/")) is None
+        assert delivery.send(make_callback()).status_code == 201
+
+
+def test_send_connection_error(make_callback):
+    callback_url = models.CallbackUrl(url="http://127.0.0.1:9")
+    with CallbackDelivery(callback_url, timeout=1) as delivery:
+        assert delivery.send_many([make_callback(), make_callback()]) == [None, None]
+
+
+def test_circuit_breaker():
+    now = [0.]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, max_reset_timeout=15, clock=lambda: now[0])
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    now[0] = 10.
+    # one probe is allowed
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    # open for twice as long, but not longer than max_reset_timeout
+    assert breaker.timeout == 15
+    now[0] = 24.
+    assert not breaker.allow()
+    now[0] = 25.
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.timeout == 10
+    breaker.record_failure()
+    breaker.record_failure()
+    now[0] = 35.
+    # a probe that is not used is given back
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == "half-open" and breaker.allow()
+
+
+def add_stored_callbacks(session, endpoints):
+    for endpoint in endpoints:
+        session.add(db.Callback(
+            body="{}", func_name="discharge", endpoint=endpoint, request_type="POST", data={"h": 1.}
+        ))
+    session.commit()
+
+
+def test_drain(server, callback_url, session_empty):
+    add_stored_callbacks(session_empty, ["/api/timeseries/"] * 5 + ["/api/error/", "/api/refused/"])
+    now = datetime(2000, 1, 1)
+    with CallbackDelivery(callback_url, max_workers=2) as delivery:
+        drainer = OutboxDrainer(delivery, batch_size=3)
+        assert drainer.drain(session_empty, now=now) == 5
+    # the server error is tried again later, the refused callback is removed
+    rec = session_empty.query(db.Callback).one()
+    assert rec.endpoint == "/api/error/"
+    assert (rec.attempts, rec.next_attempt, rec.last_error) == (1, now + timedelta(seconds=60), "server error 500")
+    assert drainer.breaker.state == "closed"
+
+
+def test_drain_half_open_empty_outbox(session_empty):
+    now = [0.]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    now[0] = 10.
+    drainer = OutboxDrainer(CallbackDelivery(models.CallbackUrl(url="http://127.0.0.1:9")), breaker=breaker)
+    # the outbox is empty, so the probe is not used and stays available
+    assert drainer.drain(session_empty) == 0
+    assert breaker.state == "half-open"
+    now[0] = 100.
+    assert breaker.allow()
+    drainer.delivery.close()
+
+
+def test_drain_half_open_single_probe(server, callback_url, session_empty, mocker):
+    add_stored_callbacks(session_empty, ["/api/timeseries/"] * 5)
+    now = [0.]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    now[0] = 10.
+    with CallbackDelivery(callback_url, max_workers=3) as delivery:
+        send_many = mocker.spy(delivery, "send_many")
+        drainer = OutboxDrainer(delivery, breaker=breaker)
+        assert drainer.drain(session_empty) == 5
+    # the probe is sent alone, the others once the server was reached
+    assert [len(call.args[0]) for call in send_many.call_args_list] == [1, 3, 1]
+    assert breaker.state == "closed"
+
+
+def test_drain_broken_outbox(server, callback_url, session_empty, tmp_path):
+    add_stored_callbacks(session_empty, ["/api/timeseries/"] * 2)
+    # the file of the first callback was removed from the outbox
+    rec = session_empty.query(db.Callback).first()
+    rec.files = [{"field": "file", "name": "video.mp4", "path": str(tmp_path / "video.mp4"), "size": 5}]
+    session_empty.commit()
+    with CallbackDelivery(callback_url) as delivery:
+        drainer = OutboxDrainer(delivery, breaker=CircuitBreaker(failure_threshold=1))
+        assert drainer.drain(session_empty) == 1
+    # the broken callback is removed instead of being counted as a connection failure
+    assert session_empty.query(db.Callback).count() == 0
+    assert drainer.breaker.state == "closed"
+
+
+def test_drain_backoff(session_empty):
+    add_stored_callbacks(session_empty, ["/api/timeseries/"] * 3)
+    now = datetime(2000, 1, 1)
+    # nothing listens on this port
+    delivery = CallbackDelivery(models.CallbackUrl(url="http://127.0.0.1:9"), timeout=1)
+    drainer = OutboxDrainer(delivery, breaker=CircuitBreaker(failure_threshold=2), base_delay=60, max_delay=100)
+    assert drainer.drain(session_empty, now=now) == 0
+    records = session_empty.query(db.Callback).all()
+    # draining stops at the first connection failure
+    assert [rec.attempts for rec in records] == [1, 0, 0]
+    assert drainer.drain(session_empty, now=now) == 0
+    assert [rec.attempts for rec in records] == [1, 1, 0]
+    # the breaker is open now, nothing is sent
+    assert drainer.breaker.state == "open"
+    assert drainer.drain(session_empty, now=now) == 0
+    assert [rec.attempts for rec in records] == [1, 1, 0]
+    drainer.breaker.record_success()
+    assert drainer.drain(session_empty, now=now + timedelta(seconds=60)) == 0
+    # exponential backoff, up to max_delay
+    assert records[0].attempts == 2
+    assert records[0].next_attempt == now + timedelta(seconds=160)
+    delivery.close()
+
+
+class UploadHandler(BaseHTTPRequestHandler):
+    """Stub of a server that accepts chunked uploads, and fails once at a given chunk."""
+    protocol_version = "HTTP/1.1"
+
+    def reply(self, status, offset=None):
+        self.send_response(status)
+        if offset is not None:
+            self.send_header("Upload-Offset", str(offset))
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_HEAD(self):
+        if self.path not in self.server.uploads:
+            return self.reply(404)
+        self.reply(200, len(self.server.uploads[self.path]))
+
+    def do_PUT(self):
+        chunk = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.puts += 1
+        if self.server.puts == self.server.fail_at:
+            return self.reply(500)
+        if self.server.stall:
+            # the chunk is not taken, the offset stays where it was
+            return self.reply(200, len(self.server.uploads.get(self.path, b"")))
+        start = int(self.headers["Content-Range"].split(" ")[1].split("-")[0])
+        data = self.server.uploads.setdefault(self.path, bytearray())
+        assert start == len(data)
+        data.extend(chunk)
+        self.reply(200, len(data))
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.posts.append(body)
+        self.reply(201)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def upload_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), UploadHandler)
+    server.uploads, server.posts, server.puts, server.fail_at, server.stall = {}, [], 0, None, False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_upload_chunked_resumes(upload_server, tmp_path):
+    fn = tmp_path / "video.mp4"
+    fn.write_bytes(bytes(range(256)) * 40)
+    url = f"http://127.0.0.1:{upload_server.server_address[1]}/api/upload/1/"
+    upload_server.fail_at = 3
+    progress = []
+    with requests.Session() as session, open(fn, "rb") as f:
+        with pytest.raises(requests.HTTPError):
+            upload_chunked(session, url, f, 3000, on_progress=progress.append)
+        assert progress == [3000, 6000]
+        # the upload continues where it stopped
+        assert upload_chunked(session, url, f, 3000, on_progress=progress.append) == 10240
+    assert progress[2:] == [9000, 10240]
+    assert upload_server.puts == 5
+    assert upload_server.uploads["/api/upload/1/"] == fn.read_bytes()
+
+
+def test_upload_chunked_stalled(upload_server, tmp_path):
+    fn = tmp_path / "video.mp4"
+    fn.write_bytes(b"video" * 2000)
+    url = f"http://127.0.0.1:{upload_server.server_address[1]}/api/upload/1/"
+    upload_server.stall = True
+    with requests.Session() as session, open(fn, "rb") as f:
+        with pytest.raises(requests.HTTPError, match="did not advance"):
+            upload_chunked(session, url, f, 3000)
+    assert upload_server.puts == 1
+
+
+def test_drain_upload_error(upload_server, tmp_path, session_empty, monkeypatch):
+    monkeypatch.setattr("nodeorc.db.callback.OUTBOX_DIRECTORY", str(tmp_path / "outbox"))
+    fn = tmp_path / "video.mp4"
+    fn.write_bytes(b"video" * 2000)
+    callback = models.Callback(func_name="video", kwargs={}, endpoint="/api/video/", chunk_size=4000)
+    rec = db.Callback(body=callback.model_dump_json(), endpoint="/api/video/", request_type="POST", data={"status": 4})
+    session_empty.add(rec)
+    session_empty.flush()
+    with open(fn, "rb") as f:
+        rec.store_files({"file": ("video.mp4", f)})
+    session_empty.commit()
+    upload_server.stall = True
+    callback_url = models.CallbackUrl(url=f"http://127.0.0.1:{upload_server.server_address[1]}")
+    now = datetime(2000, 1, 1)
+    with CallbackDelivery(callback_url) as delivery:
+        drainer = OutboxDrainer(delivery, breaker=CircuitBreaker(failure_threshold=1))
+        assert drainer.drain(session_empty, now=now) == 0
+    # the failed upload is retried later as a server error, the server is reachable
+    assert (rec.attempts, rec.last_error) == (1, "server error 502")
+    assert drainer.breaker.state == "closed"
+    assert upload_server.posts == []
+
+
+def test_send_stored_callback_chunked(upload_server, tmp_path, session_empty, monkeypatch):
+    monkeypatch.setattr("nodeorc.db.callback.OUTBOX_DIRECTORY", str(tmp_path / "outbox"))
+    fn = tmp_path / "video.mp4"
+    fn.write_bytes(b"video" * 2000)
+    callback = models.Callback(func_name="video", kwargs={}, endpoint="/api/video/", chunk_size=4000)
+    rec = db.Callback(body=callback.model_dump_json(), endpoint="/api/video/", request_type="POST", data={"status": 4})
+    session_empty.add(rec)
+    session_empty.flush()
+    with open(fn, "rb") as f:
+        rec.store_files({"file": ("video.mp4", f)})
+    session_empty.commit()
+    callback_url = models.CallbackUrl(url=f"http://127.0.0.1:{upload_server.server_address[1]}")
+    with CallbackDelivery(callback_url) as delivery:
+        assert delivery.send(rec).status_code == 201
+    upload_id = f"{callback.upload_id}-file"
+    assert upload_server.uploads[f"/api/upload/{upload_id}/"] == fn.read_bytes()
+    # the message refers to the upload instead of holding the file
+    assert upload_server.posts == [f"status=4&file_upload_id={upload_id}".encode()]
+    assert rec.files[0]["offset"] == 10000
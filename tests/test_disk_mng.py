@@ -1,6 +1,7 @@
 import os
-from nodeorc import disk_mng
+from nodeorc import db, db_ops, disk_mng, __home__
 import logging
+from datetime import datetime, timedelta
 
 import os
 import shutil
@@ -112,3 +113,176 @@ def test_scan_folder_with_non_existent_directory():
     result = scan_folder(non_existent_dir, clean_empty_dirs=True)
     assert result == []
 
+
+
+@pytest.fixture
+def catalogued_files(tmpdir, session_empty):
+    # ten files of 1000 bytes, the first one is the oldest
+    fns = []
+    for i in range(10):
+        fn = os.path.join(str(tmpdir), f"day{i // 5}", f"file{i}.mp4")
+        os.makedirs(os.path.dirname(fn), exist_ok=True)
+        with open(fn, "wb") as f:
+            f.write(b"0" * 1000)
+        os.utime(fn, (1e9 + i, 1e9 + i))
+        fns.append(fn)
+    disk_mng.catalogue_folder(session_empty, str(tmpdir), "failed")
+    return fns
+
+
+def test_get_oldest_files(session_empty, catalogued_files):
+    files = db_ops.get_oldest_files(session_empty, "failed", 2500)
+    assert [fn for fn, size in files] == catalogued_files[:3]
+    assert db_ops.get_oldest_files(session_empty, "results", 2500) == []
+    # more bytes than available
+    assert len(db_ops.get_oldest_files(session_empty, "failed", 10 ** 6)) == 10
+
+
+def test_purge_catalogue(tmpdir, session_empty, catalogued_files, mocker):
+    # free space grows with every removed file
+    free_space = mocker.patch(
+        "nodeorc.disk_mng.get_free_space",
+        side_effect=lambda home: sum(not os.path.exists(fn) for fn in catalogued_files) * 1000 / 10e8
+    )
+    mocker.patch("nodeorc.disk_mng.scan_folder", side_effect=AssertionError("folders must not be scanned"))
+    ret = disk_mng.purge(
+        [str(tmpdir)], free_space=0., min_free_space=6000 / 10e8, logger=logging, session=session_empty,
+        category="failed"
+    )
+    assert ret
+    # the oldest files are removed, with their (empty) folder, and free space is checked once
+    assert [os.path.exists(fn) for fn in catalogued_files] == [False] * 6 + [True] * 4
+    assert not os.path.isdir(os.path.dirname(catalogued_files[0]))
+    assert free_space.call_count == 1
+    assert session_empty.query(db.CataloguedFile).count() == 4
+    # not enough files left
+    ret = disk_mng.purge(
+        [str(tmpdir)], free_space=6000 / 10e8, min_free_space=1., logger=logging, session=session_empty,
+        category="failed"
+    )
+    assert not ret
+    assert session_empty.query(db.CataloguedFile).count() == 0
+
+
+def test_file_category():
+    assert disk_mng.file_category("/a/video_20000101T000000_thumb.jpg") == "thumbnails"
+    assert disk_mng.file_category("/a/video_20000101T000000.jpg") == "images"
+    assert disk_mng.file_category("/a/transect_1.nc") == "results"
+    assert disk_mng.file_category("/a/nodeorc.log.2") == "logs"
+
+
+@pytest.fixture
+def disk_budget(tmpdir):
+    disk_management = db.DiskManagement(home_folder=str(tmpdir), min_free_space=1., lead_time=86400.)
+    return disk_mng.DiskBudget(disk_management, roots=[str(tmpdir)])
+
+
+def test_disk_budget_retention_and_quota(tmpdir, session_empty, catalogued_files, disk_budget, mocker):
+    mocker.patch("nodeorc.disk_mng.get_free_space", return_value=100.)
+    disk_budget.disk_management.retention = {"failed": 1}
+    disk_budget.disk_management.quotas = {"failed": 3000 / 10e8}
+    # files 0-1 are older than a day, files 2-6 are removed to stay within quota
+    now = datetime.fromtimestamp(1e9 + 1) + timedelta(days=1)
+    free_space = disk_budget.check(session_empty, now=now)
+    assert free_space == 100.
+    assert [os.path.exists(fn) for fn in catalogued_files] == [False] * 7 + [True] * 3
+    assert db_ops.get_file_usage(session_empty)["failed"] == 3000
+
+
+def test_disk_budget_projection(tmpdir, session_empty, catalogued_files, disk_budget, mocker):
+    now = datetime.fromtimestamp(1e9 + 10)
+    # 10 kB written within the last hour
+    rate = disk_budget.rate(session_empty, now=now)
+    assert rate == pytest.approx(10000 / 3600)
+    assert disk_budget.time_to_full(1. + 10000 / 10e8, rate) == pytest.approx(3600)
+    # free space is 6 kB more than the minimum, one day of writing needs 240 kB, so everything is removed
+    mocker.patch(
+        "nodeorc.disk_mng.get_free_space",
+        side_effect=lambda home: 1. + sum(not os.path.exists(fn) for fn in catalogued_files) * 1000 / 10e8
+    )
+    disk_budget.check(session_empty, free_space=1. + 6000 / 10e8, now=now)
+    assert not any(os.path.exists(fn) for fn in catalogued_files)
+
+
+def test_disk_budget_no_lead_time(tmpdir, session_empty, catalogued_files, disk_budget):
+    # only the current free space counts, which is enough
+    disk_budget.disk_management.lead_time = 0.
+    now = datetime.fromtimestamp(1e9 + 10)
+    assert disk_budget.check(session_empty, free_space=1. + 6000 / 10e8, now=now) == 1. + 6000 / 10e8
+    assert all(os.path.exists(fn) for fn in catalogued_files)
+
+
+def test_disk_management_quotas_invalid(tmpdir):
+    with pytest.raises(ValueError, match="must be one of"):
+        db.DiskManagement(home_folder=str(tmpdir), quotas={"movies": 10})
+    with pytest.raises(ValueError, match="0 or larger"):
+        db.DiskManagement(home_folder=str(tmpdir), retention={"failed": -1})
+
+
+@pytest.fixture
+def processed_videos(tmpdir, session_empty):
+    # four processed videos with a raw video, an image and a water level, and one video in the queue
+    uploads = os.path.join(__home__, "uploads")
+    videos = []
+    for i in range(5):
+        fn = f"videos/test_purge/{i}/video.mp4"
+        video = db.Video(
+            timestamp=datetime(2000, 1, 1 + i),
+            status=db.VideoStatus.DONE if i < 4 else db.VideoStatus.QUEUE,
+            file=fn
+        )
+        session_empty.add(video)
+        session_empty.commit()
+        session_empty.add(db.TimeSeries(timestamp=video.timestamp, h=float(i), video_id=video.id))
+        session_empty.commit()
+        bucket = os.path.dirname(os.path.join(uploads, fn))
+        os.makedirs(bucket, exist_ok=True)
+        with open(os.path.join(bucket, "video.mp4"), "wb") as f:
+            f.write(b"0" * 1000)
+        with open(os.path.join(bucket, "video.jpg"), "wb") as f:
+            f.write(b"0" * 100)
+        disk_mng.catalogue_video(session_empty, video.id, bucket, "video.mp4")
+        videos.append((video.id, bucket))
+    yield videos
+    shutil.rmtree(os.path.join(uploads, "videos", "test_purge"), ignore_errors=True)
+
+
+def test_purge_videos(session_empty, processed_videos):
+    # raw videos of 1000 bytes each, so 1500 bytes takes two videos
+    removed = disk_mng.purge_videos(session_empty, logging, size=1500, category="videos")
+    assert removed == 2000
+    assert [os.path.isdir(bucket) for _, bucket in processed_videos] == [False, False, True, True, True]
+    assert session_empty.query(db.Video).count() == 3
+    # water levels and results are kept
+    assert session_empty.query(db.TimeSeries).count() == 5
+    assert session_empty.query(db.TimeSeries).filter(db.TimeSeries.video_id.is_(None)).count() == 2
+    assert db_ops.get_file_usage(session_empty) == {"videos": 3000, "images": 300}
+    # by age, the queued video is never removed
+    disk_mng.purge_videos(session_empty, logging, before=datetime(2001, 1, 1), batch_size=1)
+    assert [video.id for video in session_empty.query(db.Video)] == [processed_videos[-1][0]]
+    assert os.path.isdir(processed_videos[-1][1])
+
+
+def test_purge_videos_uncatalogued(session_empty, processed_videos):
+    # older videos without catalogued files, e.g. videos that failed
+    for i in range(3):
+        session_empty.add(db.Video(timestamp=datetime(1999, 1, 1 + i), status=db.VideoStatus.ERROR))
+    session_empty.commit()
+    assert len(db_ops.get_oldest_videos(session_empty, size=1500, category="videos")) == 2
+    removed = disk_mng.purge_videos(session_empty, logging, size=1500, category="videos")
+    assert removed == 2000
+    # only the two oldest catalogued videos are removed
+    assert [os.path.isdir(bucket) for _, bucket in processed_videos] == [False, False, True, True, True]
+    assert session_empty.query(db.Video).count() == 6
+    # by age, videos without files are removed too
+    disk_mng.purge_videos(session_empty, logging, before=datetime(2000, 1, 1))
+    assert session_empty.query(db.Video).count() == 3
+
+
+def test_disk_budget_video_quota(session_empty, processed_videos, disk_budget, mocker):
+    mocker.patch("nodeorc.disk_mng.get_free_space", return_value=100.)
+    disk_budget.disk_management.quotas = {"videos": 3500 / 10e8}
+    disk_budget.check(session_empty, now=datetime(2000, 1, 10))
+    # raw videos of the two oldest videos are removed, with their other files and records
+    assert session_empty.query(db.Video).count() == 3
+    assert db_ops.get_file_usage(session_empty)["videos"] == 3000
@@ -0,0 +1,39 @@
+import logging
+
+import pytest
+
+from nodeorc import models
+from nodeorc.executor import TaskExecutor
+
+
+@pytest.fixture
+def task():
+    # a task without subtasks only prepares its temporary folder
+    return models.Task()
+
+
+@pytest.fixture
+def task_failing():
+    # input file cannot be downloaded without storage
+    return models.Task(input_files={"videofile": models.File()})
+
+
+@pytest.mark.parametrize("process_pool", [True, False])
+def test_execute(tmpdir, task, process_pool):
+    task_executor = TaskExecutor(max_workers=1, process_pool=process_pool, logger=logging.getLogger("test_executor"))
+    try:
+        result = task_executor.execute(task, str(tmpdir / "task"))
+    finally:
+        task_executor.shutdown()
+    assert result["id"] == str(task.id)
+    assert (tmpdir / "task").isdir()
+
+
+@pytest.mark.parametrize("process_pool", [True, False])
+def test_execute_error(tmpdir, task_failing, process_pool):
+    task_executor = TaskExecutor(max_workers=1, process_pool=process_pool)
+    try:
+        with pytest.raises(Exception, match="Error in processing of subtask"):
+            task_executor.execute(task_failing, str(tmpdir / "task"))
+    finally:
+        task_executor.shutdown()
@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+# modules that take seconds to import on a small device, and are only needed by some commands
+HEAVY_MODULES = ["pyorc", "cv2", "xarray", "boto3", "PIL", "pandas", "sqlalchemy"]
+
+
+def import_times(statement, home):
+    """Run a statement in a new interpreter with ``-X importtime``, and return cumulative import times [us]."""
+    env = {**os.environ, "NODEORC_HOME": str(home)}
+    p = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in p.stderr.splitlines():
+        if line.startswith("import time:") and not line.endswith("imported package"):
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize("module", HEAVY_MODULES)
+def test_import_main(tmpdir, module):
+    times = import_times("import nodeorc.main", tmpdir)
+    assert "nodeorc.main" in times
+    assert module not in times, f"importing nodeorc.main imports {module}"
+    # the database is not made until a command needs it
+    assert not os.path.isfile(tmpdir / "nodeorc_config.db")
+
+
+def test_version(tmpdir):
+    import_times("from nodeorc.main import cli; cli(['--version'], standalone_mode=False)", tmpdir)
+    assert not os.path.isfile(tmpdir / "nodeorc_config.db")
+
+
+def test_import_db(tmpdir):
+    times = import_times("import nodeorc.db", tmpdir)
+    assert "pyorc" not in times
+    assert not os.path.isfile(tmpdir / "nodeorc_config.db")
+    # the database is made and a device is added on first use of the session
+    import_times("from nodeorc import db; assert db.session.query(db.Device).count() == 1", tmpdir)
+    assert os.path.isfile(tmpdir / "nodeorc_config.db")
@@ -46,10 +46,16 @@ def local_task_processor_shutdown(local_task_processor):
     return local_task_processor
 
 def test_await_task(tmpdir, local_task_processor, mocker):
+    # a complete video file, its size and modification time no longer change
+    with open(str(tmpdir / "video_20000101T000000.mp4"), "wb") as f:
+        f.write(b"video")
     mocker.patch("nodeorc.disk_mng.scan_folder", return_value=[str(tmpdir / "video_20000101T000000.mp4")])
     mocker.patch("os.path.isfile", return_value=True)
-    mocker.patch("nodeorc.utils.is_file_size_changing", return_value=False)
-    mocker.patch("nodeorc.tasks.local_task.LocalTaskProcessor.process_file", return_value=None)
+    mocker.patch("nodeorc.tasks.local_task.LocalTaskProcessor.recover_queue", return_value=None)
+    mocker.patch("nodeorc.tasks.local_task.LocalTaskProcessor.queue_file", return_value=None)
+    mocker.patch("nodeorc.scheduler.VideoScheduler.next_video", return_value=1)
+    mocker.patch("nodeorc.db_ops.claim_video", return_value=MagicMock(id=1))
+    mocker.patch("nodeorc.tasks.local_task.LocalTaskProcessor.process_video", return_value=None)
     with patch("multiprocessing.cpu_count", return_value=4):
         task_submitted = local_task_processor.await_task(single_task=True)
         assert task_submitted == True  # Assuming the method doesn't return anything; validate relevant expected state
@@ -86,6 +92,23 @@ def test_get_water_level_from_db(session_config):
     assert rec.h == values[3]
 
 
+def test_get_water_level_interpolated(session_config):
+    timestamps = [datetime(2000, 1, 1) + timedelta(minutes=10 * i) for i in range(3)]
+    db_ops.add_water_levels(session_config, timestamps, [1., 2., 3.])
+    rec = get_water_level(
+        timestamp=timestamps[1] + timedelta(minutes=5),
+        file_fmt="wl_{%Y%m%d}.txt",
+        datetime_fmt="%Y%m%dT%H%M%SZ",
+        allowed_dt=600,
+        interpolate=True,
+        session=session_config,
+    )
+    assert rec.h == 2.5
+    # the interpolated water level is not stored as a water level
+    assert rec.id is None
+    assert session_config.query(TimeSeries).count() == 3
+
+
 def test_get_water_level_outside_dt(session_config, monkeypatch, mocker):
     # mock get_water_level_file to produce some value which does not exist in the database
     mocker.patch("nodeorc.water_level.get_water_level_file", return_value=3.5)
@@ -138,6 +161,15 @@ def test_get_water_level_file_not_available(session_config, monkeypatch):
     assert rec is None
 
 
+def test_post_callbacks_store_fails(local_task_processor, mocker):
+    mocker.patch.object(local_task_processor.delivery, "send", return_value=None)
+    callback = MagicMock(endpoint="/api/timeseries/")
+    callback.to_db.side_effect = OSError("disk full")
+    # a callback that cannot be stored does not make the video fail
+    assert not local_task_processor._post_callbacks([callback])
+    callback.to_db.assert_called_once()
+
+
 def test_cleanup_enough_space(local_task_processor):
     # only test if the function returns true if the free space is above minimum required space.
     free_space = 500  #GB
@@ -2,8 +2,8 @@
 import os
 
 from click.testing import CliRunner
-from nodeorc.main import upload_water_level_script
-from nodeorc.db import WaterLevelSettings
+from nodeorc.main import upload_water_level_script, upload_water_level_file
+from nodeorc.db import TimeSeries, WaterLevelSettings
 from nodeorc.db import db_path_config
 
 
@@ -119,3 +119,28 @@ def test_upload_water_level_script_invalid_datetime_format(tmp_path):
     assert isinstance(result.exception, ValueError)
     if os.path.exists(db_path_config):
         os.unlink(db_path_config)
+
+
+def test_upload_water_level_file(tmp_path, session_empty, monkeypatch):
+    """Test upload of water levels from file, records that already exist are skipped."""
+    monkeypatch.setattr("nodeorc.db_ops.get_session", lambda: session_empty)
+    fn = tmp_path / "wl.txt"
+    fn.write_text("20230101_000000 1.5\n20230101_001000 1.6\n20230101_002000 1.7\n")
+    runner = CliRunner()
+    result = runner.invoke(upload_water_level_file, [str(fn), "--datetime-fmt", "%Y%m%d_%H%M%S"])
+    assert result.exit_code == 0
+    assert session_empty.query(TimeSeries).count() == 3
+    # uploading the same file again does not add any records
+    result = runner.invoke(upload_water_level_file, [str(fn), "--datetime-fmt", "%Y%m%d_%H%M%S"])
+    assert result.exit_code == 0
+    assert session_empty.query(TimeSeries).count() == 3
+
+
+def test_upload_water_level_file_no_datetime_format(tmp_path, session_empty, monkeypatch):
+    """Test failure when no datetime format is given and no water level settings exist."""
+    monkeypatch.setattr("nodeorc.db_ops.get_session", lambda: session_empty)
+    fn = tmp_path / "wl.txt"
+    fn.write_text("20230101_000000 1.5\n")
+    result = CliRunner().invoke(upload_water_level_file, [str(fn)])
+    assert result.exit_code == 2
+    assert "provide a datetime format" in result.output
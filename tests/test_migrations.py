@@ -0,0 +1,74 @@
+from sqlalchemy import create_engine, inspect, text
+
+from nodeorc import db
+from nodeorc.db.migrations import upgrade
+
+
+def test_upgrade_adds_missing_columns(tmpdir):
+    engine = create_engine(f"sqlite:///{tmpdir / 'old.db'}")
+    db.Base.metadata.create_all(engine)
+    # emulate a database of an older version, without the max_workers column
+    with engine.begin() as conn:
+        conn.execute(text('ALTER TABLE settings DROP COLUMN max_workers'))
+        conn.execute(text("INSERT INTO settings (video_file_fmt, parse_dates_from_file, allowed_dt, "
+                          "shutdown_after_task, reboot_after, enable_daemon, process_pool) "
+                          "VALUES ('video_{%Y%m%dT%H%M%S}.mp4', 1, 3600, 0, 0, 1, 1)"))
+    assert "max_workers" not in [c["name"] for c in inspect(engine).get_columns("settings")]
+    upgrade(engine)
+    assert "max_workers" in [c["name"] for c in inspect(engine).get_columns("settings")]
+    with engine.connect() as conn:
+        # existing records get the default
+        assert conn.execute(text("SELECT max_workers FROM settings")).scalar() == 1
+    # upgrading twice is harmless
+    upgrade(engine)
+
+
+def test_upgrade_adds_missing_indexes(tmpdir):
+    engine = create_engine(f"sqlite:///{tmpdir / 'old.db'}")
+    db.Base.metadata.create_all(engine)
+    # emulate a database of an older version, without indexes
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_time_series_timestamp"))
+        conn.execute(text("DROP INDEX ix_video_status_timestamp"))
+    upgrade(engine)
+    assert "ix_time_series_timestamp" in [ix["name"] for ix in inspect(engine).get_indexes("time_series")]
+    assert "ix_video_status_timestamp" in [ix["name"] for ix in inspect(engine).get_indexes("video")]
+    # upgrading twice is harmless
+    upgrade(engine)
+
+
+def test_upgrade_makes_time_series_timestamp_unique(tmpdir):
+    engine = create_engine(f"sqlite:///{tmpdir / 'old.db'}")
+    db.Base.metadata.create_all(engine)
+    # emulate a database of an older version, with a non-unique index and duplicate water levels
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_time_series_timestamp"))
+        conn.execute(text("CREATE INDEX ix_time_series_timestamp ON time_series (timestamp)"))
+        conn.execute(text("INSERT INTO time_series (timestamp, h) VALUES "
+                          "('2000-01-01 00:00:00.000000', 1.0), ('2000-01-01 00:00:00.000000', 2.0), "
+                          "('2000-01-01 00:10:00.000000', 3.0)"))
+    upgrade(engine)
+    indexes = {ix["name"]: ix["unique"] for ix in inspect(engine).get_indexes("time_series")}
+    assert indexes["ix_time_series_timestamp"]
+    with engine.connect() as conn:
+        # the first record of the duplicates is kept
+        assert conn.execute(text("SELECT h FROM time_series ORDER BY timestamp")).scalars().all() == [1.0, 3.0]
+
+
+def test_upgrade_keeps_results_of_duplicates(tmpdir):
+    engine = create_engine(f"sqlite:///{tmpdir / 'old.db'}")
+    db.Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_time_series_timestamp"))
+        conn.execute(text("CREATE INDEX ix_time_series_timestamp ON time_series (timestamp)"))
+        # a water level, the same water level with the results of a video, and one with only part of the results
+        conn.execute(text("INSERT INTO time_series (timestamp, h, q_50, video_id) VALUES "
+                          "('2000-01-01 00:00:00.000000', 1.0, NULL, NULL), "
+                          "('2000-01-01 00:00:00.000000', 2.0, 10.0, 1)"))
+        conn.execute(text("INSERT INTO time_series (timestamp, h, fraction_velocimetry) VALUES "
+                          "('2000-01-01 00:00:00.000000', 3.0, 80.0)"))
+    upgrade(engine)
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT h, q_50, video_id, fraction_velocimetry FROM time_series")).all()
+    # the record with results is kept, and completed with the values of the other records
+    assert rows == [(2.0, 10.0, 1, 80.0)]
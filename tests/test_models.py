@@ -2,12 +2,14 @@
 import datetime
 import json
 import pytest
+import uuid
 import nodeorc.models as orcmodels
 
-from nodeorc.db import WaterLevelSettings, TimeSeries, Base, Callback
-from nodeorc.db_ops import add_replace_water_level_script, add_water_level
+from nodeorc.db import WaterLevelSettings, TimeSeries, Base, Callback, Settings, TaskForm, TaskFormStatus
+from nodeorc.db_ops import add_replace_water_level_script, add_water_level, get_settings, get_active_task_form
+from nodeorc.tasks.task_form import save_new_task_form
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
 
@@ -280,3 +282,80 @@ def test_callback_property(callback_instance):
     result = callback_instance.callback
     assert isinstance(result, orcmodels.Callback)
     assert result.func_name == "discharge"
+
+
+def test_get_settings_cached(session):
+    assert get_settings(session) is None
+    settings = Settings(video_file_fmt="video_{%Y%m%dT%H%M%S}.mp4", allowed_dt=3600)
+    session.add(settings)
+    session.commit()
+    assert get_settings(session) is settings
+    # repeated calls do not query the settings table
+    statements = []
+    event.listen(session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    for _ in range(10):
+        assert get_settings(session) is settings
+    assert len(statements) <= 1
+    # removing the record invalidates the cache
+    session.delete(settings)
+    session.commit()
+    assert get_settings(session) is None
+
+
+def test_get_active_task_form(session):
+    assert get_active_task_form(session) is None
+    accepted = TaskForm(id=uuid.uuid4(), status=TaskFormStatus.ACCEPTED, task_body={"a": 1})
+    session.add(accepted)
+    session.commit()
+    assert get_active_task_form(session) is accepted
+    # a new form becomes CANDIDATE, earlier CANDIDATE forms become ANCIENT and the ACCEPTED form remains
+    candidate = TaskForm(id=uuid.uuid4(), status=TaskFormStatus.CANDIDATE, task_body={"a": 2})
+    save_new_task_form(session, candidate)
+    assert get_active_task_form(session, parse=True) == {"a": 2}
+    new_candidate = TaskForm(id=uuid.uuid4(), status=TaskFormStatus.CANDIDATE, task_body={"a": 3})
+    save_new_task_form(session, new_candidate)
+    assert get_active_task_form(session) is new_candidate
+    assert candidate.status == TaskFormStatus.ANCIENT
+    assert get_active_task_form(session, allow_candidate=False) is accepted
+    # rejecting the candidate falls back on the ACCEPTED form
+    new_candidate.status = TaskFormStatus.REJECTED
+    session.commit()
+    assert get_active_task_form(session) is accepted
+
+
+def test_get_active_task_form_other_session(session):
+    # e.g. the thread that processes videos, which keeps using records it loaded, records are not expired on commit
+    other = sessionmaker(bind=session.get_bind(), expire_on_commit=False)()
+    save_new_task_form(session, TaskForm(id=uuid.uuid4(), status=TaskFormStatus.CANDIDATE, task_body={"a": 1}))
+    first = get_active_task_form(other)
+    assert first.task_body == {"a": 1}
+    # another thread replaces the candidate, with a bulk update of earlier candidates
+    save_new_task_form(session, TaskForm(id=uuid.uuid4(), status=TaskFormStatus.CANDIDATE, task_body={"a": 2}))
+    second = get_active_task_form(other)
+    assert second.task_body == {"a": 2}
+    assert get_active_task_form(other, allow_candidate=False) is None
+    # the candidate is accepted in another thread
+    get_active_task_form(session).status = TaskFormStatus.ACCEPTED
+    session.commit()
+    assert get_active_task_form(other) is second
+    assert second.status == TaskFormStatus.ACCEPTED
+    # once reloaded, no more queries are needed than without changes
+    statements = []
+    event.listen(session.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    assert get_active_task_form(other) is second
+    assert len(statements) == 1  # no candidate
+    other.close()
+
+
+def test_get_settings_other_session(session):
+    other = sessionmaker(bind=session.get_bind(), expire_on_commit=False)()
+    session.add(Settings(video_file_fmt="video_{%Y%m%dT%H%M%S}.mp4", allowed_dt=3600))
+    session.commit()
+    settings = get_settings(other)
+    assert settings.allowed_dt == 3600
+    get_settings(session).allowed_dt = 1800
+    session.commit()
+    # the settings changed by another thread are reloaded
+    assert get_settings(other) is settings
+    assert settings.allowed_dt == 1800
+    other.close()
@@ -0,0 +1,139 @@
+import os
+import shutil
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from nodeorc import db, db_ops
+from nodeorc.db.video import UPLOAD_DIRECTORY
+from nodeorc.scheduler import VideoScheduler
+
+
+@pytest.fixture
+def videos():
+    # (id, timestamp), a video every 20 minutes, arriving in random order
+    t0 = datetime(2000, 1, 1)
+    return [(i, t0 + timedelta(minutes=20 * i)) for i in [3, 0, 5, 1, 4, 2]]
+
+
+@pytest.fixture
+def session_queue(session_config):
+    now = datetime.now()
+    for h in [48, 24, 2, 1]:
+        session_config.add(db.Video(timestamp=now - timedelta(hours=h), status=db.VideoStatus.QUEUE))
+    session_config.commit()
+    return session_config
+
+
+def test_order_oldest(videos):
+    ordered, dropped = VideoScheduler(policy="oldest").order(videos)
+    assert ordered == [0, 1, 2, 3, 4, 5]
+    assert dropped == []
+
+
+def test_order_newest(videos):
+    ordered, _ = VideoScheduler(policy="newest").order(videos)
+    assert ordered == [5, 4, 3, 2, 1, 0]
+
+
+def test_order_thin(videos):
+    # one video per hour (newest hour first), the other videos are thinned out
+    ordered, dropped = VideoScheduler(policy="thin", thin_interval=60).order(videos)
+    assert ordered == [5, 2]
+    assert dropped == [4, 3, 1, 0]
+    # videos of the current hour are not part of the backlog, and are all processed
+    ordered, dropped = VideoScheduler(policy="thin", thin_interval=60).order(videos, now=datetime(2000, 1, 1, 1, 50))
+    assert ordered == [5, 4, 3, 2]
+    assert dropped == [1, 0]
+
+
+def test_order_stale(videos):
+    now = datetime(2000, 1, 1, 2)
+    # queue is not deep enough, nothing happens to old videos
+    scheduler = VideoScheduler(policy="newest", max_depth=10, max_age=3600, stale_action="drop")
+    assert scheduler.order(videos, now=now) == ([5, 4, 3, 2, 1, 0], [])
+    # videos older than 1 hour are deferred
+    scheduler = VideoScheduler(policy="oldest", max_depth=3, max_age=3600)
+    assert scheduler.order(videos, now=now) == ([3, 4, 5, 0, 1, 2], [])
+    # or dropped
+    scheduler = VideoScheduler(policy="oldest", max_depth=3, max_age=3600, stale_action="drop")
+    assert scheduler.order(videos, now=now) == ([3, 4, 5], [0, 1, 2])
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        VideoScheduler(policy="random")
+    with pytest.raises(ValueError):
+        VideoScheduler(stale_action="delete")
+
+
+def test_from_settings(session_config):
+    settings = session_config.query(db.Settings).first()
+    scheduler = VideoScheduler.from_settings(settings)
+    assert scheduler.policy == "oldest"
+    assert scheduler.max_depth is None
+    with pytest.raises(ValueError):
+        settings.queue_policy = "random"
+
+
+def test_next_video(session_queue):
+    scheduler = VideoScheduler(policy="newest", max_depth=2, max_age=12 * 3600, stale_action="drop")
+    video_id = scheduler.next_video(session_queue)
+    newest = session_queue.query(db.Video).order_by(db.Video.timestamp.desc()).first()
+    assert video_id == newest.id
+    # the two videos older than 12 hours are skipped and will not be claimed
+    assert session_queue.query(db.Video).filter_by(status=db.VideoStatus.SKIPPED).count() == 2
+    assert session_queue.query(db.Video).filter_by(status=db.VideoStatus.QUEUE).count() == 2
+
+
+@pytest.mark.parametrize("policy", ["oldest", "newest"])
+def test_next_video_first(session_queue, policy, mocker):
+    # without queue depth limit, the queue is not loaded as a whole
+    get_claimable_videos = mocker.spy(db_ops, "get_claimable_videos")
+    video_id = VideoScheduler(policy=policy).next_video(session_queue)
+    timestamp = db.Video.timestamp if policy == "oldest" else db.Video.timestamp.desc()
+    assert video_id == session_queue.query(db.Video).order_by(timestamp).first().id
+    assert not get_claimable_videos.called
+    # a video of which the claim expired is claimable again
+    expired = db.Video(
+        timestamp=datetime(2000, 1, 1) if policy == "oldest" else datetime.now(),
+        status=db.VideoStatus.TASK,
+        lease_expires=datetime.now() - timedelta(minutes=1)
+    )
+    session_queue.add(expired)
+    session_queue.commit()
+    assert VideoScheduler(policy=policy).next_video(session_queue) == expired.id
+
+
+def test_next_video_thin(session_config):
+    for minutes in [0, 20, 40]:
+        session_config.add(db.Video(timestamp=datetime(2000, 1, 1, 0, minutes), status=db.VideoStatus.QUEUE))
+    session_config.commit()
+    scheduler = VideoScheduler(policy="thin", thin_interval=60)
+    video_id = scheduler.next_video(session_config, now=datetime(2000, 1, 1, 5))
+    assert session_config.get(db.Video, video_id).timestamp == datetime(2000, 1, 1, 0, 40)
+    # the backlog is thinned to one video per hour, the others are skipped
+    assert session_config.query(db.Video).filter_by(status=db.VideoStatus.SKIPPED).count() == 2
+    assert session_config.query(db.Video).filter_by(status=db.VideoStatus.QUEUE).count() == 1
+
+
+def test_skipped_videos_catalogued(session_config):
+    folder = os.path.join(UPLOAD_DIRECTORY, "videos", "test_skip")
+    os.makedirs(folder, exist_ok=True)
+    try:
+        for minutes in [0, 20, 40]:
+            fn = f"video_{minutes}.mp4"
+            with open(os.path.join(folder, fn), "wb") as f:
+                f.write(b"0" * 1000)
+            session_config.add(db.Video(
+                timestamp=datetime(2000, 1, 1, 0, minutes), status=db.VideoStatus.QUEUE, file=f"videos/test_skip/{fn}"
+            ))
+        session_config.commit()
+        VideoScheduler(policy="thin", thin_interval=60).next_video(session_config, now=datetime(2000, 1, 1, 5))
+        # the raw files of skipped videos stay on disk, and are accounted for
+        assert db_ops.get_file_usage(session_config) == {"videos": 2000}
+        skipped = session_config.query(db.Video).filter_by(status=db.VideoStatus.SKIPPED)
+        assert {f.video_id for f in session_config.query(db.CataloguedFile)} == {v.id for v in skipped}
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
@@ -0,0 +1,53 @@
+import os
+from io import BytesIO
+from unittest.mock import patch
+
+import pytest
+
+from nodeorc import models
+
+
+@pytest.fixture
+def storage(tmpdir):
+    return models.Storage(url=str(tmpdir / "uploads"), bucket_name="video")
+
+
+@pytest.fixture
+def src_file(tmpdir):
+    fn = str(tmpdir / "output.nc")
+    with open(fn, "wb") as f:
+        f.write(b"x" * 1000)
+    return fn
+
+
+def test_upload_io(storage):
+    storage.upload_io(BytesIO(b"content"), dest="sub/file.txt")
+    with open(os.path.join(storage.bucket, "sub", "file.txt"), "rb") as f:
+        assert f.read() == b"content"
+
+
+def test_upload_file_link(storage, src_file):
+    storage.upload_file(src_file, dest="output.nc")
+    fn = os.path.join(storage.bucket, "output.nc")
+    # source remains and is the same file on disk
+    assert os.path.isfile(src_file)
+    assert os.path.samefile(src_file, fn)
+    # uploading again replaces the earlier upload
+    storage.upload_file(src_file, dest="output.nc")
+    assert os.path.samefile(src_file, fn)
+
+
+def test_upload_file_move(storage, src_file):
+    storage.upload_file(src_file, dest="output.nc", keep_src=False)
+    assert not os.path.isfile(src_file)
+    assert os.path.getsize(os.path.join(storage.bucket, "output.nc")) == 1000
+
+
+@pytest.mark.parametrize("keep_src", [True, False])
+def test_upload_file_cross_device(storage, src_file, keep_src):
+    # linking and renaming fail across file systems, the file is then copied
+    with patch("os.link", side_effect=OSError), patch("os.rename", side_effect=OSError):
+        storage.upload_file(src_file, dest="output.nc", keep_src=keep_src)
+    fn = os.path.join(storage.bucket, "output.nc")
+    assert os.path.getsize(fn) == 1000
+    assert not os.path.samefile(src_file, fn) if keep_src else not os.path.isfile(src_file)
@@ -0,0 +1,80 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from datetime import datetime
+from PIL import Image
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from nodeorc import db, db_ops
+from nodeorc.db.video import UPLOAD_DIRECTORY, thumbnail_queue
+
+
+@pytest.fixture
+def thumbnail_session(session_empty):
+    # sessions only make thumbnails if asked to, as the sessions of nodeorc.db do
+    session_empty.info["make_thumbnails"] = True
+    return session_empty
+
+
+@pytest.fixture
+def video_folder():
+    folder = os.path.join(UPLOAD_DIRECTORY, "videos", "test_thumbnails")
+    os.makedirs(folder, exist_ok=True)
+    yield folder
+    shutil.rmtree(folder, ignore_errors=True)
+
+
+def test_thumbnail_from_image(thumbnail_session, video_folder, mocker):
+    Image.fromarray(np.zeros((200, 400, 3), dtype=np.uint8)).save(os.path.join(video_folder, "video.jpg"))
+    # the video itself must not be decoded
+    video_capture = mocker.patch("cv2.VideoCapture")
+    video = db.Video(
+        timestamp=datetime(2000, 1, 1),
+        status=db.VideoStatus.DONE,
+        file="videos/test_thumbnails/video.mp4",
+        image="videos/test_thumbnails/video.jpg",
+    )
+    thumbnail_session.add(video)
+    thumbnail_session.commit()
+    thumbnail_queue.join()
+    thumbnail_session.refresh(video)
+    assert video.thumbnail == "videos/test_thumbnails/video_thumb.jpg"
+    assert Image.open(os.path.join(UPLOAD_DIRECTORY, video.thumbnail)).size == (50, 25)
+    assert not video_capture.called
+    # the thumbnail counts towards the disk use of the video
+    thumbnail_path = os.path.join(UPLOAD_DIRECTORY, video.thumbnail)
+    assert db_ops.get_video_files(thumbnail_session, [video.id]) == [(thumbnail_path, os.path.getsize(thumbnail_path))]
+    assert db_ops.get_file_usage(thumbnail_session) == {"thumbnails": os.path.getsize(thumbnail_path)}
+
+
+def test_thumbnail_not_for_queued_video(thumbnail_session, video_folder, mocker):
+    put = mocker.patch.object(thumbnail_queue, "put")
+    video = db.Video(timestamp=datetime(2000, 1, 1), status=db.VideoStatus.QUEUE, file="videos/test_thumbnails/a.mp4")
+    thumbnail_session.add(video)
+    thumbnail_session.commit()
+    assert not put.called
+    # once processed, the thumbnail is queued after the commit
+    video.status = db.VideoStatus.DONE
+    video.image = "videos/test_thumbnails/a.jpg"
+    thumbnail_session.flush()
+    assert not put.called
+    thumbnail_session.commit()
+    put.assert_called_once_with(thumbnail_session.get_bind(), video.id)
+
+
+def test_thumbnail_not_for_other_sessions(video_folder, mocker):
+    # a plain in-memory database cannot be reached from the connection of another thread
+    engine = create_engine("sqlite://")
+    db.Base.metadata.create_all(engine)
+    put = mocker.patch.object(thumbnail_queue, "put")
+    with sessionmaker(bind=engine)() as session:
+        session.add(
+            db.Video(timestamp=datetime(2000, 1, 1), status=db.VideoStatus.DONE, file="videos/test_thumbnails/a.mp4")
+        )
+        session.commit()
+    assert not put.called
+    engine.dispose()
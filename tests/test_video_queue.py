@@ -0,0 +1,103 @@
+import os
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+import pytest
+
+from nodeorc import db, db_ops, disk_mng, utils
+from nodeorc.tasks.local_task import LocalTaskProcessor
+
+
+@pytest.fixture
+def session_queue(session_config):
+    timestamps = [datetime(2000, 1, 1) + timedelta(minutes=10 * i) for i in range(3)]
+    for t in timestamps:
+        session_config.add(db.Video(timestamp=t, status=db.VideoStatus.QUEUE))
+    # a video that is done already must never be claimed
+    session_config.add(db.Video(timestamp=datetime(1999, 1, 1), status=db.VideoStatus.DONE))
+    session_config.commit()
+    return session_config
+
+
+def test_claim_video(session_queue):
+    video = db_ops.claim_video(session_queue, lease=60)
+    assert video.timestamp == datetime(2000, 1, 1)
+    assert video.status == db.VideoStatus.TASK
+    assert video.lease_expires > datetime.now()
+    # the same video cannot be claimed twice
+    assert db_ops.claim_video(session_queue, video_id=video.id) is None
+    assert db_ops.claim_video(session_queue).id != video.id
+
+
+def test_claim_video_empty_queue(session_config):
+    assert db_ops.claim_video(session_config) is None
+
+
+def test_claim_video_expired_lease(session_queue):
+    video = db_ops.claim_video(session_queue, lease=-1)
+    # lease has expired, so the video may be claimed again
+    assert db_ops.claim_video(session_queue, video_id=video.id).id == video.id
+
+
+def test_renew_and_requeue(session_queue):
+    video = db_ops.claim_video(session_queue, lease=-1)
+    assert db_ops.renew_video_leases(session_queue, [video.id], lease=60) == 1
+    assert db_ops.claim_video(session_queue, video_id=video.id) is None
+    assert db_ops.requeue_videos(session_queue) == 1
+    session_queue.refresh(video)
+    assert video.status == db.VideoStatus.QUEUE
+    assert session_queue.query(db.Video).filter_by(status=db.VideoStatus.DONE).count() == 1
+
+
+def test_queue_file(tmpdir, session_config, logger, monkeypatch):
+    monkeypatch.setattr("nodeorc.db_ops.get_session", lambda: session_config)
+    monkeypatch.setattr("nodeorc.tasks.local_task.__home__", str(tmpdir))
+    monkeypatch.setattr("nodeorc.db.video.UPLOAD_DIRECTORY", str(tmpdir / "uploads"))
+    processor = LocalTaskProcessor(
+        task_form_template=MagicMock(),
+        logger=logger,
+        settings=session_config.query(db.Settings).first(),
+        disk_management=session_config.query(db.DiskManagement).first(),
+        callback_url=session_config.query(db.CallbackUrl).first(),
+        water_level_settings=utils.model_to_dict(session_config.query(db.WaterLevelSettings).first()),
+        auto_start_threads=False,
+    )
+    file_path = os.path.join(processor.disk_management.incoming_path, "video_20000101T000000.mp4")
+    with open(file_path, "wb") as f:
+        f.write(b"video")
+    video = processor.queue_file(file_path)
+    assert video.status == db.VideoStatus.QUEUE
+    assert video.file == f"videos/20000101/{video.id}/video_20000101T000000.mp4"
+    assert not os.path.isfile(file_path)
+    assert os.path.isfile(os.path.join(str(tmpdir), "uploads", video.file))
+    # the raw video is catalogued, so that a video that is never processed can be purged by space
+    assert db_ops.get_file_usage(session_config) == {"videos": 5}
+    video.status = db.VideoStatus.SKIPPED
+    session_config.commit()
+    raw_path = os.path.join(str(tmpdir), "uploads", video.file)
+    assert disk_mng.purge_videos(session_config, logger, size=1, category="videos") == 5
+    assert not os.path.isfile(raw_path)
+    assert session_config.query(db.Video).count() == 0
+    # file that does not follow the naming convention is set aside
+    file_path = os.path.join(processor.disk_management.incoming_path, "some_video.mp4")
+    open(file_path, "w").close()
+    assert processor.queue_file(file_path) is None
+    assert os.path.isfile(os.path.join(processor.disk_management.failed_path, "some_video.mp4"))
+
+
+def test_process_missing_video(session_config, logger, monkeypatch):
+    monkeypatch.setattr("nodeorc.db_ops.get_session", lambda: session_config)
+    processor = LocalTaskProcessor(
+        task_form_template=MagicMock(),
+        logger=logger,
+        settings=session_config.query(db.Settings).first(),
+        disk_management=session_config.query(db.DiskManagement).first(),
+        callback_url=session_config.query(db.CallbackUrl).first(),
+        water_level_settings=utils.model_to_dict(session_config.query(db.WaterLevelSettings).first()),
+        auto_start_threads=False,
+    )
+    monkeypatch.setattr(processor, "get_new_task_form", lambda: None)
+    processor.process_video(9999)
+    # the video does not exist, the count of videos in process must go down again
+    assert processor.n_processing == 0
+    assert not processor.processing
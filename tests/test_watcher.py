@@ -0,0 +1,113 @@
+import os
+import time
+
+import pytest
+
+from nodeorc import watcher
+
+
+def wait_for(folder_watcher, timeout=5.):
+    """Collect all paths reported by the watcher until nothing new arrives within timeout."""
+    paths = []
+    while True:
+        fn = folder_watcher.get(timeout=timeout)
+        if fn is None:
+            return paths
+        paths.append(fn)
+        timeout = 0.5
+
+
+@pytest.fixture
+def incoming(tmpdir):
+    path = tmpdir / "incoming"
+    path.mkdir()
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    "mode",
+    [
+        "poll",
+        pytest.param(
+            "inotify",
+            marks=pytest.mark.skipif(not watcher.inotify_available(), reason="inotify not available")
+        ),
+    ]
+)
+def test_watcher_reports_existing_and_new_files(incoming, tmpdir, mode):
+    existing = os.path.join(incoming, "video_20000101T000000.mp4")
+    open(existing, "w").close()
+    with watcher.FolderWatcher(incoming, suffix="mp4", mode=mode, interval=0.1) as folder_watcher:
+        assert wait_for(folder_watcher, timeout=1.) == [existing]
+        # write a new file in the top folder and one with a non-matching suffix
+        new = os.path.join(incoming, "video_20000101T001000.mp4")
+        with open(new, "w") as f:
+            f.write("data")
+        open(os.path.join(incoming, "notes.txt"), "w").close()
+        assert wait_for(folder_watcher) == [new]
+        # move a complete subfolder with a file in the watched tree
+        os.makedirs(str(tmpdir / "sub"))
+        open(str(tmpdir / "sub" / "video_20000101T002000.mp4"), "w").close()
+        os.rename(str(tmpdir / "sub"), os.path.join(incoming, "sub"))
+        assert wait_for(folder_watcher) == [os.path.join(incoming, "sub", "video_20000101T002000.mp4")]
+
+
+@pytest.mark.skipif(not watcher.inotify_available(), reason="inotify not available")
+def test_watcher_inotify_reports_moved_file(incoming, tmpdir):
+    src = str(tmpdir / "video_20000101T000000.mp4")
+    with open(src, "w") as f:
+        f.write("data")
+    with watcher.FolderWatcher(incoming, suffix="mp4", mode="inotify") as folder_watcher:
+        t0 = time.time()
+        os.rename(src, os.path.join(incoming, "video_20000101T000000.mp4"))
+        assert folder_watcher.get(timeout=5.) == os.path.join(incoming, "video_20000101T000000.mp4")
+        # notification is instant, not after a poll interval
+        assert time.time() - t0 < 1.
+
+
+def test_watcher_invalid_mode(incoming):
+    with pytest.raises(ValueError, match="Watch mode must be"):
+        watcher.FolderWatcher(incoming, mode="sometimes")
+
+
+def test_tracker_ready_after_unchanged_observations(tmpdir):
+    fn = str(tmpdir / "video.mp4")
+    with open(fn, "wb") as f:
+        f.write(b"part")
+    tracker = watcher.FileStabilityTracker(observations=2, interval=1.)
+    assert not tracker.observe(fn, now=0.)
+    # observations within the interval are not counted
+    assert not tracker.observe(fn, now=0.5)
+    # file is still growing, so counting starts over
+    with open(fn, "ab") as f:
+        f.write(b"more")
+    assert not tracker.observe(fn, now=1.5)
+    assert not tracker.is_ready(fn)
+    assert tracker.observe(fn, now=2.5)
+    assert tracker.is_ready(fn)
+    tracker.forget(fn)
+    assert not tracker.is_ready(fn)
+
+
+def test_tracker_mark_closed(tmpdir):
+    fn = str(tmpdir / "video.mp4")
+    open(fn, "w").close()
+    tracker = watcher.FileStabilityTracker()
+    tracker.mark_closed(fn)
+    assert tracker.observe(fn)
+
+
+def test_tracker_missing_file(tmpdir):
+    tracker = watcher.FileStabilityTracker()
+    assert not tracker.observe(str(tmpdir / "missing.mp4"))
+
+
+@pytest.mark.skipif(not watcher.inotify_available(), reason="inotify not available")
+def test_watcher_marks_closed_files_ready(incoming):
+    tracker = watcher.FileStabilityTracker()
+    with watcher.FolderWatcher(incoming, suffix="mp4", mode="inotify", tracker=tracker) as folder_watcher:
+        fn = os.path.join(incoming, "video_20000101T000000.mp4")
+        with open(fn, "w") as f:
+            f.write("data")
+        assert folder_watcher.get(timeout=5.) == fn
+        assert tracker.is_ready(fn)
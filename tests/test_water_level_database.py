@@ -1,7 +1,12 @@
 from datetime import datetime, timedelta
 
+import numpy as np
+import pandas as pd
 import pytest
-from nodeorc.db_ops import get_water_level
+from nodeorc.db import TimeSeries, TimeSeriesSource, Video, VideoStatus
+from nodeorc.db_ops import add_result_summary, add_water_level, add_water_levels, get_last_water_level_timestamp, get_water_level, \
+    get_water_level_index
+from nodeorc.water_level import WaterLevelIndex, interpolate_water_levels
 
 
 def test_get_water_level_returns_closest_record(session_water_levels):
@@ -36,3 +41,174 @@ def test_get_water_level_within_allowed_dt(session_water_levels):
     # Run the function and assert it raises ValueError due to allowed_dt
     result = get_water_level(session_water_levels, target_time, allowed_dt=allowed_dt)
     assert abs(result.timestamp - target_time).total_seconds() < allowed_dt
+
+
+def test_get_water_level_index_updated(session_config):
+    t0 = datetime(2000, 1, 1)
+    add_water_level(session_config, t0, 1.)
+    index = get_water_level_index(session_config)
+    assert len(index) == 1
+    # new records, also when added outside of db_ops, are found
+    add_water_level(session_config, t0 + timedelta(hours=1), 2.)
+    session_config.add(TimeSeries(timestamp=t0 - timedelta(hours=1), h=0.))
+    session_config.commit()
+    assert get_water_level(session_config, t0 - timedelta(minutes=45)).h == 0.
+    assert len(get_water_level_index(session_config)) == 3
+    # removed records are not returned
+    session_config.query(TimeSeries).filter_by(h=0.).delete()
+    session_config.commit()
+    assert get_water_level(session_config, t0 - timedelta(minutes=45)).h == 1.
+
+
+def test_water_level_index():
+    t0 = datetime(2000, 1, 1)
+    index = WaterLevelIndex(capacity=2)
+    with pytest.raises(ValueError, match="No water level entries found"):
+        index.nearest(t0)
+    # values out of order
+    for k in [3, 1, 4, 0]:
+        index.add(t0 + timedelta(minutes=10 * k), float(k), k)
+    index.extend([t0 + timedelta(minutes=20), t0 + timedelta(minutes=100)], [2., 10.], [2, 10])
+    assert len(index) == 6
+    assert index.last_id == 10
+    assert index.nearest(t0 + timedelta(minutes=12)) == (t0 + timedelta(minutes=10), 1., 1)
+    # equally close, earlier record is returned
+    assert index.nearest(t0 + timedelta(minutes=15))[2] == 1
+    assert index.nearest(t0 + timedelta(hours=5))[2] == 10
+    with pytest.raises(ValueError, match="No water level found within 60 seconds"):
+        index.nearest(t0 + timedelta(minutes=75), allowed_dt=60)
+    before, after = index.bracket(t0 + timedelta(minutes=40))
+    assert before[2] == 4 and after[2] == 10
+    assert index.bracket(t0 - timedelta(minutes=1))[0] is None
+    assert index.bracket(t0 + timedelta(hours=5))[1] is None
+
+
+def test_interpolate_water_levels():
+    t = np.array([0, 600, 1200, 3600]) * 1000000
+    h = np.array([1., 2., 4., 0.])
+    t_new = np.array([-60, 0, 300, 900, 1800, 4000]) * 1000000
+    np.testing.assert_allclose(
+        interpolate_water_levels(t, h, t_new), [np.nan, 1., 1.5, 3., 3., np.nan]
+    )
+    # 1800 is more than 600 seconds from 1200 and 3600
+    np.testing.assert_allclose(
+        interpolate_water_levels(t, h, t_new, allowed_dt=600), [np.nan, 1., 1.5, 3., np.nan, np.nan]
+    )
+    assert np.isnan(interpolate_water_levels(t[:0], h[:0], t_new)).all()
+
+
+def test_get_water_level_interpolated(session_config):
+    t0 = datetime(2000, 1, 1)
+    add_water_levels(session_config, [t0, t0 + timedelta(minutes=10), t0 + timedelta(hours=2)], [1., 2., 3.])
+    rec = get_water_level(session_config, t0 + timedelta(minutes=4), interpolate=True)
+    # a new record, not yet stored
+    assert rec.id is None
+    assert rec.h == pytest.approx(1.4)
+    assert rec.timestamp == t0 + timedelta(minutes=4)
+    # exact match returns the stored record
+    assert get_water_level(session_config, t0 + timedelta(minutes=10), interpolate=True).id is not None
+    # records further than allowed_dt apart, closest record is returned
+    rec = get_water_level(session_config, t0 + timedelta(minutes=15), allowed_dt=600, interpolate=True)
+    assert rec.h == 2.
+    with pytest.raises(ValueError, match="No water level found within 600 seconds"):
+        get_water_level(session_config, t0 + timedelta(minutes=60), allowed_dt=600, interpolate=True)
+
+
+def test_add_water_levels(session_config):
+    t0 = datetime(2000, 1, 1)
+    add_water_level(session_config, t0, 1.)
+    index = get_water_level_index(session_config)
+    readings = [(t0 + timedelta(minutes=10 * i), float(i)) for i in range(-2, 3)]
+    # existing timestamp and duplicates within the readings are skipped
+    assert add_water_levels(session_config, *zip(*(readings + readings[:1]))) == 4
+    assert session_config.query(TimeSeries).count() == 5
+    assert session_config.query(TimeSeries).filter_by(timestamp=t0).one().h == 1.
+    assert len(index) == 5
+    assert get_last_water_level_timestamp(session_config) == t0 + timedelta(minutes=20)
+    assert add_water_levels(session_config, *zip(*readings)) == 0
+    # arrays, with time zones and missing values
+    timestamps = pd.date_range(datetime(2001, 1, 1), periods=4, freq="10min", tz="UTC")
+    assert add_water_levels(session_config, timestamps, np.array([1., np.nan, 2., 3.])) == 3
+    assert get_last_water_level_timestamp(session_config) == datetime(2001, 1, 1, 0, 30)
+    with pytest.raises(ValueError, match="Got 4 timestamps for 2 water levels"):
+        add_water_levels(session_config, timestamps, [1., 2.])
+
+
+def test_last_water_level_timestamp(session_config):
+    t0 = datetime(2000, 1, 1)
+    assert get_last_water_level_timestamp(session_config) is None
+    add_water_levels(session_config, [t0, t0 + timedelta(minutes=10)], [1., 2.])
+    # water levels of videos, from files or imported, do not hide a gap in the readings of the script
+    add_water_level(session_config, t0 + timedelta(hours=1), 3., source=TimeSeriesSource.VIDEO)
+    add_water_level(session_config, t0 + timedelta(hours=2), 3., source=TimeSeriesSource.FILE)
+    add_water_levels(session_config, [t0 + timedelta(hours=3)], [3.], source=TimeSeriesSource.IMPORT)
+    assert get_last_water_level_timestamp(session_config) == t0 + timedelta(minutes=10)
+
+
+def test_water_levels_of_videos_not_used(session_config):
+    t0 = datetime(2000, 1, 1)
+    add_water_levels(session_config, [t0, t0 + timedelta(minutes=20)], [1., 2.])
+    video = Video(timestamp=t0 + timedelta(minutes=10), status=VideoStatus.DONE)
+    session_config.add(video)
+    session_config.commit()
+    # the interpolated water level is stored with the results of the video only
+    rec = get_water_level(session_config, video.timestamp, allowed_dt=600, interpolate=True)
+    assert rec.id is None
+    ts = add_result_summary(session_config, video, rec, {"h": rec.h, "q_50": 2.})
+    assert (ts.h, ts.source) == (1.5, TimeSeriesSource.VIDEO)
+    # and is never used as water level of other videos
+    assert get_water_level(session_config, video.timestamp + timedelta(minutes=1), allowed_dt=600).h == 2.
+    assert get_water_level(
+        session_config, video.timestamp + timedelta(minutes=1), allowed_dt=900, interpolate=True
+    ).h == pytest.approx(1.55)
+    # water levels from files keep their source
+    video = Video(timestamp=t0 + timedelta(minutes=30), status=VideoStatus.DONE)
+    session_config.add(video)
+    session_config.commit()
+    rec = TimeSeries(timestamp=video.timestamp, h=3., source=TimeSeriesSource.FILE)
+    assert add_result_summary(session_config, video, rec, {"h": 3.}).source == TimeSeriesSource.FILE
+    assert get_water_level(session_config, video.timestamp, allowed_dt=3600).h == 2.
+
+
+def test_reading_replaces_water_level_of_video(session_config):
+    t0 = datetime(2000, 1, 1)
+    add_water_levels(session_config, [t0], [1.])
+    index = get_water_level_index(session_config)
+    videos = [Video(timestamp=t0 + timedelta(minutes=m), status=VideoStatus.DONE) for m in [10, 20]]
+    session_config.add_all(videos)
+    session_config.commit()
+    for video in videos:
+        add_result_summary(session_config, video, get_water_level(session_config, t0), {"q_50": 2.})
+    # a reading that arrives later for the timestamp of a video takes the place of the water level of the video
+    assert add_water_levels(session_config, [videos[0].timestamp, t0 + timedelta(minutes=30)], [1.5, 3.]) == 2
+    ts = session_config.query(TimeSeries).filter_by(timestamp=videos[0].timestamp).one()
+    session_config.refresh(ts)
+    assert (ts.h, ts.source, ts.q_50, ts.video_id) == (1.5, TimeSeriesSource.SCRIPT, 2., videos[0].id)
+    # also when added one by one
+    ts = add_water_level(session_config, videos[1].timestamp, 2.5)
+    assert (ts.h, ts.source, ts.q_50, ts.video_id) == (2.5, TimeSeriesSource.SCRIPT, 2., videos[1].id)
+    # and the readings are used as water level of other videos
+    assert get_water_level(session_config, videos[0].timestamp).h == 1.5
+    assert get_water_level(session_config, videos[1].timestamp).h == 2.5
+    assert len(index) == 4
+
+
+def test_add_result_summary(session_config):
+    t0 = datetime(2000, 1, 1)
+    rec = add_water_level(session_config, t0, 1.)
+    video = Video(timestamp=t0 + timedelta(minutes=1), status=VideoStatus.DONE)
+    session_config.add(video)
+    session_config.commit()
+    summary = {"h": 1., "q_50": 2., "wetted_surface": 3.}
+    # the water level was taken from a record at another timestamp, the summary gets its own record
+    ts = add_result_summary(session_config, video, rec, summary)
+    assert ts.id != rec.id
+    assert (ts.timestamp, ts.h, ts.q_50, ts.wetted_surface) == (video.timestamp, 1., 2., 3.)
+    assert video.time_series is ts
+    assert rec.q_50 is None
+    # no water level, e.g. detected optically
+    video = Video(timestamp=t0 + timedelta(minutes=2), status=VideoStatus.DONE)
+    session_config.add(video)
+    session_config.commit()
+    ts = add_result_summary(session_config, video, None, {"h": 0.5, "q_50": 1.})
+    assert (ts.timestamp, ts.h, ts.q_50) == (video.timestamp, 0.5, 1.)
@@ -0,0 +1,109 @@
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+from nodeorc import water_level
+from nodeorc.water_level import WaterLevelFileCache, get_water_level_file
+
+FMT = "%Y%m%d_%H%M%S"
+
+
+@pytest.fixture
+def water_level_fn(tmp_path):
+    fn = tmp_path / "wl_20230101.txt"
+    fn.write_text("20230101_000000 1.0\n20230101_001000 2.0\n20230101_002000 3.0\n")
+    return str(fn)
+
+
+def append(fn, text):
+    # make sure the modification time changes also on file systems with a coarse resolution
+    mtime = os.stat(fn).st_mtime_ns
+    with open(fn, "a") as f:
+        f.write(text)
+    os.utime(fn, ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+
+
+def test_get_water_level_file(water_level_fn):
+    file_fmt = os.path.join(os.path.dirname(water_level_fn), "wl_{%Y%m%d}.txt")
+    assert get_water_level_file(datetime(2023, 1, 1, 0, 4), file_fmt, FMT) == 1.0
+    # closest, not next water level
+    assert get_water_level_file(datetime(2023, 1, 1, 0, 6), file_fmt, FMT) == 2.0
+    assert get_water_level_file(datetime(2023, 1, 1, 0, 19), file_fmt, FMT, allowed_dt=60) == 3.0
+    with pytest.raises(ValueError, match="is more than 60 seconds off"):
+        get_water_level_file(datetime(2023, 1, 1, 0, 25), file_fmt, FMT, allowed_dt=60)
+    with pytest.raises(IOError, match="does not exist"):
+        get_water_level_file(datetime(2023, 1, 2), file_fmt, FMT)
+
+
+def test_get_water_level_file_interpolated(water_level_fn):
+    file_fmt = os.path.join(os.path.dirname(water_level_fn), "wl_{%Y%m%d}.txt")
+    h = get_water_level_file(datetime(2023, 1, 1, 0, 4), file_fmt, FMT, allowed_dt=600, interpolate=True)
+    assert h == pytest.approx(1.4)
+    # not bracketed, closest water level is returned
+    h = get_water_level_file(datetime(2023, 1, 1, 0, 24), file_fmt, FMT, allowed_dt=600, interpolate=True)
+    assert h == 3.0
+
+
+def test_cache_parses_file_once(water_level_fn, mocker):
+    cache = WaterLevelFileCache()
+    spy = mocker.spy(water_level, "read_water_level_file")
+    t, h = cache.read(water_level_fn, FMT)
+    assert h.tolist() == [1.0, 2.0, 3.0]
+    n_calls = spy.call_count
+    t2, h2 = cache.read(water_level_fn, FMT)
+    assert spy.call_count == n_calls
+    assert t2 is t
+
+
+def test_cache_appended_file(water_level_fn, mocker):
+    cache = WaterLevelFileCache()
+    cache.read(water_level_fn, FMT)
+    spy = mocker.spy(water_level, "read_water_level_file")
+    # a line that is still being written is held back until it is completed
+    append(water_level_fn, "20230101_003000 4.0\n20230101_004000 5")
+    assert cache.read(water_level_fn, FMT)[1].tolist() == [1.0, 2.0, 3.0, 4.0]
+    append(water_level_fn, ".5\n")
+    t, h = cache.read(water_level_fn, FMT)
+    assert h.tolist() == [1.0, 2.0, 3.0, 4.0, 5.5]
+    assert t[-1] == water_level._to_us(datetime(2023, 1, 1, 0, 40))
+    # only the new lines were parsed
+    assert all(len(call.args[0].getvalue().splitlines()) <= 2 for call in spy.call_args_list)
+
+
+def test_cache_partial_line(water_level_fn):
+    cache = WaterLevelFileCache(settle_time=60)
+    cache.read(water_level_fn, FMT)
+    # a line cut off halfway the timestamp is not parsed, and does not raise
+    append(water_level_fn, "20230101_0030")
+    assert cache.read(water_level_fn, FMT)[1].tolist() == [1.0, 2.0, 3.0]
+    append(water_level_fn, "00 4.0\n")
+    assert cache.read(water_level_fn, FMT)[1].tolist() == [1.0, 2.0, 3.0, 4.0]
+    # the last line of a file without line ending at the end is parsed once the file has settled
+    append(water_level_fn, "20230101_004000 5.0")
+    assert cache.read(water_level_fn, FMT)[1].tolist() == [1.0, 2.0, 3.0, 4.0]
+    mtime = time.time_ns() - 120 * 10 ** 9
+    os.utime(water_level_fn, ns=(mtime, mtime))
+    assert cache.read(water_level_fn, FMT)[1].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+
+
+def test_cache_rewritten_file(water_level_fn):
+    cache = WaterLevelFileCache()
+    cache.read(water_level_fn, FMT)
+    mtime = os.stat(water_level_fn).st_mtime_ns
+    with open(water_level_fn, "w") as f:
+        f.write("20230101_002000 7.0\n20230101_000000 6.0\n20230101_001000 6.5\n20230101_003000 8.0\n")
+    os.utime(water_level_fn, ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+    t, h = cache.read(water_level_fn, FMT)
+    # sorted in time
+    assert h.tolist() == [6.0, 6.5, 7.0, 8.0]
+
+
+def test_cache_max_files(tmp_path):
+    cache = WaterLevelFileCache(max_files=2)
+    for day in range(1, 4):
+        fn = tmp_path / f"wl_202301{day:02d}.txt"
+        fn.write_text(f"202301{day:02d}_000000 1.0\n")
+        cache.read(str(fn), FMT)
+    assert len(cache) == 2
@@ -3,7 +3,7 @@ import os
 import subprocess
 from unittest.mock import Mock
 import pytest
-from nodeorc.water_level import execute_water_level_script
+from nodeorc.water_level import execute_water_level_script, parse_water_level_output, WaterLevelScriptWorker
 
 
 def test_execute_script_valid_output(monkeypatch):
@@ -85,3 +85,108 @@ def test_execute_script_real_file(script="./dummy_script.sh"):
     result = execute_water_level_script(script, script_type="BASH")
     print(result)
 
+
+
+def test_script_worker():
+    script = "import datetime\nn = globals().get('n', 0) + 1\nprint(f'2023-11-01T12:34:56Z,{n}')"
+    with WaterLevelScriptWorker(script) as worker:
+        pid = worker._process.pid
+        # script is run in a fresh namespace every time, in the same process
+        assert worker.read() == (datetime.datetime(2023, 11, 1, 12, 34, 56), 1.)
+        assert worker.read() == (datetime.datetime(2023, 11, 1, 12, 34, 56), 1.)
+        assert worker._process.pid == pid
+    assert not worker.alive
+
+
+@pytest.mark.parametrize(
+    "script",
+    [
+        "import sys\nsys.exit(1)",
+        "raise Exception('no connection')",
+        "print('2023-11-01T12:34:56Z,45.67'",  # syntax error
+    ]
+)
+def test_script_worker_failure(script):
+    with WaterLevelScriptWorker(script) as worker:
+        with pytest.raises(RuntimeError, match="Script execution failed"):
+            worker.read()
+        assert worker.alive
+
+
+def test_script_worker_invalid_output():
+    # output written directly to file descriptor 1 does not interfere with the worker
+    script = "import os\nos.write(1, b'garbage\\n')\nprint('INVALID_OUTPUT')"
+    with WaterLevelScriptWorker(script) as worker:
+        with pytest.raises(ValueError, match="Invalid result format"):
+            worker.read()
+
+
+def test_script_worker_restart(tmpdir):
+    # the first reading crashes the worker, the second hangs, the third succeeds
+    script = f"""
+import os, time
+fn = os.path.join({repr(str(tmpdir))}, "count")
+n = int(open(fn).read()) if os.path.isfile(fn) else 0
+with open(fn, "w") as f:
+    f.write(str(n + 1))
+if n == 0:
+    os._exit(1)
+if n == 1:
+    time.sleep(10)
+print("2023-11-01T12:34:56Z,45.67")
+"""
+    with WaterLevelScriptWorker(script, timeout=1) as worker:
+        with pytest.raises(RuntimeError, match="terminated unexpectedly"):
+            worker.read()
+        with pytest.raises(RuntimeError, match="no output within 1 seconds"):
+            worker.read()
+        assert worker.read()[1] == 45.67
+
+
+def test_parse_water_level_output_all_lines():
+    stdout = "fetching readings\n2023-11-01T12:10:00Z,1.1\n2023-11-01T12:00:00Z,1.0\nWARNING: gap\n"
+    assert parse_water_level_output(stdout, all_lines=True) == [
+        (datetime.datetime(2023, 11, 1, 12), 1.0),
+        (datetime.datetime(2023, 11, 1, 12, 10), 1.1),
+    ]
+    with pytest.raises(ValueError, match="Invalid result format"):
+        parse_water_level_output("nothing\n", all_lines=True)
+
+
+# script that returns a reading every 10 minutes after the timestamp it receives
+since_script = """
+import datetime, os
+since = datetime.datetime.strptime(os.environ.get("NODEORC_WATER_LEVEL_SINCE", "2023-11-01T11:50:00Z"), "%Y-%m-%dT%H:%M:%SZ")
+for i in range(1, 4):
+    print(f"{(since + datetime.timedelta(minutes=10 * i)).strftime('%Y-%m-%dT%H:%M:%SZ')},{i}")
+"""
+
+
+def test_execute_script_since():
+    since = datetime.datetime(2023, 11, 1, 12)
+    readings = execute_water_level_script(since_script, "PYTHON", since=since, all_lines=True)
+    assert [r[0] for r in readings] == [since + datetime.timedelta(minutes=10 * i) for i in range(1, 4)]
+    # without all lines, only the last reading is returned
+    assert execute_water_level_script(since_script, "PYTHON", since=since) == readings[-1]
+
+
+def test_script_worker_since():
+    since = datetime.datetime(2023, 11, 1, 12)
+    with WaterLevelScriptWorker(since_script) as worker:
+        readings = worker.read(since=since, all_lines=True)
+        assert readings[0] == (since + datetime.timedelta(minutes=10), 1.)
+        # the timestamp is not remembered between readings
+        assert worker.read(all_lines=True)[0][0] == datetime.datetime(2023, 11, 1, 12)
+
+
+def test_script_worker_environment():
+    # a script that changes its environment, which must not be seen by the next run
+    script = """
+import os
+h = 2. if "NODEORC_TEST_VARIABLE" in os.environ else 1.
+os.environ["NODEORC_TEST_VARIABLE"] = "1"
+print(f"2023-11-01T12:00:00Z,{h}")
+"""
+    with WaterLevelScriptWorker(script) as worker:
+        assert worker.read()[1] == 1.
+        assert worker.read()[1] == 1.